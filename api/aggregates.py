@@ -0,0 +1,93 @@
+import pandas as pd
+import sqlalchemy
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+# Per-player gamelog aggregates, one row per (Player_ID, season, split). Splits are the whole season, home, away,
+# vs:<opponent> and last<N> for each rolling window. Sums are stored rather than averages: season, venue and
+# opponent splits are additive, so each ingest batch folds in only its new rows; rolling windows are rewritten
+# for the batch's players from their most recent games. Only a table's rows for the season being built are read,
+# since gamelogs briefly holds two seasons around a rollover.
+TABLE = "gamelog_aggregates"
+
+# Aggregated stats, as aggregate column -> gamelogs column; names match the keys /nba/player/<playerId> returns
+STATS = {
+    'mins_played': 'MIN', 'pts': 'Points', 'reb': 'Rebounds', 'ast': 'Assists', 'stl': 'Steals', 'blk': 'Blocked Shots',
+    'tov': 'Turnovers', 'fg3_made': '3-PT Made', 'pra': 'Pts+Rebs+Asts', 'pr': 'Pts+Rebs', 'pa': 'Pts+Asts',
+    'ra': 'Rebs+Asts', 'stocks': 'Blks+Stls', 'fantasy': 'Fantasy Score'
+}
+FORM_WINDOWS = (5, 10, 20)
+UPSERT_CHUNK_ROWS = 1000
+
+def ensureTable(conn):
+    sums = ', '.join(f"{column} DOUBLE NOT NULL" for column in STATS)
+    conn.execute(sqlalchemy.text(f"CREATE TABLE IF NOT EXISTS {TABLE} (Player_ID BIGINT NOT NULL, season VARCHAR(10) NOT NULL, split VARCHAR(16) NOT NULL, games INT NOT NULL, {sums}, PRIMARY KEY (Player_ID, season, split))"))
+
+def seeded(conn, season):
+    return conn.execute(sqlalchemy.text(f"SELECT 1 FROM {TABLE} WHERE season = :season LIMIT 1"), {'season': season}).first() is not None
+
+def totals(gamelog_df, splits):
+    stats = gamelog_df[list(STATS.values())].set_axis(list(STATS), axis=1).assign(games=1)
+    frames = [stats.groupby([gamelog_df['Player_ID'], split.rename('split')]).sum().reset_index() for split in splits]
+    return pd.concat(frames, ignore_index=True)[['Player_ID', 'split', 'games', *STATS]]
+
+def splitTotals(gamelog_df, season):
+    home = gamelog_df['MATCHUP'].str.contains('vs.', regex=False)
+    splits = [
+        pd.Series('season', index=gamelog_df.index),
+        home.map({True: 'home', False: 'away'}),
+        'vs:' + gamelog_df['Opponent'].astype(str)
+    ]
+    return totals(gamelog_df, splits).assign(season=season)
+
+def formTotals(recent_df, season):
+    # recent_df must hold each player's last max(FORM_WINDOWS) games or more
+    ordered = recent_df.sort_values(['Player_ID', 'game_day', 'Game_ID'], ascending=[True, False, False], ignore_index=True)
+    recency = ordered.groupby('Player_ID').cumcount()
+    frames = [totals(ordered[recency < window], [pd.Series(f"last{window}", index=ordered.index)]) for window in FORM_WINDOWS]
+    return pd.concat(frames, ignore_index=True).assign(season=season)
+
+def recentQuery(table):
+    return sqlalchemy.text(
+        f"SELECT * FROM (SELECT g.*, ROW_NUMBER() OVER (PARTITION BY Player_ID ORDER BY game_day DESC, Game_ID DESC) AS recency "
+        f"FROM {table} g WHERE Player_ID IN :player_ids AND season = :season) ranked WHERE recency <= :depth"
+    ).bindparams(sqlalchemy.bindparam('player_ids', expanding=True))
+
+def upsert(conn, frame, additive):
+    if frame.empty:
+        return
+    table = sqlalchemy.Table(TABLE, sqlalchemy.MetaData(), autoload_with=conn)
+    columns = ['games', *STATS]
+    records = frame[['Player_ID', 'season', 'split', *columns]].to_dict(orient='records')
+    for start in range(0, len(records), UPSERT_CHUNK_ROWS):
+        stmt = mysql_insert(table).values(records[start:start + UPSERT_CHUNK_ROWS])
+        stmt = stmt.on_duplicate_key_update({
+            column: table.c[column] + stmt.inserted[column] if additive else stmt.inserted[column] for column in columns
+        })
+        conn.execute(stmt)
+
+def accumulate(conn, table, season, batch):
+    # Run in the transaction that inserted batch (rows new to table), so a batch is folded in exactly once
+    upsert(conn, splitTotals(batch, season), additive=True)
+    player_ids = [int(player_id) for player_id in batch['Player_ID'].unique()]
+    recent_df = pd.read_sql(recentQuery(table), con=conn, params={'player_ids': player_ids, 'season': season, 'depth': max(FORM_WINDOWS)})
+    upsert(conn, formTotals(recent_df, season), additive=False)
+
+def rebuild(conn, table, season):
+    # Recomputes a season from table's rows for it, for seasons ingested before aggregates were kept
+    gamelog_df = pd.read_sql(sqlalchemy.text(f"SELECT * FROM {table} WHERE season = :season"), con=conn, params={'season': season})
+    conn.execute(sqlalchemy.text(f"DELETE FROM {TABLE} WHERE season = :season"), {'season': season})
+    if not gamelog_df.empty:
+        upsert(conn, splitTotals(gamelog_df, season), additive=False)
+        upsert(conn, formTotals(gamelog_df, season), additive=False)
+    return len(gamelog_df)
+
+def serialize(rows):
+    # Averages per split, with opponent splits grouped under 'vs'
+    payload = {'vs': {}}
+    for row in rows:
+        split = {'games': row['games'], **{column: round(row[column] / row['games'], 2) for column in STATS}}
+        if row['split'].startswith('vs:'):
+            payload['vs'][row['split'][3:]] = split
+        else:
+            payload[row['split']] = split
+    return payload
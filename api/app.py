@@ -1,10 +1,19 @@
 from flask import Flask, render_template, request, jsonify
 from flask_cors import CORS
 import pandas as pd
+from datetime import date
+import numpy as np
 import sqlalchemy
 import os
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from nba_api.live.nba.endpoints import scoreboard
+import aggregates
+import logindex
+import snapshots
 
 load_dotenv()
 app = Flask(__name__)
@@ -15,11 +24,87 @@ DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_HOST = os.getenv('DB_HOST')
 DB_NAME = os.getenv('DB_NAME')
 
-db = sqlalchemy.create_engine(f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}")
+# Profile routes send their independent queries together through this many threads, so a page waits on its slowest
+# query instead of the sum of them; the engine keeps a connection per worker plus headroom for the other routes
+QUERY_WORKERS = int(os.getenv('QUERY_WORKERS', 8))
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', QUERY_WORKERS + 4))
+DB_POOL_OVERFLOW = int(os.getenv('DB_POOL_OVERFLOW', 8))
 
-@app.route('/games')
-def games():
-    f = "{gameId}: {awayTeam} @ {homeTeam}, {gameTimeLTZ}"
+# DATABASE_URL lets benchmarks and replayed runs point the API at a scratch database
+db = sqlalchemy.create_engine(
+    os.getenv('DATABASE_URL') or f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}",
+    pool_size=DB_POOL_SIZE, max_overflow=DB_POOL_OVERFLOW, pool_pre_ping=True
+)
+query_pool = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix='query')
+
+# Route queries are built once with bound parameters so SQLAlchemy's compiled cache and the server
+# can reuse them, instead of formatting a new SQL string for every request
+QUERIES = {
+    'game_rosters': sqlalchemy.text("SELECT Player_ID, PLAYER_FULL_NAME, POSITION, TEAM_NAME, JERSEY_NUMBER, TEAM_ID FROM players WHERE Team_Id IN (:away, :home)"),
+    'player_info': sqlalchemy.text("SELECT * FROM players WHERE Player_ID = :player_id"),
+    'player_grades': sqlalchemy.text("SELECT PTS, REB, AST, STL, BLK, TOV, Scoring, Playmaking, Rebounding, Defense, Athleticism, Archetype FROM grades WHERE Player_ID = :player_id"),
+    'team_info': sqlalchemy.text("SELECT * FROM teams WHERE TEAM_ID = :team_id"),
+    'team_players': sqlalchemy.text("SELECT * FROM players WHERE Team_ID = :team_id"),
+    'team_standings': sqlalchemy.text("SELECT * FROM standings WHERE TeamID = :team_id"),
+    'batch_players': sqlalchemy.text("SELECT * FROM players WHERE Player_ID IN :player_ids").bindparams(sqlalchemy.bindparam('player_ids', expanding=True)),
+    'batch_grades': sqlalchemy.text("SELECT PLAYER_ID, PTS, REB, AST, STL, BLK, TOV, Scoring, Playmaking, Rebounding, Defense, Athleticism, Archetype FROM grades WHERE Player_ID IN :player_ids").bindparams(sqlalchemy.bindparam('player_ids', expanding=True)),
+    'player_aggregates': sqlalchemy.text("SELECT * FROM gamelog_aggregates WHERE Player_ID = :player_id AND season = :season"),
+}
+
+GAMELOG_FILTERS = {
+    'since': "game_day >= :since",
+    'until': "game_day <= :until",
+    'cursor': "(game_day > :cursor_date OR (game_day = :cursor_date AND Game_ID > :cursor_game))",
+}
+
+def query(name, **params):
+    return pd.read_sql(QUERIES[name], con=db, params=params)
+
+def fetchRows(statement, params):
+    with db.connect() as conn:
+        return [dict(row) for row in conn.execute(statement, params).mappings()]
+
+def fetchTogether(**statements):
+    # Runs each (statement, params) on its own pooled connection at the same time and returns the rows by name
+    futures = {name: query_pool.submit(fetchRows, statement, params) for name, (statement, params) in statements.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+@functools.lru_cache(maxsize=None)
+def playerLogQuery(filters, limited):
+    clauses = ["Player_ID = :player_id"] + [GAMELOG_FILTERS[f] for f in filters]
+    sql = f"SELECT * FROM gamelogs WHERE {' AND '.join(clauses)} ORDER BY game_day ASC, Game_ID ASC"
+    if limited:
+        sql += " LIMIT :limit"
+    return sqlalchemy.text(sql)
+
+@functools.lru_cache(maxsize=None)
+def batchLogQuery(filters):
+    clauses = ["Player_ID IN :player_ids"] + [GAMELOG_FILTERS[f] for f in filters]
+    sql = f"SELECT * FROM gamelogs WHERE {' AND '.join(clauses)} ORDER BY Player_ID ASC, game_day ASC, Game_ID ASC"
+    return sqlalchemy.text(sql).bindparams(sqlalchemy.bindparam('player_ids', expanding=True))
+
+def gamelogParams(args):
+    params = {}
+    if 'since' in args:
+        params['since'] = date.fromisoformat(args['since'])
+    if 'until' in args:
+        params['until'] = date.fromisoformat(args['until'])
+    if 'cursor' in args:
+        cursor_date, cursor_game = args['cursor'].split('_')
+        params['cursor_date'] = date.fromisoformat(cursor_date)
+        params['cursor_game'] = int(cursor_game)
+    if 'limit' in args:
+        params['limit'] = int(args['limit'])
+        if params['limit'] <= 0:
+            raise ValueError("limit must be positive")
+    return params
+
+# Live scoreboard is treated as fresh for SCOREBOARD_TTL seconds and served stale (while one
+# background refresh runs) for up to SCOREBOARD_STALE_TTL seconds before callers block on a fetch
+SCOREBOARD_TTL = float(os.getenv('SCOREBOARD_TTL', 15))
+SCOREBOARD_STALE_TTL = float(os.getenv('SCOREBOARD_STALE_TTL', 300))
+
+def fetchScoreboard():
     board = scoreboard.ScoreBoard()
     print("ScoreBoardDate: " + board.score_board_date)
     games = board.games.get_dict()
@@ -39,142 +124,388 @@ def games():
 
         todaysGames.append([gameId, gameStatus, gameStatusText, awayTeam, awayId, awayScore, homeTeam, homeId, homeScore, gameTimeUTC])
 
-    return jsonify(todaysGames)
+    return todaysGames
+
+class ScoreboardCache:
+    def __init__(self, fetch, ttl, stale_ttl):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.lock = threading.Lock()
+        self.inflight = None
+        self.games = None
+        self.games_by_id = {}
+        self.fetched_at = 0.0
+        self.error = None
+
+    def refresh(self, done):
+        try:
+            games = self.fetch()
+            games_by_id = {game[0]: game for game in games}
+            with self.lock:
+                self.games, self.games_by_id = games, games_by_id
+                self.fetched_at = time.monotonic()
+                self.error = None
+        except Exception as e:
+            app.logger.error(f"Scoreboard refresh failed: {e}")
+            with self.lock:
+                self.error = e
+        finally:
+            with self.lock:
+                self.inflight = None
+            done.set()
+
+    def snapshot(self):
+        with self.lock:
+            age = time.monotonic() - self.fetched_at
+            if self.games is not None and age < self.stale_ttl:
+                if age >= self.ttl and self.inflight is None:
+                    self.inflight = threading.Event()
+                    threading.Thread(target=self.refresh, args=(self.inflight,), daemon=True).start()
+                return self.games, self.games_by_id
+
+            # Nothing usable cached: exactly one caller fetches, everyone else waits on it
+            leader = self.inflight is None
+            if leader:
+                self.inflight = threading.Event()
+            done = self.inflight
+
+        if leader:
+            self.refresh(done)
+        else:
+            done.wait()
+
+        with self.lock:
+            if self.games is None:
+                raise self.error or RuntimeError("Scoreboard unavailable")
+            return self.games, self.games_by_id
+
+    def allGames(self):
+        return self.snapshot()[0]
+
+    def game(self, gameId):
+        return self.snapshot()[1].get(gameId)
+
+scoreboard_cache = ScoreboardCache(fetchScoreboard, SCOREBOARD_TTL, SCOREBOARD_STALE_TTL)
+
+@app.route('/games')
+def games():
+    return jsonify(scoreboard_cache.allGames())
+
+# How often (seconds) a worker re-checks for a newly published snapshot, or for players/grades
+# changing underneath its cached payload when no snapshot has been published
+SNAPSHOT_CHECK_INTERVAL = float(os.getenv('SNAPSHOT_CHECK_INTERVAL', 30))
+
+players_snapshot = {'version': None, 'body': None, 'checked_at': 0.0}
+players_snapshot_lock = threading.Lock()
+published = snapshots.SnapshotStore(check_interval=SNAPSHOT_CHECK_INTERVAL)
+
+def snapshotResponse(name):
+    encoding = next((e for e in snapshots.ENCODINGS if e == 'identity' or request.accept_encodings[e]), 'identity')
+    body, digest = published.get(name, encoding)
+    if body is None:
+        return None
+
+    etag = digest if encoding == 'identity' else f"{digest}-{encoding}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+TABLE_VERSIONS_QUERY = sqlalchemy.text("SELECT table_name, version FROM table_versions WHERE table_name IN :tables").bindparams(sqlalchemy.bindparam('tables', expanding=True))
+
+def tableVersion(*tables):
+    # The scheduler writes a table_versions row after every load, so this is a primary key lookup. Before the first
+    # load there is no table_versions; the payload is then built once and kept until a load records a version.
+    try:
+        with db.connect() as conn:
+            rows = conn.execute(TABLE_VERSIONS_QUERY, {'tables': list(tables)}).all()
+    except sqlalchemy.exc.DBAPIError:
+        return ()
+    return tuple(sorted((row[0], row[1]) for row in rows))
+
+def playersPayload():
+    now = time.monotonic()
+    if players_snapshot['body'] is not None and now - players_snapshot['checked_at'] < SNAPSHOT_CHECK_INTERVAL:
+        return players_snapshot['body']
+
+    with players_snapshot_lock:
+        if players_snapshot['body'] is not None and now - players_snapshot['checked_at'] < SNAPSHOT_CHECK_INTERVAL:
+            return players_snapshot['body']
+        version = tableVersion('players', 'grades')
+        if players_snapshot['body'] is None or version != players_snapshot['version']:
+            players_db = pd.read_sql(snapshots.PLAYERS_QUERY, con=db)
+            players_snapshot['body'] = snapshots.dumps(snapshots.serializePlayers(players_db))
+            players_snapshot['version'] = version
+        players_snapshot['checked_at'] = time.monotonic()
+        return players_snapshot['body']
 
 @app.route('/players')
 def players():
-    query = """SELECT 
-            p.TEAM_ID, 
-            p.TEAM_FULL_NAME, 
-            p.PLAYER_ID, 
-            p.PLAYER_FULL_NAME, 
-            p.POSITION, 
-            p.TEAM_NAME, 
-            p.JERSEY_NUMBER,
-            g.PTS, 
-            g.REB, 
-            g.AST, 
-            g.STL, 
-            g.BLK, 
-            g.TharacterTOV, 
-            g.Scoring, 
-            g.Playmaking, 
-            g.Rebounding, 
-            g.Defense, 
-            g.Athleticism,
-            g.Archetype
-        FROM players p
-        LEFT JOIN grades g ON p.PLAYER_ID = g.PLAYER_ID
-    """
-    players_db = pd.read_sql(query, con=db)
-
-    players_dict = {}
-    for index, row in players_db.iterrows():
-        team_id, team_name, player_id, player_name, position, team, jersey_number, points, rebounds, assists, steals, blocks, turnovers, scoring_grade, playmaking_grade, rebounding_grade, defense_grade, athleticism_grade, archetype = row
-        
-        def sanitize_value(value):
-            return None if isinstance(value, float) and pd.isna(value) else value
-
-        if team_id not in players_dict:
-            players_dict[team_id] = {'team_name': team_name, 'players': []}
-        players_dict[team_id]['players'].append({
-            'player_id': player_id, 
-            'player_name': player_name, 
-            'position': position, 
-            'team': team, 
-            'jersey_number': jersey_number, 
-            'points': sanitize_value(points), 
-            'rebounds': sanitize_value(rebounds), 
-            'assists': sanitize_value(assists), 
-            'steals': sanitize_value(steals), 
-            'blocks': sanitize_value(blocks), 
-            'turnovers': sanitize_value(turnovers), 
-            'scoring_grade': sanitize_value(scoring_grade), 
-            'playmaking_grade': sanitize_value(playmaking_grade), 
-            'rebounding_grade': sanitize_value(rebounding_grade), 
-            'defense_grade': sanitize_value(defense_grade), 
-            'athleticism_grade': sanitize_value(athleticism_grade),
-            'archetype': sanitize_value(archetype)
-        })
-
-    return jsonify(players_dict)
+    published_players = snapshotResponse('players')
+    if published_players is not None:
+        return published_players
+
+    return app.response_class(playersPayload(), mimetype='application/json')
 
 @app.route('/teams')
 def teams():
-    teams_db = pd.read_sql("SELECT TEAM_ID, TEAM_FULL_NAME, CITY, ARENA, OWNER, GENERALMANAGER, HEADCOACH FROM teams", con=db)
-    standings_db = pd.read_sql("SELECT TeamID, Conference, Record, PlayoffRank FROM standings", con=db)
-    standings_db = standings_db.rename(columns={'TeamID': 'TEAM_ID'})
-    merged_db = teams_db.merge(standings_db, on='TEAM_ID', how='left')
-
-    teams_dict = {}
-    for index, row in merged_db.iterrows():
-        team_id, team_name, city, arena, owner, generalmanager, headcoach, conference, record, playoffrank = row
-        teams_dict[team_id] = {
-            'team_id': team_id, 'team_name': team_name, 'city': city, 'arena': arena, 
-            'owner': owner, 'general_manager': generalmanager, 'head_coach': headcoach, 
-            'conference': conference, 'record': record, 'playoff_rank': playoffrank
-        }
-    return jsonify(teams_dict)
-    
+    published_teams = snapshotResponse('teams')
+    if published_teams is not None:
+        return published_teams
+
+    teams_db = pd.read_sql(snapshots.TEAMS_QUERY, con=db)
+    standings_db = pd.read_sql(snapshots.TEAM_STANDINGS_QUERY, con=db)
+    return jsonify(snapshots.serializeTeams(teams_db, standings_db))
+
+ROSTER_FIELDS = {'Player_ID': 'id', 'PLAYER_FULL_NAME': 'name', 'POSITION': 'position', 'TEAM_NAME': 'team_name', 'JERSEY_NUMBER': 'jersey_number'}
+
 @app.route('/games/<gameId>')
 def gamePlayers(gameId):
-    game_info = next((game for game in games() if game[0] == gameId), None)
+    game_info = scoreboard_cache.game(gameId)
     if game_info is None:
         return "Game not found", 404
 
     gameId, gameStatus, gameStatusText, awayTeam, awayId, awayScore, homeTeam, homeId, homeScore, gameTimeUTC = game_info
 
-    away_players = pd.read_sql(f"SELECT Player_ID, PLAYER_FULL_NAME, POSITION, TEAM_NAME, JERSEY_NUMBER FROM players WHERE Team_Id = {awayId}", con=db)
-    home_players = pd.read_sql(f"SELECT Player_ID, PLAYER_FULL_NAME, POSITION, TEAM_NAME, JERSEY_NUMBER FROM players WHERE Team_Id = {homeId}", con=db)
+    roster = query('game_rosters', away=awayId, home=homeId)
+    team_ids = roster.pop('TEAM_ID')
+    roster = roster.rename(columns=ROSTER_FIELDS)
 
     combined_players = {
-        'away': [{'id': player_id, 'name': player_name, 'position': position, 'team_name': team_name, 'jersey_number': jersey_number} 
-                 for player_id, player_name, position, team_name, jersey_number in zip(away_players['Player_ID'].tolist(), away_players['PLAYER_FULL_NAME'].tolist(), away_players['POSITION'].tolist(), away_players['TEAM_NAME'].tolist(), away_players['JERSEY_NUMBER'].tolist())],
-        'home': [{'id': player_id, 'name': player_name, 'position': position, 'team_name': team_name, 'jersey_number': jersey_number} 
-                 for player_id, player_name, position, team_name, jersey_number in zip(home_players['Player_ID'].tolist(), home_players['PLAYER_FULL_NAME'].tolist(), home_players['POSITION'].tolist(), home_players['TEAM_NAME'].tolist(), home_players['JERSEY_NUMBER'].tolist())]
+        'away': roster[team_ids == awayId].to_dict(orient='records'),
+        'home': roster[team_ids == homeId].to_dict(orient='records')
     }
 
     return jsonify(combined_players)
 
+GAMELOG_FIELDS = {
+    'game_id': 'Game_ID', 'game_date': 'GAME_DATE', 'matchup': 'MATCHUP', 'opp': 'Opponent', 'outcome': 'WL',
+    'mins_played': 'MIN', 'fg_made': 'FG Made', 'fg_att': 'FG Attempted', 'fg_pct': 'FG_PCT', 'fg3_made': '3-PT Made',
+    'fg3_att': '3-PT Attempted', 'fg3_pct': 'FG3_PCT', 'ft_made': 'Free Throws Made', 'ft_att': 'Free Throws Attempted',
+    'ft_pct': 'FT_PCT', 'oreb': 'Offensive Rebounds', 'dreb': 'Defensive Rebounds', 'reb': 'Rebounds', 'ast': 'Assists',
+    'stl': 'Steals', 'blk': 'Blocked Shots', 'tov': 'Turnovers', 'foul': 'PF', 'pts': 'Points', 'plus_minus': 'PLUS_MINUS',
+    'pra': 'Pts+Rebs+Asts', 'pr': 'Pts+Rebs', 'pa': 'Pts+Asts', 'ra': 'Rebs+Asts', 'stocks': 'Blks+Stls', 'fantasy': 'Fantasy Score'
+}
+
+# Gamelogs are served from the scheduler's published columnar index when one exists, re-checked as often as snapshots
+gamelog_index = logindex.IndexStore(check_interval=SNAPSHOT_CHECK_INTERVAL)
+
+def indexedGamelogs(index, playerId, params, limit):
+    try:
+        start, end = index.span(int(playerId), **params)
+    except (ValueError, OverflowError):
+        return [], None
+    next_cursor = None
+    truncated = limit is not None and end - start > limit
+    if truncated:
+        end = start + limit
+    gamelogs = index.records(start, end, GAMELOG_FIELDS)
+    if truncated:
+        # The cursor carries the served game_id, which records() returns as the BIGINT column's Python int
+        next_cursor = f"{index.day(end - 1).isoformat()}_{gamelogs[-1]['game_id']}"
+    return gamelogs, next_cursor
+
+def queriedGamelogs(player_log, limit):
+    next_cursor = None
+    if limit is not None and len(player_log) > limit:
+        player_log = player_log[:limit]
+        last = player_log[-1]
+        next_cursor = f"{pd.Timestamp(last['game_day']).date().isoformat()}_{last['Game_ID']}"
+    return [{field: row[column] for field, column in GAMELOG_FIELDS.items()} for row in player_log], next_cursor
+
 @app.route('/nba/player/<playerId>')
 def nbaPlayerInfo(playerId):
-    player_info = pd.read_sql(f"SELECT * FROM players WHERE Player_ID = {playerId}", con=db).to_dict(orient='records')
-    player_log = pd.read_sql(f"SELECT *, STR_TO_DATE(GAME_DATE, '%M %d, %Y') AS formatted_date FROM gamelogs WHERE Player_ID = {playerId} ORDER BY formatted_date ASC", con=db)
-    player_grades = pd.read_sql(f"SELECT PTS, REB, AST, STL, BLK, TOV, Scoring, Playmaking, Rebounding, Defense, Athleticism, Archetype FROM grades WHERE Player_ID = {playerId}", con=db).to_dict(orient='records')
-
-    gamelogs = []
-    for index, row in player_log.iterrows():
-        gamelog = {
-            'game_id': row['Game_ID'], 'game_date': row['GAME_DATE'], 'matchup': row['MATCHUP'], 'opp': row['Opponent'],
-            'outcome': row['WL'], 'mins_played': row['MIN'], 'fg_made': row['FG Made'], 'fg_att': row['FG Attempted'],
-            'fg_pct': row['FG_PCT'], 'fg3_made': row['3-PT Made'], 'fg3_att': row['3-PT Attempted'], 'fg3_pct': row['FG3_PCT'],
-            'ft_made': row['Free Throws Made'], 'ft_att': row['Free Throws Attempted'], 'ft_pct': row['FT_PCT'],
-            'oreb': row['Offensive Rebounds'], 'dreb': row['Defensive Rebounds'], 'reb': row['Rebounds'], 'ast': row['Assists'],
-            'stl': row['Steals'], 'blk': row['Blocked Shots'], 'tov': row['Turnovers'], 'foul': row['PF'], 'pts': row['Points'],
-            'plus_minus': row['PLUS_MINUS'], 'pra': row['Pts+Rebs+Asts'], 'pr': row['Pts+Rebs'], 'pa': row['Pts+Asts'],
-            'ra': row['Rebs+Asts'], 'stocks': row['Blks+Stls'], 'fantasy': row['Fantasy Score']
-        }
-        gamelogs.append(gamelog)
+    try:
+        params = gamelogParams(request.args)
+    except ValueError:
+        return "Invalid gamelog filter", 400
+
+    filters = tuple(f for f in GAMELOG_FILTERS if f in request.args)
+    limit = params.pop('limit', None)
+    index = gamelog_index.current()
+    statements = {
+        'player_info': (QUERIES['player_info'], {'player_id': playerId}),
+        'player_grades': (QUERIES['player_grades'], {'player_id': playerId})
+    }
+    if index is None:
+        limited = {'limit': limit + 1} if limit is not None else {}
+        statements['player_log'] = (playerLogQuery(filters, limit is not None), {'player_id': playerId, **params, **limited})
+    results = fetchTogether(**statements)
+
+    if index is None:
+        gamelogs, next_cursor = queriedGamelogs(results['player_log'], limit)
+    else:
+        gamelogs, next_cursor = indexedGamelogs(index, playerId, params, limit)
 
     player_profile = {
-        'player_info': player_info,
+        'player_info': results['player_info'],
         'gamelogs': gamelogs,
-        'player_grades': player_grades
+        'next_cursor': next_cursor,
+        'player_grades': results['player_grades']
     }
 
     return jsonify(player_profile)
 
+# Most players one /nba/players/profiles request may ask for, and the gamelog filters it accepts (no per-player paging)
+BATCH_PROFILE_MAX_PLAYERS = int(os.getenv('BATCH_PROFILE_MAX_PLAYERS', 30))
+BATCH_GAMELOG_FILTERS = ('since', 'until')
+
+@app.route('/nba/players/profiles')
+def batchPlayerProfiles():
+    # ?ids=1,2,3 returns {id: profile} shaped like /nba/player/<playerId>, from one IN query per table. The response
+    # is built in full before it is sent, so a failure is a 500 rather than a truncated 200.
+    try:
+        player_ids = list(dict.fromkeys(int(player_id) for player_id in request.args.get('ids', '').split(',')))
+        params = gamelogParams(request.args)
+        if len(player_ids) > BATCH_PROFILE_MAX_PLAYERS or set(params) - set(BATCH_GAMELOG_FILTERS):
+            raise ValueError("too many players or an unsupported filter")
+    except ValueError:
+        return "Invalid profile request", 400
+
+    filters = tuple(f for f in BATCH_GAMELOG_FILTERS if f in request.args)
+    index = gamelog_index.current()
+    statements = {
+        'players': (QUERIES['batch_players'], {'player_ids': player_ids}),
+        'grades': (QUERIES['batch_grades'], {'player_ids': player_ids})
+    }
+    if index is None:
+        statements['gamelogs'] = (batchLogQuery(filters), {'player_ids': player_ids, **params})
+    results = fetchTogether(**statements)
+
+    grouped = {name: {} for name in results}
+    for name, rows in results.items():
+        for row in rows:
+            player_id = row.pop('PLAYER_ID') if name == 'grades' else row['Player_ID' if name == 'gamelogs' else 'PLAYER_ID']
+            grouped[name].setdefault(int(player_id), []).append(row)
+
+    profiles = {}
+    for player_id in player_ids:
+        if index is None:
+            gamelogs, _ = queriedGamelogs(grouped['gamelogs'].get(player_id, []), None)
+        else:
+            gamelogs, _ = indexedGamelogs(index, player_id, params, None)
+        profiles[player_id] = {
+            'player_info': grouped['players'].get(player_id, []),
+            'gamelogs': gamelogs,
+            'player_grades': grouped['grades'].get(player_id, [])
+        }
+
+    return jsonify(profiles)
+
+# Stats a hit-rate request can ask about, by their /nba/player/<playerId> gamelog key
+HIT_RATE_STATS = {
+    field: column for field, column in GAMELOG_FIELDS.items()
+    if field != 'game_id' and logindex.COLUMNS[column] != 'str'
+}
+# Most (player, line) pairs one hit-rate request may evaluate
+HIT_RATE_MAX_PAIRS = int(os.getenv('HIT_RATE_MAX_PAIRS', 100000))
+
+def hitRateWindow(window):
+    # Last N games, or 0 for the whole log
+    if window is None:
+        return 0
+    if int(window) <= 0:
+        raise ValueError("window must be positive")
+    return int(window)
+
+def hitRateSummary(games, total, hits):
+    return {
+        'games': games, 'average': round(total / games, 2) if games else None,
+        'hits': hits, 'hit_rate': round(hits / games, 3) if games else None
+    }
+
+def queriedHitRates(index, queries):
+    # Each query is its own (player, stat, line, window); queries are evaluated together per stat
+    if len(queries) > HIT_RATE_MAX_PAIRS:
+        raise ValueError("too many queries")
+    player_ids = np.array([int(q['player_id']) for q in queries], dtype=np.int64)
+    columns = np.array([HIT_RATE_STATS[q['stat']] for q in queries], dtype=object)
+    lines = np.array([float(q['line']) for q in queries])
+    windows = np.array([hitRateWindow(q.get('window')) for q in queries], dtype=np.int64)
+    positions = index.positions(player_ids)
+
+    games, totals, hits = np.zeros(len(queries), dtype=np.int64), np.zeros(len(queries)), np.zeros(len(queries), dtype=np.int64)
+    for column in set(columns):
+        rows = np.flatnonzero(columns == column)
+        values, valid = index.lastGames(column, positions[rows], windows[rows])
+        games[rows], totals[rows], column_hits = logindex.summarize(values, valid, lines[rows, None])
+        hits[rows] = column_hits[:, 0]
+
+    return {'results': [
+        {'player_id': int(player_id), 'stat': q['stat'], 'line': line, 'window': q.get('window'), **hitRateSummary(*summary)}
+        for q, player_id, line, summary in zip(queries, player_ids, lines.tolist(), zip(games.tolist(), totals.tolist(), hits.tolist()))
+    ]}
+
+def gridHitRates(index, body):
+    # One stat and window against a grid of lines, for the listed players or every player in the index
+    column = HIT_RATE_STATS[body['stat']]
+    lines = np.array([float(line) for line in body['lines']])
+    window = hitRateWindow(body.get('window'))
+    player_ids = np.array([int(player_id) for player_id in body['player_ids']], dtype=np.int64) if 'player_ids' in body else np.asarray(index.players, dtype=np.int64)
+    if not len(lines) or len(player_ids) * len(lines) > HIT_RATE_MAX_PAIRS:
+        raise ValueError("lines must be non-empty and within HIT_RATE_MAX_PAIRS")
+
+    positions = index.positions(player_ids)
+    values, valid = index.lastGames(column, positions, np.full(len(positions), window))
+    games, totals, hits = logindex.summarize(values, valid, np.broadcast_to(lines, (len(positions), len(lines))))
+
+    players = {}
+    for player_id, player_games, total, player_hits in zip(player_ids.tolist(), games.tolist(), totals.tolist(), hits.tolist()):
+        players[player_id] = {
+            'games': player_games, 'average': round(total / player_games, 2) if player_games else None,
+            'hits': player_hits, 'hit_rates': [round(h / player_games, 3) if player_games else None for h in player_hits]
+        }
+    return {'stat': body['stat'], 'window': body.get('window'), 'lines': lines.tolist(), 'players': players}
+
+@app.route('/nba/hit-rates', methods=['POST'])
+def hitRates():
+    # Body is either {"queries": [{"player_id", "stat", "line", "window"?}, ...]} or
+    # {"stat", "lines": [...], "window"?, "player_ids"?}; a game hits when the stat is strictly over the line
+    index = gamelog_index.current()
+    if index is None:
+        return "Gamelog index not published", 503
+    body = request.get_json(silent=True)
+    try:
+        if not isinstance(body, dict):
+            raise ValueError("expected a JSON object")
+        payload = queriedHitRates(index, body['queries']) if 'queries' in body else gridHitRates(index, body)
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return "Invalid hit-rate request", 400
+    return jsonify(payload)
+
+# Season the scheduler ingests into gamelogs; aggregates for past seasons are requested with ?season=
+CURRENT_SEASON = os.getenv('NBA_SEASON', '2024-25')
+
+@app.route('/nba/player/<playerId>/aggregates')
+def playerAggregates(playerId):
+    season = request.args.get('season', CURRENT_SEASON)
+    try:
+        rows = fetchRows(QUERIES['player_aggregates'], {'player_id': playerId, 'season': season})
+    except sqlalchemy.exc.DBAPIError:
+        # Before the scheduler's first gamelog ingest there is no aggregates table to read
+        if sqlalchemy.inspect(db).has_table(aggregates.TABLE):
+            raise
+        return "Gamelog aggregates not built yet", 503
+    return jsonify({'season': season, 'splits': aggregates.serialize(rows)})
+
 @app.route('/team/<teamId>')
 def teamInfo(teamId):
-    team_info = pd.read_sql(f"SELECT * FROM teams WHERE TEAM_ID = {teamId}", con=db).to_dict(orient='records')
-    team_players = pd.read_sql(f"SELECT * FROM players WHERE Team_ID = {teamId}", con=db).to_dict(orient='records')
-    team_standings = pd.read_sql(f"SELECT * FROM standings WHERE TeamID = {teamId}", con=db).to_dict(orient='records')
-
-    team_profile = {
-        'team_info': team_info,
-        'team_players': team_players,
-        'team_standings': team_standings
-    }
+    published_team = snapshotResponse(f'team/{teamId}')
+    if published_team is not None:
+        return published_team
+
+    team_profile = fetchTogether(
+        team_info=(QUERIES['team_info'], {'team_id': teamId}),
+        team_players=(QUERIES['team_players'], {'team_id': teamId}),
+        team_standings=(QUERIES['team_standings'], {'team_id': teamId})
+    )
 
     return jsonify(team_profile)
 
@@ -0,0 +1,398 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+import numpy as np
+import pandas as pd
+import sqlalchemy
+from dotenv import load_dotenv
+import schema
+
+# Benchmarks for the Flask routes and the scheduler stages, run against a scratch database named by DATABASE_URL:
+#   python benchmark.py generate --players 5000 --gamelogs 500000
+#   python benchmark.py run --concurrency 16 --requests 2000 --output before.json
+#   python benchmark.py compare before.json after.json
+# app and scheduler bind their engines to DATABASE_URL at import, so they are only imported once it is checked.
+
+SEASON_START = date(2024, 10, 22)
+POSITIONS = ['Guard', 'Forward', 'Center', 'Guard-Forward', 'Forward-Center']
+ARCHETYPES = ['Shot Creator', 'Scoring Playmaker', 'Rim Guardian', 'Energy Big', 'Two-Way Threat', 'Role Player', 'Benchwarmer']
+WRITE_CHUNK_ROWS = 500
+
+def scratchEngine():
+    load_dotenv()
+    url = os.getenv('DATABASE_URL')
+    if not url:
+        raise SystemExit("DATABASE_URL must name a scratch database; benchmarks overwrite its tables")
+    return sqlalchemy.create_engine(url)
+
+def syntheticTeams(rng, teams):
+    ids = 1610612737 + np.arange(teams)
+    names = [f"Team {i:02d}" for i in range(teams)]
+    teams_df = pd.DataFrame({
+        'TEAM_ID': ids, 'ABBREVIATION': [f"T{i:02d}" for i in range(teams)], 'NICKNAME': names,
+        'YEARFOUNDED': rng.integers(1946, 2005, teams), 'CITY': [f"City {i:02d}" for i in range(teams)],
+        'ARENA': [f"Arena {i:02d}" for i in range(teams)], 'ARENACAPACITY': rng.integers(17000, 21000, teams),
+        'OWNER': [f"Owner {i:02d}" for i in range(teams)], 'GENERALMANAGER': [f"GM {i:02d}" for i in range(teams)],
+        'HEADCOACH': [f"Coach {i:02d}" for i in range(teams)], 'DLEAGUEAFFILIATION': [f"G League {i:02d}" for i in range(teams)]
+    })
+    teams_df['TEAM_FULL_NAME'] = teams_df['CITY'] + " " + teams_df['NICKNAME']
+
+    wins = rng.integers(10, 70, teams)
+    standings_df = pd.DataFrame({
+        'TeamID': ids, 'TeamCity': teams_df['CITY'], 'TeamName': names,
+        'Conference': np.where(np.arange(teams) % 2 == 0, 'East', 'West'),
+        'WINS': wins, 'LOSSES': 82 - wins, 'WinPCT': wins / 82, 'Record': [f"{w}-{82 - w}" for w in wins]
+    })
+    standings_df['PlayoffRank'] = standings_df.groupby('Conference')['WINS'].rank(ascending=False, method='first').astype(int)
+    return teams_df, standings_df
+
+def syntheticPlayers(rng, players, teams_df):
+    team_rows = teams_df.iloc[rng.integers(0, len(teams_df), players)].reset_index(drop=True)
+    first = [f"First{i}" for i in range(players)]
+    last = [f"Last{i}" for i in range(players)]
+    return pd.DataFrame({
+        'TEAM_ID': team_rows['TEAM_ID'], 'TEAM_FULL_NAME': team_rows['TEAM_FULL_NAME'], 'PLAYER_ID': 1000000 + np.arange(players),
+        'PLAYER_FIRST_NAME': first, 'PLAYER_LAST_NAME': last, 'PLAYER_FULL_NAME': [f"{f} {l}" for f, l in zip(first, last)],
+        'POSITION': rng.choice(POSITIONS, players), 'TEAM_NAME': team_rows['NICKNAME'],
+        'JERSEY_NUMBER': rng.integers(0, 100, players).astype(str), 'HEIGHT': rng.choice(['6-2', '6-6', '6-9', '7-0'], players),
+        'WEIGHT': rng.integers(170, 280, players).astype(str), 'COLLEGE': rng.choice(['None', 'Duke', 'Kentucky', 'UCLA'], players),
+        'DRAFT_YEAR': rng.integers(2005, 2025, players), 'DRAFT_ROUND': rng.integers(0, 3, players), 'DRAFT_NUMBER': rng.integers(0, 61, players)
+    })
+
+def syntheticGradeInputs(rng, players_df):
+    # The merged per-player frame fetchGrades hands to gradePlayers, with plausible per-game ranges
+    n = len(players_df)
+    uniform = lambda low, high: rng.uniform(low, high, n)
+    return pd.DataFrame({
+        'PLAYER_ID': players_df['PLAYER_ID'], 'PLAYER_NAME': players_df['PLAYER_FULL_NAME'], 'TEAM_ID': players_df['TEAM_ID'],
+        'GP': rng.integers(1, 83, n), 'MIN': uniform(2, 38), 'PTS': uniform(0, 32), 'FGA': uniform(0, 22), 'FTA': uniform(0, 10),
+        'FG3_PCT': uniform(0, 0.5), 'TS_PCT': uniform(0.35, 0.7), 'EFG_PCT': uniform(0.35, 0.65), 'USG_PCT': uniform(0.08, 0.36),
+        'PCT_UAST_FGM': uniform(0, 1), 'PCT_PTS_3PT': uniform(0, 0.7), 'PCT_PTS_PAINT': uniform(0, 0.8),
+        'AST': uniform(0, 11), 'POTENTIAL_AST': uniform(0, 20), 'SECONDARY_AST': uniform(0, 1.5), 'TOV': uniform(0, 4.5),
+        'REB': uniform(0, 14), 'OREB': uniform(0, 4.5), 'DREB': uniform(0, 10), 'STL': uniform(0, 2.2), 'BLK': uniform(0, 3.5),
+        'PF': uniform(0, 4), 'DEF_WS': uniform(0, 0.2), 'DEFLECTIONS': uniform(0, 4), 'OPP_FG_PCT': uniform(0.35, 0.55),
+        'OPP_FG3_PCT': uniform(0.25, 0.45), 'PTS_FB': uniform(0, 5), 'DIST_FEET': uniform(3000, 14000), 'AVG_SPEED': uniform(3.8, 4.8),
+        'LOOSE_BALLS_RECOVERED': uniform(0, 1.5), 'DUNK_FGA': uniform(0, 6)
+    })
+
+def syntheticGrades(rng, players_df):
+    # Generated directly rather than through gradePlayers so building a large database does not wait on grading
+    grades_df = syntheticGradeInputs(rng, players_df)
+    for category in ['Scoring', 'Playmaking', 'Rebounding', 'Defense', 'Athleticism']:
+        grades_df[category] = rng.normal(50, 10, len(grades_df)).clip(0, 100)
+    grades_df['Archetype'] = rng.choice(ARCHETYPES, len(grades_df))
+    return grades_df
+
+def gamelogCounts(players, rows):
+    counts = np.full(players, rows // players)
+    counts[:rows % players] += 1
+    return counts
+
+def syntheticRawGamelogs(rng, players_df, counts):
+    # PlayerGameLog-shaped frame (before transformGamelog) with counts[i] games for the i-th player
+    total = int(counts.sum())
+    game_number = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    abbreviations = ('T' + (players_df['TEAM_ID'] - 1610612737).astype(str).str.zfill(2)).to_numpy()
+    opponents = rng.choice(np.unique(abbreviations), total)
+    home = rng.random(total) < 0.5
+    team = np.repeat(abbreviations, counts)
+    fga, fg3a, fta = rng.integers(0, 25, total), rng.integers(0, 12, total), rng.integers(0, 12, total)
+    fgm, fg3m, ftm = rng.binomial(fga, 0.47), rng.binomial(fg3a, 0.36), rng.binomial(fta, 0.78)
+    oreb, dreb = rng.integers(0, 6, total), rng.integers(0, 12, total)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frame = pd.DataFrame({
+            'SEASON_ID': '22024', 'Player_ID': np.repeat(players_df['PLAYER_ID'].to_numpy(), counts),
+            'Game_ID': (22400001 + game_number).astype(str),
+            'GAME_DATE': pd.Series(pd.Timestamp(SEASON_START) + pd.to_timedelta(game_number, unit='D')).dt.strftime('%b %d, %Y').str.upper(),
+            'MATCHUP': pd.Series(team) + np.where(home, ' vs. ', ' @ ') + opponents,
+            'WL': rng.choice(['W', 'L'], total), 'MIN': rng.integers(0, 45, total),
+            'FGM': fgm, 'FGA': fga, 'FG_PCT': np.round(fgm / fga, 3), 'FG3M': fg3m, 'FG3A': fg3a, 'FG3_PCT': np.round(fg3m / fg3a, 3),
+            'FTM': ftm, 'FTA': fta, 'FT_PCT': np.round(ftm / fta, 3), 'OREB': oreb, 'DREB': dreb, 'REB': oreb + dreb,
+            'AST': rng.integers(0, 14, total), 'STL': rng.integers(0, 5, total), 'BLK': rng.integers(0, 5, total),
+            'TOV': rng.integers(0, 7, total), 'PF': rng.integers(0, 7, total), 'PTS': 2 * fgm + fg3m + ftm,
+            'PLUS_MINUS': rng.integers(-25, 26, total), 'VIDEO_AVAILABLE': 1
+        })
+    frame['Player_Name'] = np.repeat(players_df['PLAYER_FULL_NAME'].to_numpy(), counts)
+    return frame
+
+def writeTable(frame, name, db, if_exists='replace'):
+    chunk = max(1, min(WRITE_CHUNK_ROWS, 30000 // max(1, len(frame.columns))))
+    frame.to_sql(name=name, con=db, if_exists=if_exists, index=False, chunksize=chunk, method='multi')
+
+def generate(args):
+    db = scratchEngine()
+    logging.basicConfig(level=logging.WARNING)  # takes precedence over scheduler's /var/log file handler
+    import scheduler
+
+    rng = np.random.default_rng(args.seed)
+    teams_df, standings_df = syntheticTeams(rng, args.teams)
+    players_df = syntheticPlayers(rng, args.players, teams_df)
+    writeTable(teams_df, 'teams', db)
+    writeTable(standings_df, 'standings', db)
+    writeTable(players_df, 'players', db)
+    writeTable(syntheticGrades(rng, players_df), 'grades', db)
+
+    # Write gamelogs in player blocks so 5M rows never sit in memory at once
+    counts = gamelogCounts(args.players, args.gamelogs)
+    block = max(1, args.chunk_rows // max(1, counts[0]))
+    written = 0
+    for first in range(0, args.players, block):
+        raw = syntheticRawGamelogs(rng, players_df.iloc[first:first + block], counts[first:first + block])
+        if raw.empty:
+            continue
+        gamelog_df = scheduler.transformGamelog(raw)
+        writeTable(gamelog_df, 'gamelogs', db, if_exists='replace' if written == 0 else 'append')
+        written += len(gamelog_df)
+        print(f"gamelogs: {written}/{args.gamelogs}", file=sys.stderr)
+    if db.dialect.name == 'mysql':
+        # The tables were just replaced, so conform them directly rather than through the one-time migrations
+        scheduler.ensureGamelogSchema()
+        schema.conformAll(db)
+
+    print(json.dumps({'teams': len(teams_df), 'players': len(players_df), 'gamelogs': written}))
+
+def percentiles(latencies_ms):
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3),
+            'mean_ms': round(float(latencies_ms.mean()), 3), 'max_ms': round(float(latencies_ms.max()), 3)}
+
+def benchRoute(flask_app, paths, total, concurrency, headers, warmup):
+    local = threading.local()
+
+    def hit(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = flask_app.test_client()
+        started = time.perf_counter()
+        response = client.get(paths[i % len(paths)], headers=headers)
+        response.get_data()
+        return time.perf_counter() - started, response.status_code
+
+    for i in range(warmup):
+        hit(i)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(hit, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies_ms = np.array([latency for latency, _ in results]) * 1000
+    return {
+        'requests': total, 'concurrency': concurrency, 'wall_s': round(wall, 3), 'throughput_rps': round(total / wall, 1),
+        **percentiles(latencies_ms), 'statuses': {str(code): n for code, n in Counter(code for _, code in results).items()}
+    }
+
+def syntheticGames(teams_df):
+    ids, names = teams_df['TEAM_ID'].tolist(), teams_df['NICKNAME'].tolist()
+    return [
+        [f"00224{i:05d}", 2, "Q3 5:00", names[i], ids[i], 80, names[i + 1], ids[i + 1], 78, "2025-01-01T00:00:00Z"]
+        for i in range(0, len(ids) - 1, 2)
+    ]
+
+def routeTargets(db, samples, rng):
+    player_ids = pd.read_sql("SELECT PLAYER_ID FROM players", con=db)['PLAYER_ID'].to_numpy()
+    teams_df = pd.read_sql("SELECT TEAM_ID, NICKNAME FROM teams", con=db)
+    player_ids = rng.choice(player_ids, min(samples, len(player_ids)), replace=False)
+    team_ids = rng.choice(teams_df['TEAM_ID'].to_numpy(), min(samples, len(teams_df)), replace=False)
+    games = syntheticGames(teams_df)
+    return games, {
+        '/players': ['/players'],
+        '/teams': ['/teams'],
+        '/team/<teamId>': [f"/team/{id}" for id in team_ids],
+        '/nba/player/<playerId>': [f"/nba/player/{id}" for id in player_ids],
+        '/nba/player/<playerId>?limit=20': [f"/nba/player/{id}?limit=20" for id in player_ids],
+        '/nba/players/profiles?ids=<10 players>': [f"/nba/players/profiles?ids={','.join(map(str, np.roll(player_ids, shift)[:10]))}" for shift in range(len(player_ids))],
+        '/games': ['/games'],
+        '/games/<gameId>': [f"/games/{game[0]}" for game in games],
+    }
+
+def rssMb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def runStage(stage):
+    # Each stage runs in a forked child so its peak RSS is not masked by earlier stages or by the route benchmarks
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+
+    def target():
+        baseline = rssMb()
+        started = time.perf_counter()
+        error = None
+        try:
+            result = stage()
+        except Exception as e:
+            result, error = None, f"{type(e).__name__}: {e}"
+        sender.send({
+            'wall_s': round(time.perf_counter() - started, 3), 'baseline_rss_mb': round(baseline, 1),
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'rows': result if isinstance(result, int) else None, 'error': error
+        })
+
+    process = context.Process(target=target)
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = {'error': 'stage process exited without reporting'}
+    process.join()
+    result['exitcode'] = process.exitcode
+    return result
+
+def stageTargets(args, scheduler, rng):
+    players_df = pd.read_sql("SELECT * FROM players", con=scheduler.db)
+    grade_players = players_df.sample(min(args.grade_players, len(players_df)), random_state=args.seed) if args.grade_players else players_df
+
+    def transformGamelogs():
+        raw = syntheticRawGamelogs(rng, players_df, gamelogCounts(len(players_df), args.stage_gamelogs))
+        return len(scheduler.transformGamelog(raw))
+
+    def grades():
+        return len(scheduler.gradePlayers(syntheticGradeInputs(rng, grade_players)))
+
+    stages = {
+        'transform_gamelogs': transformGamelogs,
+        'grades': grades,
+        'publish_snapshots': scheduler.publishSnapshots,
+        'publish_gamelog_index': scheduler.publishGamelogIndex,
+    }
+    if args.fixtures:
+        # Upstream stages replay recorded nba_api responses; they rewrite the scratch tables, so they run last
+        def replayed(stage):
+            def run():
+                scheduler.fetcher.setMode('replay', args.fixtures, args.latency)
+                return stage()
+            return run
+        for stage in [scheduler.fetchPlayers, scheduler.fetchTeams, scheduler.fetchStandings, scheduler.fetchGamelogs, scheduler.fetchGrades]:
+            stages[stage.__name__] = replayed(stage)
+    return stages
+
+def gitRevision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def tableCounts(db):
+    counts = {}
+    with db.connect() as conn:
+        for table in ['players', 'grades', 'teams', 'standings', 'gamelogs']:
+            counts[table] = conn.execute(sqlalchemy.text(f"SELECT COUNT(*) FROM {table}")).scalar()
+    return counts
+
+def run(args):
+    db = scratchEngine()
+    os.environ.setdefault('SNAPSHOT_DIR', tempfile.mkdtemp(prefix='nba_benchmark_snapshots_'))
+    os.environ.setdefault('GAMELOG_INDEX_DIR', tempfile.mkdtemp(prefix='nba_benchmark_gamelog_index_'))
+    # A fresh grade state per run keeps synthetic grades out of the scheduler's and always times a full refit
+    os.environ.setdefault('GRADE_STATE_PATH', os.path.join(tempfile.mkdtemp(prefix='nba_benchmark_grades_'), 'grade_state.npz'))
+    logging.basicConfig(level=logging.WARNING)
+    import app
+    import scheduler
+
+    rng = np.random.default_rng(args.seed)
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(), 'revision': gitRevision(), 'python': platform.python_version(),
+            'database': db.dialect.name, 'tables': tableCounts(db), 'args': {key: value for key, value in vars(args).items() if key != 'func'}
+        },
+        'routes': {},
+        'stages': {}
+    }
+
+    if not args.skip_routes:
+        if args.published:
+            scheduler.publishSnapshots()
+            scheduler.publishGamelogIndex()
+        games, targets = routeTargets(db, args.samples, rng)
+        app.scoreboard_cache = app.ScoreboardCache(lambda: games, app.SCOREBOARD_TTL, app.SCOREBOARD_STALE_TTL)
+        headers = {'Accept-Encoding': 'br, gzip'} if args.compressed else {}
+        for route, paths in targets.items():
+            if args.routes and route not in args.routes:
+                continue
+            results['routes'][route] = benchRoute(app.app, paths, args.requests, args.concurrency, headers, warmup=min(len(paths), 20))
+            print(f"{route}: p50 {results['routes'][route]['p50_ms']}ms", file=sys.stderr)
+
+    if not args.skip_stages:
+        for name, stage in stageTargets(args, scheduler, rng).items():
+            if args.stages and name not in args.stages:
+                continue
+            results['stages'][name] = runStage(stage)
+            print(f"{name}: {results['stages'][name].get('wall_s')}s", file=sys.stderr)
+
+    output = json.dumps(results, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+def compare(args):
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    for section, metrics in [('routes', ['p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps']), ('stages', ['wall_s', 'peak_rss_mb'])]:
+        for name in after[section]:
+            if name not in before[section]:
+                continue
+            changes = []
+            for metric in metrics:
+                old, new = before[section][name].get(metric), after[section][name].get(metric)
+                if old and new is not None:
+                    changes.append(f"{metric} {old} -> {new} ({(new - old) / old * 100:+.1f}%)")
+            print(f"{section} {name}: {', '.join(changes)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(required=True)
+
+    generate_parser = commands.add_parser('generate', help="fill DATABASE_URL with synthetic players, grades, teams, standings and gamelogs")
+    generate_parser.add_argument('--players', type=int, default=500)
+    generate_parser.add_argument('--teams', type=int, default=30)
+    generate_parser.add_argument('--gamelogs', type=int, default=10000)
+    generate_parser.add_argument('--chunk-rows', type=int, default=200000, help="gamelog rows generated and written per block")
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.set_defaults(func=generate)
+
+    run_parser = commands.add_parser('run', help="benchmark routes and scheduler stages, emitting JSON")
+    run_parser.add_argument('--requests', type=int, default=500, help="requests per route")
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--samples', type=int, default=100, help="distinct player/team ids per parameterized route")
+    run_parser.add_argument('--routes', nargs='*', help="only these routes, e.g. '/players' '/team/<teamId>'")
+    run_parser.add_argument('--stages', nargs='*', help="only these stages, e.g. grades transform_gamelogs")
+    run_parser.add_argument('--compressed', action='store_true', help="send Accept-Encoding: br, gzip like a browser")
+    run_parser.add_argument('--published', action='store_true', help="publish snapshots and the gamelog index first so routes serve them")
+    run_parser.add_argument('--stage-gamelogs', type=int, default=100000, help="raw gamelog rows for transform_gamelogs")
+    run_parser.add_argument('--grade-players', type=int, default=0, help="players graded by the grades stage (0 = all)")
+    run_parser.add_argument('--fixtures', help="recorded nba_api fixtures; adds the replayed fetch stages")
+    run_parser.add_argument('--latency', type=float, default=0, help="simulated seconds per replayed response")
+    run_parser.add_argument('--skip-routes', action='store_true')
+    run_parser.add_argument('--skip-stages', action='store_true')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--output')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help="print metric changes between two result files")
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
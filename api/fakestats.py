@@ -0,0 +1,77 @@
+import argparse
+import json
+import random
+import threading
+import time
+from flask import Flask, request
+from werkzeug.serving import make_server
+import fetcher
+
+# Local stand-in for stats.nba.com, for exercising the fetcher (rate limiting, retries, caching) without the real API:
+#   python fakestats.py --port 9000 --latency 0.2 --throttle-rate 0.1
+#   NBA_STATS_BASE_URL='http://127.0.0.1:9000/stats/{endpoint}' python scheduler.py --once
+# It answers with the recorded fixture for the request when --fixtures has one, or an empty result set otherwise.
+
+class FakeStats:
+    # latency is seconds per response; throttle_rate and error_rate are the fractions of requests answered with 429
+    # and 500. All three can be changed while the server runs.
+    def __init__(self, latency=0.0, throttle_rate=0.0, error_rate=0.0, fixture_dir=None, seed=None):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.fixture_dir = fixture_dir
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.statuses = {}
+        self.server = None
+        self.app = Flask(__name__)
+        self.app.add_url_rule('/stats/<endpoint>', view_func=self.respond)
+
+    def payload(self, endpoint, parameters):
+        if self.fixture_dir:
+            try:
+                with open(fetcher.requestPath(self.fixture_dir, endpoint, parameters)) as f:
+                    return json.load(f)['response']
+            except OSError:
+                pass
+        return json.dumps({'resource': endpoint, 'parameters': parameters, 'resultSets': []})
+
+    def respond(self, endpoint):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self.lock:
+            draw = self.random.random()
+        if draw < self.throttle_rate:
+            status, body = 429, "Too Many Requests"
+        elif draw < self.throttle_rate + self.error_rate:
+            status, body = 500, "Internal Server Error"
+        else:
+            status, body = 200, self.payload(endpoint.lower(), request.args.to_dict())
+        with self.lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+        return self.app.response_class(body, status=status, mimetype='application/json' if status == 200 else 'text/plain')
+
+    def serve(self, host='127.0.0.1', port=0):
+        # Serves from a background thread and returns the base URL to give nba_api
+        self.server = make_server(host, port, self.app, threaded=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self.server.server_port}/stats/{{endpoint}}"
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds per response")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument('--fixtures', help="recorded fixtures to answer with, from scheduler.py --mode record")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+    fake = FakeStats(args.latency, args.throttle_rate, args.error_rate, args.fixtures, args.seed)
+    print(f"NBA_STATS_BASE_URL=http://{args.host}:{args.port}/stats/{{endpoint}}")
+    make_server(args.host, args.port, fake.app, threaded=True).serve_forever()
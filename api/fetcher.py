@@ -0,0 +1,332 @@
+import contextvars
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+import requests
+import requests.adapters
+from requests.exceptions import Timeout
+from nba_api.stats.library.http import NBAStatsHTTP
+
+# Point nba_api at a local fake stats endpoint for testing, e.g. fakestats.py at http://127.0.0.1:9000/stats/{endpoint}
+if os.getenv('NBA_STATS_BASE_URL'):
+    NBAStatsHTTP.base_url = os.getenv('NBA_STATS_BASE_URL')
+
+NBA_API_RATE = float(os.getenv('NBA_API_RATE', 1.0))
+NBA_API_MIN_RATE = float(os.getenv('NBA_API_MIN_RATE', 0.1))
+NBA_API_MAX_RATE = float(os.getenv('NBA_API_MAX_RATE', 4.0))
+NBA_API_WORKERS = int(os.getenv('NBA_API_WORKERS', 4))
+NBA_API_TIMEOUT = int(os.getenv('NBA_API_TIMEOUT', 60))
+
+# Responses are cached on disk by a hash of endpoint + parameters. NBA_API_CACHE_TTL is the default
+# freshness in seconds (0 disables caching); NBA_API_CACHE_TTL_<ENDPOINT> overrides it per endpoint.
+NBA_API_CACHE_DIR = os.getenv('NBA_API_CACHE_DIR', '/var/lib/nba_scheduler/http_cache')
+NBA_API_CACHE_TTL = float(os.getenv('NBA_API_CACHE_TTL', 3600))
+ENDPOINT_TTLS = {
+    'teamdetails': 86400,
+}
+
+# NBA_API_MODE=record also writes every response into NBA_API_FIXTURE_DIR; NBA_API_MODE=replay serves responses
+# only from there, never touching the network, after an optional NBA_API_REPLAY_LATENCY seconds per request
+NBA_API_MODES = ('live', 'record', 'replay')
+NBA_API_MODE = os.getenv('NBA_API_MODE', 'live')
+NBA_API_FIXTURE_DIR = os.getenv('NBA_API_FIXTURE_DIR', '/var/lib/nba_scheduler/fixtures')
+NBA_API_REPLAY_LATENCY = float(os.getenv('NBA_API_REPLAY_LATENCY', 0))
+
+# stats.nba.com signals throttling with 429s, dropped connections, timeouts or an HTML error page
+# where JSON was expected, which nba_api surfaces as a ValueError while parsing
+RETRYABLE_ERRORS = (requests.exceptions.RequestException, Timeout, ValueError)
+
+class RateLimiter:
+    # Token bucket whose refill rate adapts: additive increase on success, multiplicative decrease on throttling.
+    # With shared=True the bucket lives in shared memory so forked worker processes draw from one budget.
+    def __init__(self, rate, min_rate, max_rate, burst=1, increase=0.05, decrease=0.5, shared=False):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        if shared:
+            self.lock = multiprocessing.Lock()
+            self.state = multiprocessing.RawArray('d', [rate, burst, time.monotonic()])
+        else:
+            self.lock = threading.Lock()
+            self.state = [rate, burst, time.monotonic()]
+
+    @property
+    def rate(self):
+        return self.state[0]
+
+    def refill(self):
+        rate, tokens, updated = self.state[:]
+        now = time.monotonic()
+        self.state[1] = min(self.burst, tokens + (now - updated) * rate)
+        self.state[2] = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                self.refill()
+                if self.state[1] >= 1:
+                    self.state[1] -= 1
+                    return
+                wait_time = (1 - self.state[1]) / self.state[0]
+            time.sleep(wait_time)
+
+    def success(self):
+        with self.lock:
+            self.state[0] = min(self.max_rate, self.state[0] + self.increase)
+
+    def throttled(self):
+        with self.lock:
+            self.refill()
+            self.state[0] = max(self.min_rate, self.state[0] * self.decrease)
+            self.state[1] = min(self.state[1], 0)
+        logging.warning(f"Upstream throttling, request rate lowered to {self.rate:.2f}/s")
+
+class Unlimited:
+    # Stand-in limiter for replay runs, where there is no upstream to protect
+    rate = float('inf')
+
+    def acquire(self):
+        pass
+
+    def success(self):
+        pass
+
+    def throttled(self):
+        pass
+
+def checkMode(mode):
+    if mode not in NBA_API_MODES:
+        raise ValueError(f"Unknown nba_api mode {mode!r}, expected one of {', '.join(NBA_API_MODES)}")
+
+def makeLimiter(rate, min_rate=NBA_API_MIN_RATE, max_rate=NBA_API_MAX_RATE, shared=False):
+    if NBA_API_MODE == 'replay':
+        return Unlimited()
+    return RateLimiter(rate, min_rate, max_rate, shared=shared)
+
+checkMode(NBA_API_MODE)
+stats_limiter = makeLimiter(NBA_API_RATE)
+
+# Caps upstream requests in flight across every pool in the process (graph tasks and their per-team/per-player
+# fan-outs), on top of the request rate the limiter allows
+inflight = threading.BoundedSemaphore(NBA_API_WORKERS)
+
+# Limiter for requests made under fetchWithRetry when it was given one other than stats_limiter. Only requests that
+# actually go upstream take a token or an inflight slot, and only their responses adjust the rate.
+active_limiter = contextvars.ContextVar('active_limiter', default=None)
+
+def setMode(mode, fixture_dir=None, latency=None):
+    global NBA_API_MODE, NBA_API_FIXTURE_DIR, NBA_API_REPLAY_LATENCY, stats_limiter
+    checkMode(mode)
+    NBA_API_MODE = mode
+    NBA_API_FIXTURE_DIR = fixture_dir or NBA_API_FIXTURE_DIR
+    NBA_API_REPLAY_LATENCY = NBA_API_REPLAY_LATENCY if latency is None else latency
+    stats_limiter = makeLimiter(NBA_API_RATE)
+
+def endpointTtl(endpoint):
+    return float(os.getenv(f"NBA_API_CACHE_TTL_{endpoint.upper()}", ENDPOINT_TTLS.get(endpoint, NBA_API_CACHE_TTL)))
+
+def requestPath(root, endpoint, parameters):
+    request_key = json.dumps([endpoint, sorted((key, "" if value is None else str(value)) for key, value in parameters.items())])
+    digest = hashlib.sha256(request_key.encode('utf-8')).hexdigest()
+    return os.path.join(root, endpoint, digest + '.json')
+
+def cachePath(endpoint, parameters):
+    return requestPath(NBA_API_CACHE_DIR, endpoint, parameters)
+
+def readCache(path, ttl):
+    try:
+        if time.time() - os.path.getmtime(path) < ttl:
+            with open(path) as f:
+                return f.read()
+    except OSError:
+        pass
+    return None
+
+def writeCache(path, contents):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    staging = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(staging, 'w') as f:
+        f.write(contents)
+    os.replace(staging, path)
+
+def pruneCache(max_age=None):
+    max_age = max_age or max([NBA_API_CACHE_TTL, *ENDPOINT_TTLS.values()])
+    now = time.time()
+    for directory, _, files in os.walk(NBA_API_CACHE_DIR):
+        for name in files:
+            path = os.path.join(directory, name)
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+            except OSError:
+                pass
+
+# Per-caller tally of requests by source ('upstream', 'cached', 'replayed'). The pools below run work in a copy of
+# the submitting context, so requests made by fan-out threads are counted against whoever set request_counts.
+request_counts = contextvars.ContextVar('request_counts', default=None)
+request_counts_lock = threading.Lock()
+
+def countRequest(source):
+    counts = request_counts.get()
+    if counts is not None:
+        with request_counts_lock:
+            counts[source] = counts.get(source, 0) + 1
+
+class FixtureMissing(LookupError):
+    pass
+
+def recordFixture(endpoint, parameters, contents):
+    fixture = {'endpoint': endpoint, 'parameters': dict(parameters), 'response': contents}
+    writeCache(requestPath(NBA_API_FIXTURE_DIR, endpoint, parameters), json.dumps(fixture, sort_keys=True, default=str))
+
+def replayFixture(endpoint, parameters):
+    path = requestPath(NBA_API_FIXTURE_DIR, endpoint, parameters)
+    try:
+        with open(path) as f:
+            fixture = json.load(f)
+    except OSError:
+        raise FixtureMissing(f"No recorded {endpoint} response for {parameters} in {NBA_API_FIXTURE_DIR}")
+    if NBA_API_REPLAY_LATENCY > 0:
+        time.sleep(NBA_API_REPLAY_LATENCY)
+    return fixture['response']
+
+send_api_request = NBAStatsHTTP.send_api_request
+
+def sendUpstream(self, endpoint, parameters, *args, **kwargs):
+    limiter = active_limiter.get() or stats_limiter
+    limiter.acquire()
+    try:
+        with inflight:
+            data = send_api_request(self, endpoint, parameters, *args, **kwargs)
+    except (Timeout, requests.exceptions.ConnectionError):
+        limiter.throttled()
+        raise
+    status_code = getattr(data, '_status_code', None)
+    if status_code in (429, 503) or (status_code is not None and status_code < 400 and not data.valid_json()):
+        # An HTML error page in place of JSON is stats.nba.com throttling too
+        limiter.throttled()
+    elif status_code is None or status_code < 400:
+        limiter.success()
+    return data, status_code
+
+def cachedSendApiRequest(self, endpoint, parameters, *args, **kwargs):
+    # Every nba_api stats endpoint goes through NBAStatsHTTP.send_api_request, so caching, status handling and
+    # record/replay live here
+    endpoint_key = endpoint.lower()
+    if NBA_API_MODE == 'replay':
+        contents = replayFixture(endpoint_key, parameters)
+        countRequest('replayed')
+        return self.nba_response(response=contents, status_code=200, url=f"replay://{endpoint_key}")
+
+    ttl = endpointTtl(endpoint_key)
+    path = cachePath(endpoint_key, parameters)
+    contents = readCache(path, ttl) if ttl > 0 else None
+    if contents is not None:
+        countRequest('cached')
+        data = self.nba_response(response=contents, status_code=200, url=f"cache://{endpoint_key}")
+    else:
+        countRequest('upstream')
+        data, status_code = sendUpstream(self, endpoint, parameters, *args, **kwargs)
+        if status_code is not None and status_code >= 400:
+            response = requests.Response()
+            response.status_code = status_code
+            raise requests.exceptions.HTTPError(f"{status_code} from {endpoint}", response=response)
+        if ttl > 0 and data.valid_json():
+            writeCache(path, data.get_response())
+
+    if NBA_API_MODE == 'record' and data.valid_json():
+        recordFixture(endpoint_key, parameters, data.get_response())
+    return data
+
+def pooledSession(pool_size):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+NBAStatsHTTP.send_api_request = cachedSendApiRequest
+NBAStatsHTTP.set_session(pooledSession(max(10, NBA_API_WORKERS * 2)))
+
+def fetchWithRetry(call, label, limiter=None, max_retries=5):
+    # Rate limiting and throttle feedback happen per upstream request in cachedSendApiRequest, so cached and
+    # replayed responses are neither delayed nor counted as successes
+    retry_count = 0
+    while True:
+        try:
+            return contextvars.copy_context().run(limitedCall, call, limiter)
+        except RETRYABLE_ERRORS as e:
+            retry_count += 1
+            if retry_count == max_retries:
+                logging.error(f"Max retries reached for {label}: {e}")
+                raise
+            wait_time = (2 ** retry_count) + random.uniform(0, 1)
+            logging.error(f"Retry {retry_count}/{max_retries} for {label} after {wait_time:.2f}s: {e}")
+            time.sleep(wait_time)
+
+def limitedCall(call, limiter):
+    if limiter is not None:
+        active_limiter.set(limiter)
+    return call()
+
+def fetchFrame(endpoint, label, frame=0, max_retries=5, **params):
+    return fetchWithRetry(lambda: endpoint(timeout=NBA_API_TIMEOUT, **params).get_data_frames()[frame], label, max_retries=max_retries)
+
+def fetchConcurrently(items, call, label, limiter=None, workers=NBA_API_WORKERS, max_retries=5):
+    # Yields (item, result, error) as each fetch finishes; a failed item does not stop the others
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(contextvars.copy_context().run, fetchWithRetry, lambda item=item: call(item), label(item), limiter, max_retries): item
+            for item in items
+        }
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield item, future.result(), None
+            except RETRYABLE_ERRORS as e:
+                yield item, None, e
+
+def fetchGraph(tasks, workers=NBA_API_WORKERS, attempts=2):
+    # tasks maps name -> (dependency names, fn); fn is called with its dependencies' results once they are all
+    # available. A failing task is retried on its own, and only its dependents wait on it. Every other task still
+    # runs to completion (filling the response cache for a rerun) before the first failure is raised.
+    results, errors, tries = {}, {}, {}
+    pending = dict(tasks)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while pending or running:
+            for name, (dependencies, fn) in list(pending.items()):
+                if any(dependency in errors for dependency in dependencies):
+                    errors[name] = errors[next(d for d in dependencies if d in errors)]
+                    del pending[name]
+                elif all(dependency in results for dependency in dependencies):
+                    tries[name] = tries.get(name, 0) + 1
+                    running[pool.submit(contextvars.copy_context().run, fn, *(results[dependency] for dependency in dependencies))] = name
+                    del pending[name]
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    if tries[name] < attempts:
+                        logging.error(f"{name} failed, retrying on its own: {e}")
+                        pending[name] = tasks[name]
+                    else:
+                        logging.error(f"{name} failed after {tries[name]} attempts: {e}")
+                        errors[name] = e
+    if pending:
+        raise ValueError(f"Unresolvable dependencies for {', '.join(pending)}")
+    if errors:
+        raise next(iter(errors.values()))
+    return results
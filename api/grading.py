@@ -0,0 +1,195 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ["Scoring", "Playmaking", "Rebounding", "Defense", "Athleticism"]
+
+# Each grade is a weighted sum of min-max normalized stats, scaled to 0-100, then re-centred on 50 with the
+# category's spread (factor points per standard deviation). Weights are summed in the order listed.
+GRADE_SPEC = {
+    "Scoring": {"factor": 12, "weights": [("PTS", 0.30), ("FGA", 0.10), ("FTA", 0.10), ("TS_PCT", 0.20), ("EFG_PCT", 0.10), ("PCT_UAST_FGM", 0.20)]},
+    "Playmaking": {"factor": 10, "weights": [("AST", 0.30), ("POTENTIAL_AST", 0.20), ("SECONDARY_AST", 0.20), ("USG_PCT", 0.15), ("TOV", -0.15)]},
+    "Rebounding": {"factor": 10, "weights": [("REB", 0.40), ("OREB", 0.30), ("DREB", 0.30)]},
+    "Defense": {"factor": 8, "weights": [("BLK", 0.30), ("DEFLECTIONS", 0.15), ("STL", 0.15), ("DEF_WS", 0.10), ("PF", -0.15), ("1-OPP_FG_PCT", 0.15)]},
+    "Athleticism": {"factor": 12, "weights": [("PTS_FB", 0.25), ("DIST_FEET", 0.20), ("AVG_SPEED", 0.20), ("LOOSE_BALLS_RECOVERED", 0.20), ("DUNK_FGA", 0.15)]},
+}
+
+# Features that are not plain columns of the merged stats frame
+FEATURE_TRANSFORMS = {
+    "1-OPP_FG_PCT": lambda frame: 1 - frame["OPP_FG_PCT"],
+}
+
+# The engine keeps the previous run's inputs, normalized matrix and scaling parameters here. Scaling is only
+# refit when a feature's min/max, or a category's mean/std, moves by more than GRADE_RESCALE_THRESHOLD of
+# its spread; otherwise only players whose inputs changed are recomputed.
+GRADE_STATE_PATH = os.getenv('GRADE_STATE_PATH', '/var/lib/nba_scheduler/grade_state.npz')
+GRADE_RESCALE_THRESHOLD = float(os.getenv('GRADE_RESCALE_THRESHOLD', 0.02))
+
+# Archetype decision table: for each (top, second) category pair, rules are tried in order and the first whose
+# condition holds names the player. Conditions are the columns built by archetypeConditions; None always holds.
+ARCHETYPE_RULES = {
+    ("Scoring", "Playmaking"): [("shooter", "Sharpshooting Maestro"), ("star", "Dual-Threat Maestro"), ("gap", "Shot Creator"), (None, "Scoring Playmaker")],
+    ("Scoring", "Athleticism"): [("rim_finisher", "Explosive Finisher"), ("star", "Athletic Scorer"), ("gap", "Dynamic Finisher"), (None, "Scoring Athlete")],
+    ("Scoring", "Defense"): [("perimeter_defender", "Perimeter Two-Way Threat"), ("star", "Two-Way Star"), ("gap", "Defensive Scorer"), (None, "Scoring Defender")],
+    ("Scoring", "Rebounding"): [("rim_finisher", "Scoring Interior Force"), ("star", "Interior Dual-Threat"), ("gap", "Paint Powerhouse"), (None, "Scoring Rebounder")],
+    ("Playmaking", "Scoring"): [("orchestrator", "Orchestrating Star"), ("star", "Playmaking Scorer"), ("gap", "Dual-Threat Guard"), (None, "Facilitating Scorer")],
+    ("Playmaking", "Defense"): [("perimeter_defender", "Defensive Floor General"), ("star", "Disruptive Playmaker"), ("gap", "Pesky Facilitator"), (None, "Defensive Distributor")],
+    ("Playmaking", "Athleticism"): [("star", "Dynamic Facilitator"), ("gap", "Pace Pusher"), (None, "Athletic Playmaker")],
+    ("Playmaking", "Rebounding"): [("star", "Rebounding Playmaker"), ("gap", "Rebound Distributor"), ("weak_third", "Board Passer"), (None, "Rebounding Maestro")],
+    ("Rebounding", "Defense"): [("rim_protector", "Rim Guardian"), ("star", "Defensive Rebounder"), ("gap", "Paint Protector"), (None, "Rebounding Defender")],
+    ("Rebounding", "Scoring"): [("star", "Scoring Boardmaster"), ("gap", "Post Operator"), (None, "Rebounding Scorer")],
+    ("Rebounding", "Athleticism"): [("star", "Athletic Board-Crasher"), ("gap", "Energy Big"), (None, "Rebounding Athlete")],
+    ("Rebounding", "Playmaking"): [("star", "Facilitating Rebounder"), ("gap", "Outlet Specialist"), (None, "Board Facilitator")],
+    ("Defense", "Rebounding"): [("rim_protector", "Defensive Anchor"), ("star", "Rebounding Stopper"), ("gap", "Interior Wall"), (None, "Defensive Rebounder")],
+    ("Defense", "Athleticism"): [("perimeter_defender", "Perimeter Hawk"), ("star", "Athletic Defender"), ("gap", "Active Defender"), (None, "Hustle Defender")],
+    ("Defense", "Scoring"): [("star", "Two-Way Threat"), ("gap", "Defensive Scorer"), (None, "Scoring Stopper")],
+    ("Defense", "Playmaking"): [("star", "Playmaking Defender"), ("gap", "Pesky Facilitator"), (None, "Disruptive Distributor")],
+    ("Athleticism", "Scoring"): [("rim_finisher", "Athletic Phenom"), ("star", "Scoring Dynamo"), ("gap", "Highlight Maker"), (None, "Athletic Scorer")],
+    ("Athleticism", "Defense"): [("perimeter_defender", "Energy Stopper"), ("star", "Defensive Athlete"), ("gap", "Hustle Spark"), (None, "Active Athlete")],
+    ("Athleticism", "Rebounding"): [("star", "Rebounding Dynamo"), ("gap", "Rebound Athlete"), (None, "Athletic Board-Grabber")],
+    ("Athleticism", "Playmaking"): [("star", "Playmaking Athlete"), ("gap", "Fast-Break Igniter"), (None, "Dynamic Distributor")],
+}
+DEFAULT_ARCHETYPE = "Versatile Contributor"
+
+def rankCategories(scores):
+    # Column indices of each row's categories, best first. A stable sort keeps the earlier category on ties,
+    # as sorted(..., reverse=True) does; rows with a NaN grade have no consistent order, so they go through
+    # sorted() itself to land on the same permutation it always produced.
+    order = np.argsort(-scores, axis=1, kind='stable')
+    for i in np.flatnonzero(np.isnan(scores).any(axis=1)):
+        order[i] = sorted(range(scores.shape[1]), key=lambda c: scores[i, c], reverse=True)
+    return order
+
+def archetypeConditions(frame, ranked):
+    medians = frame[["STL", "BLK", "SECONDARY_AST", "OPP_FG3_PCT"]].median()
+    column = lambda name: frame[name].to_numpy(dtype=float)
+    top, second, third = ranked[:, 0], ranked[:, 1], ranked[:, 2]
+    score_diff = top - second
+    return {
+        "shooter": (column("PCT_PTS_3PT") > 0.40) & (column("FG3_PCT") > 0.37),
+        "rim_finisher": (column("DUNK_FGA") > 4.0) | (column("PCT_PTS_PAINT") > 0.5),
+        "perimeter_defender": (column("STL") > medians["STL"] * 1.5) & (column("OPP_FG3_PCT") < medians["OPP_FG3_PCT"] * 0.9),
+        "rim_protector": column("BLK") > medians["BLK"] * 1.5,
+        "orchestrator": column("SECONDARY_AST") > medians["SECONDARY_AST"] * 1.5,
+        "star": (score_diff <= 10) & (top >= 75),
+        "gap": score_diff > 15,
+        "weak_third": third < 60,
+    }
+
+def assignArchetypes(frame):
+    # Expects the category grades plus Avg_Grade and the raw stat columns the rules read; returns one label per row
+    scores = frame[CATEGORIES].to_numpy(dtype=float)
+    order = rankCategories(scores)
+    ranked = np.take_along_axis(scores, order, axis=1)
+    conditions = archetypeConditions(frame, ranked)
+
+    rules = [
+        ((frame["Avg_Grade"].to_numpy(dtype=float) < 40) & (frame["MIN"].to_numpy(dtype=float) < 15), "Benchwarmer"),
+        (((scores >= 45) & (scores <= 55)).all(axis=1), "Role Player"),
+    ]
+    for (top_cat, second_cat), pair_rules in ARCHETYPE_RULES.items():
+        pair = (order[:, 0] == CATEGORIES.index(top_cat)) & (order[:, 1] == CATEGORIES.index(second_cat))
+        for condition, label in pair_rules:
+            rules.append((pair if condition is None else pair & conditions[condition], label))
+
+    labels = np.full(len(frame), DEFAULT_ARCHETYPE, dtype=object)
+    assigned = np.zeros(len(frame), dtype=bool)
+    for mask, label in rules:
+        mask = mask & ~assigned
+        labels[mask] = label
+        assigned |= mask
+    return labels
+
+def featureRange(X):
+    # Same constant-column handling as sklearn's MinMaxScaler, so a full refit reproduces its output exactly
+    data_min = np.nanmin(X, axis=0)
+    data_range = np.nanmax(X, axis=0) - data_min
+    data_range[data_range < 10 * np.finfo(data_range.dtype).eps] = 1.0
+    return data_min, data_range
+
+def normalize(X, data_min, data_range):
+    scale = 1.0 / data_range
+    return X * scale + (0 - data_min * scale)
+
+def shifted(old, new, spread, threshold):
+    return bool((np.abs(new - old) > threshold * np.abs(spread)).any())
+
+class GradeEngine:
+    def __init__(self, spec=GRADE_SPEC, state_path=GRADE_STATE_PATH, threshold=GRADE_RESCALE_THRESHOLD):
+        self.spec = spec
+        self.state_path = state_path
+        self.threshold = threshold
+        self.categories = list(spec)
+        self.features = list(dict.fromkeys(feature for category in spec.values() for feature, _ in category["weights"]))
+        self.columns = {feature: i for i, feature in enumerate(self.features)}
+
+    def featureMatrix(self, frame):
+        return np.column_stack([
+            (FEATURE_TRANSFORMS[feature](frame) if feature in FEATURE_TRANSFORMS else frame[feature]).to_numpy(dtype=float)
+            for feature in self.features
+        ])
+
+    def scores(self, N):
+        S = np.empty((len(N), len(self.categories)))
+        for c, category in enumerate(self.categories):
+            total = None
+            for feature, weight in self.spec[category]["weights"]:
+                term = weight * N[:, self.columns[feature]]
+                total = term if total is None else total + term
+            S[:, c] = total * 100
+        return S
+
+    def load(self):
+        try:
+            with np.load(self.state_path, allow_pickle=False) as state:
+                state = dict(state)
+        except (OSError, ValueError):
+            return None
+        if len(state['ids']) == 0 or list(state['features']) != self.features or list(state['categories']) != self.categories:
+            return None
+        return state
+
+    def save(self, state):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        staging = f"{self.state_path}.{os.getpid()}.tmp.npz"
+        np.savez(staging, features=np.array(self.features), categories=np.array(self.categories), **state)
+        os.replace(staging, self.state_path)
+
+    def grade(self, frame):
+        ids = frame["PLAYER_ID"].to_numpy(dtype='int64')
+        X = self.featureMatrix(frame)
+        data_min, data_range = featureRange(X)
+        state = self.load()
+
+        changed = np.ones(len(ids), dtype=bool)
+        if state is None or shifted(state['data_min'], data_min, state['data_range'], self.threshold) \
+                or shifted(state['data_min'] + state['data_range'], data_min + data_range, state['data_range'], self.threshold):
+            N = normalize(X, data_min, data_range)
+            S = self.scores(N)
+        else:
+            data_min, data_range = state['data_min'], state['data_range']
+            pos = np.minimum(np.searchsorted(state['ids'], ids), len(state['ids']) - 1)
+            found = state['ids'][pos] == ids
+            previous = state['X'][pos]
+            changed = ~(found & ((previous == X) | (np.isnan(previous) & np.isnan(X))).all(axis=1))
+            N, S = state['N'][pos], state['S'][pos]
+            N[changed] = normalize(X[changed], data_min, data_range)
+            S[changed] = self.scores(N[changed])
+
+        score_mean = pd.DataFrame(S).mean().to_numpy()
+        score_std = pd.DataFrame(S).std().to_numpy()
+        if state is not None and not changed.all() and not shifted(state['score_mean'], score_mean, state['score_std'], self.threshold) \
+                and not shifted(state['score_std'], score_std, state['score_std'], self.threshold):
+            score_mean, score_std = state['score_mean'], state['score_std']
+        logging.info(f"Graded {len(ids)} players, {int(changed.sum())} recomputed")
+
+        order = np.argsort(ids, kind='stable')
+        self.save({
+            'ids': ids[order], 'X': X[order], 'N': N[order], 'S': S[order], 'data_min': data_min, 'data_range': data_range,
+            'score_mean': score_mean, 'score_std': score_std
+        })
+
+        factors = np.array([self.spec[category]["factor"] for category in self.categories])
+        grades = ((S - score_mean) / score_std * factors + 50).clip(0, 100)
+        return pd.DataFrame(grades, columns=self.categories, index=frame.index)
@@ -0,0 +1,176 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+import numpy as np
+import pandas as pd
+
+# Published gamelog indexes live in GAMELOG_INDEX_DIR/<version>/, with GAMELOG_INDEX_DIR/CURRENT naming the live one.
+# Each column is its own .npy file, memory-mapped read-only by every API worker so they share one copy in the page cache.
+GAMELOG_INDEX_DIR = os.getenv('GAMELOG_INDEX_DIR', '/var/lib/nba_scheduler/gamelog_index')
+GAMELOG_INDEX_KEEP = int(os.getenv('GAMELOG_INDEX_KEEP', 2))
+
+# Stored gamelog columns and their compact dtypes. 'str' columns are interned: a vocabulary in meta.json plus the
+# smallest unsigned codes that fit it. float32 columns hold values with a few decimals (minutes, shooting pcts) and
+# are served at their shortest repr, which is the value the API sent before; Fantasy Score keeps full precision.
+COLUMNS = {
+    'Game_ID': 'int32', 'GAME_DATE': 'str', 'MATCHUP': 'str', 'Opponent': 'str', 'WL': 'str', 'MIN': 'float32',
+    'FG Made': 'int16', 'FG Attempted': 'int16', 'FG_PCT': 'float32', '3-PT Made': 'int16', '3-PT Attempted': 'int16',
+    'FG3_PCT': 'float32', 'Free Throws Made': 'int16', 'Free Throws Attempted': 'int16', 'FT_PCT': 'float32',
+    'Offensive Rebounds': 'int16', 'Defensive Rebounds': 'int16', 'Rebounds': 'int16', 'Assists': 'int16',
+    'Steals': 'int16', 'Blocked Shots': 'int16', 'Turnovers': 'int16', 'PF': 'int16', 'Points': 'int16',
+    'PLUS_MINUS': 'int16', 'Pts+Rebs+Asts': 'int16', 'Pts+Rebs': 'int16', 'Pts+Asts': 'int16', 'Rebs+Asts': 'int16',
+    'Blks+Stls': 'int16', 'Fantasy Score': 'float64'
+}
+
+EPOCH = date(1970, 1, 1)
+
+def dayNumber(day):
+    return (day - EPOCH).days
+
+def intern(values):
+    vocabulary, codes = np.unique(values.astype(str).to_numpy(), return_inverse=True)
+    dtype = np.uint8 if len(vocabulary) <= 2 ** 8 else np.uint16 if len(vocabulary) <= 2 ** 16 else np.uint32
+    return vocabulary.tolist(), codes.astype(dtype)
+
+def publish(gamelog_df, root=GAMELOG_INDEX_DIR, keep=GAMELOG_INDEX_KEEP):
+    # Rows are ordered by (Player_ID, game_day, Game_ID), so a player's log is one contiguous span located through
+    # the players/offsets pair and date filters or cursors narrow it with binary searches
+    frame = gamelog_df.assign(game_day=pd.to_datetime(gamelog_df['game_day']).dt.normalize())
+    frame = frame.sort_values(['Player_ID', 'game_day', 'Game_ID'], kind='stable', ignore_index=True)
+    players, starts = np.unique(frame['Player_ID'].to_numpy(dtype=np.int64), return_index=True)
+
+    version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    staging = os.path.join(root, f".{version}.tmp")
+    os.makedirs(staging)
+    np.save(os.path.join(staging, 'players.npy'), players.astype(np.int32))
+    np.save(os.path.join(staging, 'offsets.npy'), np.append(starts, len(frame)).astype(np.int64))
+    np.save(os.path.join(staging, 'game_day.npy'), (frame['game_day'].to_numpy(dtype='datetime64[D]').astype(np.int64)).astype(np.int32))
+
+    files, vocabularies = {}, {}
+    for position, (column, dtype) in enumerate(COLUMNS.items()):
+        if dtype == 'str':
+            vocabularies[column], values = intern(frame[column])
+        else:
+            values = frame[column].to_numpy(dtype=dtype)
+        files[column] = f"{position}.npy"
+        np.save(os.path.join(staging, files[column]), values)
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump({'rows': len(frame), 'files': files, 'vocabularies': vocabularies}, f)
+    os.rename(staging, os.path.join(root, version))
+
+    pointer = os.path.join(root, '.CURRENT.tmp')
+    with open(pointer, 'w') as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(root, 'CURRENT'))
+
+    versions = sorted(entry for entry in os.listdir(root) if not entry.startswith('.') and entry != 'CURRENT')
+    for stale in versions[:-keep]:
+        # Workers still mapping a removed version keep reading it until they reload; Linux frees it after that
+        shutil.rmtree(os.path.join(root, stale), ignore_errors=True)
+    return version
+
+class GamelogIndex:
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        self.players = np.load(os.path.join(path, 'players.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+        self.game_day = np.load(os.path.join(path, 'game_day.npy'), mmap_mode='r')
+        self.columns = {column: np.load(os.path.join(path, name), mmap_mode='r') for column, name in meta['files'].items()}
+        self.vocabularies = {column: np.array(vocabulary, dtype=object) for column, vocabulary in meta['vocabularies'].items()}
+
+    def span(self, player_id, since=None, until=None, cursor_date=None, cursor_game=None):
+        # Returns the [start, end) rows of player_id's log that match the filters, in (game_day, Game_ID) order
+        position = int(np.searchsorted(self.players, player_id))
+        if position == len(self.players) or self.players[position] != player_id:
+            return 0, 0
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        days = self.game_day[start:end]
+        low, high = 0, end - start
+        if since is not None:
+            low = max(low, int(np.searchsorted(days, dayNumber(since), 'left')))
+        if until is not None:
+            high = min(high, int(np.searchsorted(days, dayNumber(until), 'right')))
+        if cursor_date is not None:
+            day = dayNumber(cursor_date)
+            first, last = int(np.searchsorted(days, day, 'left')), int(np.searchsorted(days, day, 'right'))
+            games = self.columns['Game_ID'][start + first:start + last]
+            low = max(low, first + int(np.searchsorted(games, cursor_game, 'right')))
+        return start + low, start + max(low, high)
+
+    def values(self, column, start, end):
+        array = self.columns[column][start:end]
+        if column in self.vocabularies:
+            return self.vocabularies[column][array].tolist()
+        if array.dtype == np.float32:
+            return array.astype(str).astype(np.float64).tolist()
+        # Narrow ints widen to Python ints, the type the gamelogs query returns for the same BIGINT/INT columns
+        return array.tolist()
+
+    def records(self, start, end, fields):
+        # fields maps output keys to stored columns; each column is converted in one pass, then zipped into rows
+        values = [self.values(column, start, end) for column in fields.values()]
+        return [dict(zip(fields, row)) for row in zip(*values)]
+
+    def day(self, row):
+        return EPOCH + timedelta(days=int(self.game_day[row]))
+
+    def positions(self, player_ids):
+        # Each player's position in players, or -1 for players without games
+        player_ids = np.asarray(player_ids, dtype=np.int64)
+        if not len(self.players):
+            return np.full(len(player_ids), -1)
+        positions = np.searchsorted(self.players, player_ids).clip(max=len(self.players) - 1)
+        return np.where(self.players[positions] == player_ids, positions, -1)
+
+    def lastGames(self, column, positions, windows):
+        # Gathers each player's last windows[i] games of column (0 = every game) into one (players, widest window)
+        # matrix, newest game last and left-padded, plus the mask of cells that hold a real game
+        known = positions >= 0
+        starts = np.where(known, self.offsets[positions], 0)
+        ends = np.where(known, self.offsets[positions + 1], 0)
+        firsts = np.where(windows > 0, np.maximum(starts, ends - windows), starts)
+        width = int((ends - firsts).max(initial=0))
+        rows = ends[:, None] - width + np.arange(width)
+        valid = rows >= firsts[:, None]
+        values = self.columns[column][np.where(valid, rows, 0)] if width else np.empty(rows.shape)
+        return values.astype(np.float64), valid
+
+def summarize(values, valid, lines):
+    # For lastGames output and a (players, k) array of lines: games played, stat totals, and how many games went
+    # strictly over each line, computed for every player and line at once
+    games = valid.sum(axis=1)
+    totals = np.where(valid, values, 0).sum(axis=1)
+    hits = ((values[:, :, None] > lines[:, None, :]) & valid[:, :, None]).sum(axis=1)
+    return games, totals, hits
+
+class IndexStore:
+    def __init__(self, root=GAMELOG_INDEX_DIR, check_interval=30):
+        self.root = root
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.version = None
+        self.index = None
+        self.checked_at = 0.0
+
+    def current(self):
+        # Returns the live GamelogIndex, or None when nothing has been published; a newly published version is
+        # picked up within check_interval seconds and swapped in with a single reference assignment
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval:
+            return self.index
+
+        with self.lock:
+            try:
+                with open(os.path.join(self.root, 'CURRENT')) as f:
+                    version = f.read().strip()
+                if version != self.version:
+                    self.index = GamelogIndex(os.path.join(self.root, version))
+                    self.version = version
+            except OSError:
+                self.version, self.index = None, None
+            self.checked_at = now
+            return self.index
@@ -1,18 +1,30 @@
+import argparse
+import hashlib
+import json
 import logging
+import resource
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 import pandas as pd
-import requests
-from requests.exceptions import Timeout
-import random
+import numpy as np
 from math import isnan
 import sqlalchemy
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 import os
 from dotenv import load_dotenv
+from datetime import date, datetime, timezone
 from nba_api.stats.endpoints import playergamelog, playerindex, teamdetails, leaguestandingsv3, leaguedashplayerstats, leaguedashptstats, leaguehustlestatsplayer, leagueplayerondetails, playerdashboardbyshootingsplits
-from sklearn.preprocessing import MinMaxScaler, RobustScaler
+from sklearn.preprocessing import RobustScaler
 from sklearn.cluster import KMeans
+import aggregates
+import fetcher
+import grading
+import logindex
+import schema
+import snapshots
 
 # Configure logging
 logging.basicConfig(
@@ -27,26 +39,58 @@ DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_HOST = os.getenv('DB_HOST')
 DB_NAME = os.getenv('DB_NAME')
 
-db = sqlalchemy.create_engine(f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}")
+# DATABASE_URL points an offline or replayed run at a scratch MySQL instead of the production database
+db = sqlalchemy.create_engine(os.getenv('DATABASE_URL') or f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}")
+
+# Rows per multi-row INSERT when loading a staging table, capped so one statement stays well inside max_allowed_packet
+SWAP_CHUNK_ROWS = int(os.getenv('SWAP_CHUNK_ROWS', 2000))
+
+def markTableUpdated(table):
+    # The API compares these versions to decide when payloads it built from a table are stale
+    with db.begin() as conn:
+        conn.execute(sqlalchemy.text("CREATE TABLE IF NOT EXISTS table_versions (table_name VARCHAR(64) NOT NULL PRIMARY KEY, version VARCHAR(32) NOT NULL, updated_at DATETIME NOT NULL)"))
+        conn.execute(
+            sqlalchemy.text("INSERT INTO table_versions (table_name, version, updated_at) VALUES (:table, :version, UTC_TIMESTAMP()) ON DUPLICATE KEY UPDATE version = VALUES(version), updated_at = VALUES(updated_at)"),
+            {'table': table, 'version': datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')}
+        )
+
+def swapTable(frame, table, chunksize=SWAP_CHUNK_ROWS):
+    # Bulk-loads frame into {table}_staging and swaps it in with one atomic RENAME TABLE, so API readers see the old
+    # rows or the new ones, never an empty or missing table. Staging is created LIKE the live table, which keeps its
+    # column types, keys and indexes; only when the frame's columns no longer match is it rebuilt from the frame.
+    staging, retired = f"{table}_staging", f"{table}_retired"
+    inspector = sqlalchemy.inspect(db)
+    live = inspector.has_table(table)
+    with db.begin() as conn:
+        conn.execute(sqlalchemy.text(f"DROP TABLE IF EXISTS {staging}"))
+        conn.execute(sqlalchemy.text(f"DROP TABLE IF EXISTS {retired}"))
+        if live and {column['name'] for column in inspector.get_columns(table)} == set(frame.columns):
+            conn.execute(sqlalchemy.text(f"CREATE TABLE {staging} LIKE {table}"))
+            rebuilt = False
+        else:
+            rebuilt = True
+            if live:
+                logging.warning(f"{table} columns changed, rebuilding it from the fetched frame")
+
+    with db.begin() as conn:
+        frame.to_sql(name=staging, con=conn, if_exists='append', index=False, chunksize=max(1, min(chunksize, 60000 // max(1, len(frame.columns)))), method='multi')
+    if rebuilt:
+        # A staging table built from the frame has pandas' column types and no keys, so conform it before it goes live
+        schema.conform(db, staging, schema.specFor(table))
+
+    with db.begin() as conn:
+        if live:
+            conn.execute(sqlalchemy.text(f"RENAME TABLE {table} TO {retired}, {staging} TO {table}"))
+            conn.execute(sqlalchemy.text(f"DROP TABLE {retired}"))
+        else:
+            conn.execute(sqlalchemy.text(f"RENAME TABLE {staging} TO {table}"))
+    markTableUpdated(table)
+    logging.info(f"Swapped {len(frame)} rows into {table}")
+    return len(frame)
 
 def fetchPlayers():
     table = "players"
-    retry_count = 0
-    max_retries = 5
-
-    while retry_count < max_retries:
-        try:
-            active_players = playerindex.PlayerIndex(timeout=60)
-            players_df = active_players.get_data_frames()[0]
-            break
-        except (requests.exceptions.RequestException, Timeout) as e:
-            retry_count += 1
-            wait_time = (2 ** retry_count) + random.uniform(0, 1)
-            logging.error(f"Retry {retry_count}/{max_retries} for fetchPlayers after {wait_time:.2f}s: {e}")
-            time.sleep(wait_time)
-            if retry_count == max_retries:
-                logging.error(f"Max retries reached for fetchPlayers: {e}")
-                raise
+    players_df = fetcher.fetchFrame(playerindex.PlayerIndex, "fetchPlayers")
 
     players_df["PLAYER_FULL_NAME"] = players_df["PLAYER_FIRST_NAME"] + " " + players_df["PLAYER_LAST_NAME"]
     columns_to_remove = [col for col in players_df.columns if any(substring in col for substring in ('PLAYER_SLUG', 'TEAM_SLUG', 'IS_DEFUNCT', 'STATS_TIMEFRAME'))]
@@ -68,92 +112,149 @@ def fetchPlayers():
     players_df['DRAFT_YEAR'] = pd.to_numeric(players_df['DRAFT_YEAR'], errors='coerce').fillna(0).astype(int)
     players_df['DRAFT_ROUND'] = pd.to_numeric(players_df['DRAFT_ROUND'], errors='coerce').fillna(0).astype(int)
     players_df['DRAFT_NUMBER'] = pd.to_numeric(players_df['DRAFT_NUMBER'], errors='coerce').fillna(0).astype(int)
-    players_df.to_sql(name=table, con=db, if_exists='replace', index=False)
+    swapTable(players_df, table)
     logging.info("Players table updated successfully with all required fields!")
+    return len(players_df)
+
+# TeamDetails (arena, owner, GM, coach) rarely changes: a team is only re-fetched once its last fetch is older than
+# TEAM_REFRESH_AGE seconds, and only teams whose payload hash differs from the stored fingerprint are written
+TEAM_REFRESH_AGE = float(os.getenv('TEAM_REFRESH_AGE', 7 * 86400))
+
+def payloadHash(frame):
+    records = json.dumps(frame.to_dict(orient='records'), sort_keys=True, default=str)
+    return hashlib.sha256(records.encode('utf-8')).hexdigest()
 
 def fetchTeams():
     table = "teams"
-    team_db = pd.read_sql("SELECT DISTINCT TEAM_ID, TEAM_FULL_NAME FROM PLAYERS", con=db)
-    team_data = []
-
-    for index, row in team_db.iterrows():
-        team_id = row["TEAM_ID"]
-        name = row["TEAM_FULL_NAME"]
-        retry_count = 0
-        max_retries = 5
-        while retry_count < max_retries:
-            try:
-                teams = teamdetails.TeamDetails(team_id=team_id, timeout=60)
-                teams_df = teams.get_data_frames()[0]
-                team_data.append(teams_df)
-                logging.info(f"{name} added to team_data")
-                time.sleep(10)
-                break
-            except (requests.exceptions.RequestException, Timeout) as e:
-                retry_count += 1
-                wait_time = (2 ** retry_count) + random.uniform(0, 1)
-                logging.error(f"Retry {retry_count}/{max_retries} for {name} after {wait_time:.2f}s: {e}")
-                time.sleep(wait_time)
-                if retry_count == max_retries:
-                    logging.error(f"Max retries reached for {name}: {e}")
-                    raise
-
+    team_db = pd.read_sql("SELECT DISTINCT TEAM_ID, TEAM_FULL_NAME FROM players", con=db)
+    with db.begin() as conn:
+        conn.execute(sqlalchemy.text("CREATE TABLE IF NOT EXISTS team_fingerprints (TEAM_ID BIGINT NOT NULL PRIMARY KEY, payload_hash CHAR(64) NOT NULL, fetched_at DATETIME NOT NULL)"))
+    fingerprints = pd.read_sql("SELECT TEAM_ID, payload_hash, fetched_at FROM team_fingerprints", con=db)
+    fingerprint = dict(zip(fingerprints['TEAM_ID'], fingerprints['payload_hash']))
+    fetched_at = dict(zip(fingerprints['TEAM_ID'], pd.to_datetime(fingerprints['fetched_at'])))
+    table_exists = sqlalchemy.inspect(db).has_table(table)
+    stored = set(pd.read_sql(f"SELECT TEAM_ID FROM {table}", con=db)['TEAM_ID']) if table_exists else set()
+
+    now = pd.Timestamp.now(tz='UTC').tz_localize(None).floor('s')
+    names = {
+        team_id: name for team_id, name in zip(team_db["TEAM_ID"], team_db["TEAM_FULL_NAME"])
+        if team_id not in stored or team_id not in fetched_at or (now - fetched_at[team_id]).total_seconds() >= TEAM_REFRESH_AGE
+    }
+    logging.info(f"Team details fresh for {len(team_db) - len(names)} teams, refreshing {len(names)}")
+
+    def fetchTeamDetails(team_id):
+        return teamdetails.TeamDetails(team_id=team_id, timeout=fetcher.NBA_API_TIMEOUT).get_data_frames()[0]
+
+    team_data, checked = [], []
+    for team_id, teams_df, error in fetcher.fetchConcurrently(list(names), fetchTeamDetails, label=lambda team_id: names[team_id]):
+        if error is not None:
+            logging.error(f"Skipping {names[team_id]} details: {error}")
+            continue
+        # TeamDetails has no full name; the snapshots and /teams read it from teams, so carry it over from players
+        teams_df = teams_df.assign(TEAM_FULL_NAME=names[team_id])
+        digest = payloadHash(teams_df)
+        checked.append({'TEAM_ID': int(team_id), 'payload_hash': digest, 'fetched_at': now.to_pydatetime()})
+        if team_id not in stored or fingerprint.get(team_id) != digest:
+            team_data.append(teams_df)
+            logging.info(f"{names[team_id]} details changed")
+
+    written = 0
     if team_data:
         final_df = pd.concat(team_data, ignore_index=True)
-        final_df.to_sql(name=table, con=db, if_exists='replace', index=False)
-        logging.info("Teams added to database")
-
-def fetchGamelogs():
-    table = "gamelogs"
-    active = playerindex.PlayerIndex(timeout=60)
-    active_df = active.get_data_frames()[0]
-
-    active_df["PLAYER_FULL_NAME"] = active_df["PLAYER_FIRST_NAME"] + " " + active_df["PLAYER_LAST_NAME"]
-    column_to_move = active_df.pop("PLAYER_FULL_NAME")
-    active_df.insert(1, "PLAYER_FULL_NAME", column_to_move)
-    columns_to_remove = [col for col in active_df.columns if any(substring in col for substring in ('PLAYER_SLUG', 'TEAM_SLUG', 'IS_DEFUNCT', 'STATS_TIMEFRAME'))]
-    active_df = active_df.drop(columns=columns_to_remove)
-    active_df["TEAM_FULL_NAME"] = active_df["TEAM_CITY"] + " " + active_df["TEAM_NAME"]
-    column_to_move = active_df.pop("TEAM_FULL_NAME")
-    active_df.insert(5, "TEAM_FULL_NAME", column_to_move)
-
-    seasons = ['2024-25']
-    gamelog_df = pd.DataFrame()
-
-    for index, row in active_df.iterrows():
-        playerId = row['PERSON_ID']
-        playerName = row['PLAYER_FULL_NAME']
-        for season in seasons:
-            retry_count = 0
-            while retry_count < 8:
-                try:
-                    gamelog = playergamelog.PlayerGameLog(player_id=playerId, season=season, timeout=60)
-                    new = gamelog.get_data_frames()[0]
-                    new['Player_Name'] = playerName
-                    existing = pd.read_sql(f"SELECT * FROM {table} WHERE Player_ID = {playerId}", con=db)
-                    new = new[~new['GAME_DATE'].isin(existing['GAME_DATE'])]
-                    if not new.empty:
-                        gamelog_df = pd.concat([gamelog_df, new], ignore_index=True)
-                        logging.info(f"{playerName} {season} gamelog added")
-                    else:
-                        logging.info(f"{playerName} {season} gamelog already up to date")
-                    break
-                except (requests.exceptions.RequestException, Timeout) as e:
-                    wait_time = (2 ** retry_count) + random.uniform(0, 1)
-                    logging.error(f"Retry {retry_count + 1} for {playerName} {season} after {wait_time:.2f}s: {e}")
-                    time.sleep(wait_time)
-                    retry_count += 1
-                if retry_count == 8:
-                    logging.error(f"Max retries reached for {playerName} in season {season}.")
-            time.sleep(10)
-
+        if table_exists:
+            # The upsert needs the TEAM_ID primary key to find existing rows
+            schema.conform(db, table)
+            final_df.to_sql(name=table, con=db, if_exists='append', index=False, method=upsertRows)
+            markTableUpdated(table)
+        else:
+            swapTable(final_df, table)
+        written = len(final_df)
+        logging.info(f"{written} teams updated in database")
+    # Fingerprints go in only after the rows they describe, so a failed write is retried on the next run
+    if checked:
+        pd.DataFrame(checked).to_sql(name="team_fingerprints", con=db, if_exists='append', index=False, method=upsertRows)
+    return written
+
+# Game_ID values are 8-digit season-prefixed ids, so Player_ID * GAME_ID_SPAN + Game_ID is a unique int64 key
+GAME_ID_SPAN = 10 ** 10
+
+def ensureGamelogSchema(table="gamelogs"):
+    # gamelogs predates the native game_day and season columns and the (Player_ID, Game_ID) key, so migrate it in place
+    inspector = sqlalchemy.inspect(db)
+    if not inspector.has_table(table):
+        return
+    columns = {column['name'] for column in inspector.get_columns(table)}
+    indexes = {index['name'] for index in inspector.get_indexes(table)}
+
+    with db.begin() as conn:
+        if 'game_day' not in columns:
+            conn.execute(sqlalchemy.text(f"ALTER TABLE {table} ADD COLUMN game_day DATE"))
+            conn.execute(sqlalchemy.text(f"UPDATE {table} SET game_day = STR_TO_DATE(GAME_DATE, '%b %d, %Y')"))
+            logging.info(f"Added game_day column to {table}")
+        if 'season' not in columns:
+            # Game_ID's second and third digits are the season's first year, e.g. 22400001 is a 2024-25 game
+            year = "(Game_ID DIV 100000) MOD 100"
+            conn.execute(sqlalchemy.text(f"ALTER TABLE {table} ADD COLUMN season VARCHAR(10)"))
+            conn.execute(sqlalchemy.text(f"UPDATE {table} SET season = CONCAT({year} + IF({year} < 46, 2000, 1900), '-', LPAD(({year} + 1) MOD 100, 2, '0'))"))
+            if table == "gamelogs" and inspector.has_table(aggregates.TABLE):
+                # These were folded from every season's rows in gamelogs; seedAggregates rebuilds them from this season's
+                conn.execute(sqlalchemy.text(f"DELETE FROM {aggregates.TABLE} WHERE season = :season"), {'season': CURRENT_SEASON})
+            logging.info(f"Added season column to {table}")
+        if 'idx_gamelogs_player_day' not in indexes:
+            conn.execute(sqlalchemy.text(f"CREATE INDEX idx_gamelogs_player_day ON {table} (Player_ID, game_day)"))
+            logging.info(f"Created (Player_ID, game_day) index on {table}")
+        if 'uq_gamelogs_player_game' not in indexes and not inspector.get_pk_constraint(table)['constrained_columns']:
+            # Earlier append-only runs may have left duplicate rows, so copy through INSERT IGNORE before swapping
+            conn.execute(sqlalchemy.text(f"DROP TABLE IF EXISTS {table}_dedup"))
+            conn.execute(sqlalchemy.text(f"CREATE TABLE {table}_dedup LIKE {table}"))
+            conn.execute(sqlalchemy.text(f"ALTER TABLE {table}_dedup ADD UNIQUE INDEX uq_gamelogs_player_game (Player_ID, Game_ID)"))
+            conn.execute(sqlalchemy.text(f"INSERT IGNORE INTO {table}_dedup SELECT * FROM {table}"))
+            conn.execute(sqlalchemy.text(f"RENAME TABLE {table} TO {table}_old, {table}_dedup TO {table}"))
+            conn.execute(sqlalchemy.text(f"DROP TABLE {table}_old"))
+            logging.info(f"Created unique (Player_ID, Game_ID) key on {table}")
+    # With duplicates gone, the unique key can become the (Player_ID, Game_ID) primary key
+    schema.conform(db, table)
+
+def gamelogKeys(player_ids, game_ids):
+    return player_ids.astype('int64').to_numpy() * GAME_ID_SPAN + game_ids.astype('int64').to_numpy()
+
+def loadGamelogKeys(table="gamelogs"):
+    if not sqlalchemy.inspect(db).has_table(table):
+        return np.empty(0, dtype='int64')
+    keys = pd.read_sql(f"SELECT Player_ID, Game_ID FROM {table}", con=db)
+    return np.unique(gamelogKeys(keys['Player_ID'], keys['Game_ID']))
+
+def upsertRows(pd_table, conn, keys, data_iter):
+    # pandas to_sql method: one multi-row INSERT ... ON DUPLICATE KEY UPDATE per chunk
+    rows = [dict(zip(keys, row)) for row in data_iter]
+    stmt = mysql_insert(pd_table.table).values(rows)
+    stmt = stmt.on_duplicate_key_update({key: stmt.inserted[key] for key in keys})
+    return conn.execute(stmt).rowcount
+
+GAMELOG_BATCH_ROWS = int(os.getenv('GAMELOG_BATCH_ROWS', 5000))
+CURRENT_SEASON = os.getenv('NBA_SEASON', '2024-25')
+BACKFILL_PROCESSES = int(os.getenv('BACKFILL_PROCESSES', 4))
+BACKFILL_RATE = float(os.getenv('BACKFILL_RATE', 1.0))
+
+GAMELOG_DTYPES = {
+    'Game_ID': int, 'Player_ID': int, 'Player_Name': str, 'GAME_DATE': str, 'MATCHUP': str, 'WL': str,
+    'MIN': float, 'FG Made': int, 'FG Attempted': int, 'FG_PCT': float, '3-PT Made': int, 
+    '3-PT Attempted': int, 'FG3_PCT': float, 'Free Throws Made': int, 'Free Throws Attempted': int, 
+    'FT_PCT': float, 'Offensive Rebounds': int, 'Defensive Rebounds': int, 'Rebounds': int, 
+    'Assists': int, 'Steals': int, 'Blocked Shots': int, 'Turnovers': int, 'PF': int, 'Points': int, 
+    'PLUS_MINUS': int, 'Opponent': str, 'Pts+Rebs+Asts': int, 'Pts+Rebs': int, 'Pts+Asts': int, 
+    'Rebs+Asts': int, 'Blks+Stls': int, 'Fantasy Score': float, 'season': str
+}
+
+def transformGamelog(gamelog_df):
+    # SEASON_ID is the season type digit followed by the season's first year, e.g. 22024 for 2024-25
+    first_year = gamelog_df['SEASON_ID'].astype(str).str[-4:].astype(int)
+    gamelog_df = gamelog_df.assign(season=first_year.astype(str) + '-' + ((first_year + 1) % 100).astype(str).str.zfill(2))
     columns_to_remove = [col for col in gamelog_df.columns if any(substring in col for substring in ('SEASON_ID', 'VIDEO_AVAILABLE'))]
     gamelog_df = gamelog_df.drop(columns=columns_to_remove)
     gamelog_df.insert(2, 'Player_Name', gamelog_df.pop('Player_Name'))
     gamelog_df['Opponent'] = gamelog_df['MATCHUP'].str.extract(r'vs\. (.+)', expand=False).combine_first(gamelog_df['MATCHUP'].str.extract(r'@ (.+)', expand=False))
     gamelog_df['Opponent'] = gamelog_df['Opponent'].str.strip()
-    columns = gamelog_df.columns.tolist()
-    columns = columns[:5] + ['Opponent'] + columns[5:]
     gamelog_df['Pts+Rebs+Asts'] = gamelog_df['PTS'] + gamelog_df['REB'] + gamelog_df['AST']
     gamelog_df['Pts+Rebs'] = gamelog_df['PTS'] + gamelog_df['REB']
     gamelog_df['Pts+Asts'] = gamelog_df['PTS'] + gamelog_df['AST']
@@ -167,502 +268,542 @@ def fetchGamelogs():
         'FTM': 'Free Throws Made', 'FTA': 'Free Throws Attempted'
     })
     gamelog_df = gamelog_df.fillna(0)
-    data_dict = {
-        'Game_ID': int, 'Player_ID': int, 'Player_Name': str, 'GAME_DATE': str, 'MATCHUP': str, 'WL': str,
-        'MIN': float, 'FG Made': int, 'FG Attempted': int, 'FG_PCT': float, '3-PT Made': int, 
-        '3-PT Attempted': int, 'FG3_PCT': float, 'Free Throws Made': int, 'Free Throws Attempted': int, 
-        'FT_PCT': float, 'Offensive Rebounds': int, 'Defensive Rebounds': int, 'Rebounds': int, 
-        'Assists': int, 'Steals': int, 'Blocked Shots': int, 'Turnovers': int, 'PF': int, 'Points': int, 
-        'PLUS_MINUS': int, 'Opponent': str, 'Pts+Rebs+Asts': int, 'Pts+Rebs': int, 'Pts+Asts': int, 
-        'Rebs+Asts': int, 'Blks+Stls': int, 'Fantasy Score': float
-    }
-    gamelog_df = gamelog_df.astype(data_dict)
-    gamelog_df.to_sql(name=table, con=db, if_exists='append', index=False)
-    logging.info("Gamelogs updated successfully")
+    gamelog_df = gamelog_df.astype(GAMELOG_DTYPES)
+    gamelog_df['game_day'] = pd.to_datetime(gamelog_df['GAME_DATE'], format='%b %d, %Y').dt.date
+    return gamelog_df
+
+class GamelogWriter:
+    # Buffers transformed gamelog frames and upserts them into table in bounded batches. Each flush also records
+    # the (player, season) tasks it covered in gamelog_checkpoints, in the same transaction, so a restarted run
+    # with the same run_key skips work that already reached the database. Checkpoints are namespaced by table
+    # so the nightly job and a season backfill never clear each other's progress. When season is given, the
+    # batch's rows are folded into that season's gamelog_aggregates in the same transaction.
+    def __init__(self, run_key, table="gamelogs", batch_rows=GAMELOG_BATCH_ROWS, season=None):
+        self.table = table
+        self.season = season
+        self.run_key = f"{table}:{run_key}"
+        self.batch_rows = batch_rows
+        self.frames = []
+        self.tasks = []
+        self.rows = 0
+        self.written = 0
+        self.schema_ready = False
+
+    def completed(self):
+        params = {'run_key': self.run_key, 'scope': f"{self.table}:%"}
+        with db.begin() as conn:
+            conn.execute(sqlalchemy.text("CREATE TABLE IF NOT EXISTS gamelog_checkpoints (run_key VARCHAR(64) NOT NULL, Player_ID BIGINT NOT NULL, season VARCHAR(10) NOT NULL, PRIMARY KEY (run_key, Player_ID, season))"))
+            conn.execute(sqlalchemy.text("DELETE FROM gamelog_checkpoints WHERE run_key LIKE :scope AND run_key <> :run_key"), params)
+            rows = conn.execute(sqlalchemy.text("SELECT Player_ID, season FROM gamelog_checkpoints WHERE run_key = :run_key"), params).all()
+        return {(row[0], row[1]) for row in rows}
+
+    def add(self, task, frame):
+        self.tasks.append(task)
+        if not frame.empty:
+            self.frames.append(frame)
+            self.rows += len(frame)
+        if self.rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.tasks:
+            return
+        if not self.schema_ready:
+            ensureGamelogSchema(self.table)
+        with db.begin() as conn:
+            if self.frames:
+                batch = pd.concat(self.frames, ignore_index=True)
+                batch.to_sql(name=self.table, con=conn, if_exists='append', index=False, chunksize=1000, method=upsertRows, dtype={'game_day': sqlalchemy.types.Date()})
+                if self.season is not None:
+                    aggregates.accumulate(conn, self.table, self.season, batch)
+            conn.execute(
+                sqlalchemy.text("INSERT IGNORE INTO gamelog_checkpoints (run_key, Player_ID, season) VALUES (:run_key, :player_id, :season)"),
+                [{'run_key': self.run_key, 'player_id': int(playerId), 'season': season} for playerId, season in self.tasks]
+            )
+        if not self.schema_ready:
+            # The first flush may have created the table, so add its key and index before the next batch
+            ensureGamelogSchema(self.table)
+            self.schema_ready = True
+        logging.info(f"Flushed {self.rows} {self.table} rows for {len(self.tasks)} players")
+        self.written += self.rows
+        self.frames, self.tasks, self.rows = [], [], 0
+
+    def finish(self):
+        self.flush()
+        with db.begin() as conn:
+            conn.execute(sqlalchemy.text("DELETE FROM gamelog_checkpoints WHERE run_key = :run_key"), {'run_key': self.run_key})
+
+def seasonRange(first, last):
+    return [f"{year}-{str(year + 1)[-2:]}" for year in range(int(first[:4]), int(last[:4]) + 1)]
+
+def seasonTable(season):
+    # Past seasons live in their own gamelogs_YYYY_YY table; the current season stays in gamelogs
+    return "gamelogs" if season == CURRENT_SEASON else f"gamelogs_{season.replace('-', '_')}"
+
+def seasonPlayers(season=None):
+    params = {'season': season} if season else {}
+    active_df = fetcher.fetchFrame(playerindex.PlayerIndex, f"player index {season or CURRENT_SEASON}", **params)
+
+    active_df["PLAYER_FULL_NAME"] = active_df["PLAYER_FIRST_NAME"] + " " + active_df["PLAYER_LAST_NAME"]
+    column_to_move = active_df.pop("PLAYER_FULL_NAME")
+    active_df.insert(1, "PLAYER_FULL_NAME", column_to_move)
+    columns_to_remove = [col for col in active_df.columns if any(substring in col for substring in ('PLAYER_SLUG', 'TEAM_SLUG', 'IS_DEFUNCT', 'STATS_TIMEFRAME'))]
+    active_df = active_df.drop(columns=columns_to_remove)
+    active_df["TEAM_FULL_NAME"] = active_df["TEAM_CITY"] + " " + active_df["TEAM_NAME"]
+    column_to_move = active_df.pop("TEAM_FULL_NAME")
+    active_df.insert(5, "TEAM_FULL_NAME", column_to_move)
+    return active_df
+
+def seedAggregates(table, season):
+    with db.begin() as conn:
+        aggregates.ensureTable(conn)
+        if sqlalchemy.inspect(conn).has_table(table) and not aggregates.seeded(conn, season):
+            rows = aggregates.rebuild(conn, table, season)
+            logging.info(f"Built {season} gamelog aggregates from {rows} {table} rows")
+
+def ingestGamelogs(active_df, season, run_key):
+    table = seasonTable(season)
+    seedAggregates(table, season)
+    writer = GamelogWriter(run_key, table, season=season)
+    completed = writer.completed()
+    existing_keys = loadGamelogKeys(table)
+    player_names = dict(zip(active_df['PERSON_ID'], active_df['PLAYER_FULL_NAME']))
+    tasks = [(playerId, season) for playerId in active_df['PERSON_ID'] if (playerId, season) not in completed]
+    if completed:
+        logging.info(f"Resuming gamelog run {writer.run_key}: {len(completed)} players already checkpointed")
+
+    def fetchGamelog(task):
+        playerId, season = task
+        gamelog = playergamelog.PlayerGameLog(player_id=playerId, season=season, timeout=fetcher.NBA_API_TIMEOUT)
+        return gamelog.get_data_frames()[0]
+
+    results = fetcher.fetchConcurrently(tasks, fetchGamelog, label=lambda task: f"{player_names[task[0]]} {task[1]}", max_retries=8)
+    for (playerId, season), new, error in results:
+        playerName = player_names[playerId]
+        if error is not None:
+            logging.error(f"Skipping {playerName} {season} gamelog: {error}")
+            continue
+        new['Player_Name'] = playerName
+        new = new[~np.isin(gamelogKeys(new['Player_ID'], new['Game_ID']), existing_keys)]
+        if not new.empty:
+            writer.add((playerId, season), transformGamelog(new))
+            logging.info(f"{playerName} {season} gamelog added")
+        else:
+            writer.add((playerId, season), new)
+            logging.info(f"{playerName} {season} gamelog already up to date")
+
+    writer.finish()
+    return writer.written
+
+def rotateGamelogs():
+    # After NBA_SEASON rolls over, gamelogs still holds the finished season's games. They move into that season's
+    # own table, so gamelogs and the routes and index read from it only cover CURRENT_SEASON; the season's
+    # aggregates were already keyed by it and stay as they are.
+    if not sqlalchemy.inspect(db).has_table("gamelogs"):
+        return
+    ensureGamelogSchema()
+    with db.connect() as conn:
+        seasons = [row[0] for row in conn.execute(sqlalchemy.text("SELECT DISTINCT season FROM gamelogs WHERE season <> :season"), {'season': CURRENT_SEASON})]
+    columns = ', '.join(f"`{column['name']}`" for column in sqlalchemy.inspect(db).get_columns("gamelogs"))
+    for season in seasons:
+        table = seasonTable(season)
+        if sqlalchemy.inspect(db).has_table(table):
+            ensureGamelogSchema(table)
+        else:
+            with db.begin() as conn:
+                conn.execute(sqlalchemy.text(f"CREATE TABLE {table} LIKE gamelogs"))
+        with db.begin() as conn:
+            moved = conn.execute(sqlalchemy.text(f"INSERT IGNORE INTO {table} ({columns}) SELECT {columns} FROM gamelogs WHERE season = :season"), {'season': season}).rowcount
+            conn.execute(sqlalchemy.text("DELETE FROM gamelogs WHERE season = :season"), {'season': season})
+        logging.info(f"Moved {moved} {season} gamelog rows from gamelogs into {table}")
+
+def fetchGamelogs(run_key=None):
+    rotateGamelogs()
+    written = ingestGamelogs(seasonPlayers(), CURRENT_SEASON, run_key or date.today().isoformat())
+    logging.info(f"Gamelogs updated successfully ({written} rows)")
+    return written
+
+def initBackfillWorker(limiter):
+    # Forked workers must not reuse the parent's pooled connections, and all of them draw from one rate budget
+    db.dispose(close=False)
+    fetcher.stats_limiter = limiter
+
+def backfillSeason(season):
+    return ingestGamelogs(seasonPlayers(season), season, "backfill")
+
+def backfillGamelogs(first, last, processes=BACKFILL_PROCESSES):
+    seasons = [season for season in seasonRange(first, last) if season != CURRENT_SEASON]
+    limiter = fetcher.makeLimiter(BACKFILL_RATE, max_rate=BACKFILL_RATE, shared=True)
+    logging.info(f"Backfilling gamelogs for {len(seasons)} seasons across {processes} processes")
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=initBackfillWorker, initargs=(limiter,)) as pool:
+        futures = {pool.submit(backfillSeason, season): season for season in seasons}
+        for future in as_completed(futures):
+            season = futures[future]
+            try:
+                logging.info(f"Backfilled {future.result()} gamelog rows into {seasonTable(season)}")
+            except Exception as e:
+                logging.error(f"Backfill of {season} failed: {e}")
 
 def fetchStandings():
     table = "standings"
-    retry_count = 0
-    max_retries = 5
+    standings_df = fetcher.fetchFrame(leaguestandingsv3.LeagueStandingsV3, "fetchStandings")
 
-    while retry_count < max_retries:
-        try:
-            standings = leaguestandingsv3.LeagueStandingsV3(timeout=60)
-            standings_df = standings.get_data_frames()[0]
-            break
-        except (requests.exceptions.RequestException, Timeout) as e:
-            retry_count += 1
-            wait_time = (2 ** retry_count) + random.uniform(0, 1)
-            logging.error(f"Retry {retry_count}/{max_retries} for fetchStandings after {wait_time:.2f}s: {e}")
-            time.sleep(wait_time)
-            if retry_count == max_retries:
-                logging.error(f"Max retries reached for fetchStandings: {e}")
-                raise
-
-    standings_df.to_sql(name=table, con=db, if_exists='replace', index=False)
+    swapTable(standings_df, table)
     logging.info("Standings updated")
+    return len(standings_df)
+
+def dayKey(day):
+    return None if pd.isna(day) else pd.Timestamp(day).date().isoformat()
+
+def fetchDunkRates(player_ids):
+    # A player's shooting splits only change when they play, so cache DUNK_FGA against their latest game date
+    with db.begin() as conn:
+        conn.execute(sqlalchemy.text("CREATE TABLE IF NOT EXISTS dunk_cache (PLAYER_ID BIGINT NOT NULL PRIMARY KEY, last_game_day DATE NULL, DUNK_FGA DOUBLE NULL)"))
+    if sqlalchemy.inspect(db).has_table("gamelogs"):
+        last_games = pd.read_sql("SELECT Player_ID, MAX(game_day) AS last_game_day FROM gamelogs GROUP BY Player_ID", con=db)
+    else:
+        # Nothing ingested yet (a fresh or scratch database): every player's dunk rate is keyed to no game
+        last_games = pd.DataFrame({'Player_ID': [], 'last_game_day': []})
+    last_game = {player_id: dayKey(day) for player_id, day in zip(last_games['Player_ID'], last_games['last_game_day'])}
+    cache = pd.read_sql("SELECT PLAYER_ID, last_game_day, DUNK_FGA FROM dunk_cache", con=db)
+    cached = {player_id: (dayKey(day), dunk_fga) for player_id, day, dunk_fga in zip(cache['PLAYER_ID'], cache['last_game_day'], cache['DUNK_FGA'])}
+
+    dunk_rates = {}
+    stale = []
+    for id in player_ids:
+        key = last_game.get(id)
+        if id in cached and cached[id][0] == key:
+            dunk_rates[id] = cached[id][1]
+        else:
+            stale.append(id)
+    logging.info(f"Dunk data cached for {len(dunk_rates)} players, fetching {len(stale)}")
+
+    def fetchDunkRate(id):
+        player_dunk = playerdashboardbyshootingsplits.PlayerDashboardByShootingSplits(player_id=id, per_mode_detailed="PerGame", timeout=fetcher.NBA_API_TIMEOUT)
+        player_df = player_dunk.get_data_frames()[5]
+        dunk_df = player_df[player_df['GROUP_VALUE'] == 'Dunk']
+        return None if dunk_df.empty else dunk_df['FGA'].values[0]
+
+    refreshed = []
+    for id, dunk_fga, error in fetcher.fetchConcurrently(stale, fetchDunkRate, label=lambda id: f"{id} dunk data", max_retries=8):
+        if error is not None:
+            continue
+        if dunk_fga is None:
+            logging.info(f"{id} has no dunk data")
+        dunk_rates[id] = dunk_fga
+        refreshed.append({'PLAYER_ID': int(id), 'last_game_day': last_game.get(id), 'DUNK_FGA': dunk_fga})
+
+    if refreshed:
+        refreshed_df = pd.DataFrame(refreshed)
+        refreshed_df['last_game_day'] = pd.to_datetime(refreshed_df['last_game_day'], errors='coerce').dt.date
+        refreshed_df.to_sql(name="dunk_cache", con=db, if_exists='append', index=False, method=upsertRows)
+
+    player_dunk_df = pd.DataFrame([{'PLAYER_ID': id, 'DUNK_FGA': dunk_fga} for id, dunk_fga in dunk_rates.items() if dunk_fga is not None and not pd.isna(dunk_fga)])
+    return player_dunk_df
 
 def fetchGrades():
     table = "grades"
-    retry_count = 0
-    max_retries = 5
 
-    while retry_count < max_retries:
-        try:
-            player_base = leaguedashplayerstats.LeagueDashPlayerStats(measure_type_detailed_defense='Base', per_mode_detailed='PerGame', timeout=60)
-            player_base_df = player_base.get_data_frames()[0]
-            break
-        except (requests.exceptions.RequestException, Timeout) as e:
-            retry_count += 1
-            wait_time = (2 ** retry_count) + random.uniform(0, 1)
-            logging.error(f"Retry {retry_count}/{max_retries} for player_base after {wait_time:.2f}s: {e}")
-            time.sleep(wait_time)
-            if retry_count == max_retries:
-                logging.error(f"Max retries reached for player_base: {e}")
-                raise
-
-    player_base_df = player_base_df.drop(columns=['AGE', 'W', 'L', 'W_PCT', 'FGM', 'FG_PCT', 'FG3A', 'FG3M', 'FTM', 'FT_PCT', 'BLKA', 'PFD', "PLUS_MINUS", "NBA_FANTASY_PTS", "DD2", "TD3", "WNBA_FANTASY_PTS", "GP_RANK", "W_RANK", "L_RANK", "W_PCT_RANK", "MIN_RANK", "FGM_RANK", "FGA_RANK", "FG_PCT_RANK", "FG3M_RANK", "FG3A_RANK", "FG3_PCT_RANK", "FTM_RANK", "FTA_RANK", "FT_PCT_RANK", "OREB_RANK", "DREB_RANK", "REB_RANK", "AST_RANK", "TOV_RANK", "STL_RANK", "BLK_RANK", "BLKA_RANK", "PF_RANK", "PFD_RANK", "PTS_RANK", "PLUS_MINUS_RANK", "NBA_FANTASY_PTS_RANK", "DD2_RANK", "TD3_RANK", "WNBA_FANTASY_PTS_RANK"], axis=1)
-
-    retry_count = 0
-    while retry_count < max_retries:
-        try:
-            player_adv = leaguedashplayerstats.LeagueDashPlayerStats(measure_type_detailed_defense='Advanced', per_mode_detailed='PerGame', timeout=60)
-            player_adv_df = player_adv.get_data_frames()[0]
-            break
-        except (requests.exceptions.RequestException, Timeout) as e:
-            retry_count += 1
-            wait_time = (2 ** retry_count) + random.uniform(0, 1)
-            logging.error(f"Retry {retry_count}/{max_retries} for player_adv after {wait_time:.2f}s: {e}")
-            time.sleep(wait_time)
-            if retry_count == max_retries:
-                logging.error(f"Max retries reached for player_adv: {e}")
-                raise
-
-    player_adv_df = player_adv_df.drop(columns=["AGE", "W", "L", "W_PCT", "E_OFF_RATING", "OFF_RATING", "sp_work_OFF_RATING", "E_DEF_RATING", "DEF_RATING", "sp_work_DEF_RATING", "E_NET_RATING", "NET_RATING", "sp_work_NET_RATING", "AST_PCT", "AST_TO", "AST_RATIO", "OREB_PCT", "DREB_PCT", "REB_PCT", "TM_TOV_PCT", "E_TOV_PCT", "E_USG_PCT", "E_PACE", "PACE", "PACE_PER40", "sp_work_PACE", "PIE", "POSS", "FGM", "FGA", "FGM_PG", "FGA_PG", "FG_PCT", "GP_RANK", "W_RANK", "L_RANK", "W_PCT_RANK", "MIN_RANK", "E_OFF_RATING_RANK", "OFF_RATING_RANK", "sp_work_OFF_RATING_RANK", "E_DEF_RATING_RANK", "DEF_RATING_RANK", "sp_work_DEF_RATING_RANK", "E_NET_RATING_RANK", "NET_RATING_RANK", "sp_work_NET_RATING_RANK", "AST_PCT_RANK", "AST_TO_RANK", "AST_RATIO_RANK", "OREB_PCT_RANK", "DREB_PCT_RANK", "REB_PCT_RANK", "TM_TOV_PCT_RANK", "E_TOV_PCT_RANK", "EFG_PCT_RANK", "TS_PCT_RANK", "USG_PCT_RANK", "E_USG_PCT_RANK", "E_PACE_RANK", "PACE_RANK", "sp_work_PACE_RANK", "PIE_RANK", "FGM_RANK", "FGA_RANK", "FGM_PG_RANK", "FGA_PG_RANK", "FG_PCT_RANK", 'PLAYER_NAME', 'NICKNAME', 'TEAM_ID', 'TEAM_ABBREVIATION', 'GP', 'MIN'])
-
-    retry_count = 0
-    while retry_count < max_retries:
-        try:
-            player_misc = leaguedashplayerstats.LeagueDashPlayerStats(measure_type_detailed_defense='Misc', per_mode_detailed='PerGame', timeout=60)
-            player_misc_df = player_misc.get_data_frames()[0]
-            break
-        except (requests.exceptions.RequestException, Timeout) as e:
-            retry_count += 1
-            wait_time = (2 ** retry_count) + random.uniform(0, 1)
-            logging.error(f"Retry {retry_count}/{max_retries} for player_misc after {wait_time:.2f}s: {e}")
-            time.sleep(wait_time)
-            if retry_count == max_retries:
-                logging.error(f"Max retries reached for player_misc: {e}")
-                raise
-
-    player_misc_df = player_misc_df.drop(columns=["AGE", "W", "L", "W_PCT", "PTS_OFF_TOV", "PTS_2ND_CHANCE", "PTS_PAINT", "OPP_PTS_OFF_TOV", "OPP_PTS_2ND_CHANCE", "OPP_PTS_FB", "OPP_PTS_PAINT", "BLK", "BLKA", "PF", "PFD", "NBA_FANTASY_PTS", "GP_RANK", "W_RANK", "L_RANK", "W_PCT_RANK", "MIN_RANK", "PTS_OFF_TOV_RANK", "PTS_2ND_CHANCE_RANK", "PTS_FB_RANK", "PTS_PAINT_RANK", "OPP_PTS_OFF_TOV_RANK", "OPP_PTS_2ND_CHANCE_RANK", "OPP_PTS_FB_RANK", "OPP_PTS_PAINT_RANK", "BLK_RANK", "BLKA_RANK", "PF_RANK", "PFD_RANK", "NBA_FANTASY_PTS_RANK", 'PLAYER_NAME', 'NICKNAME', 'TEAM_ID', 'TEAM_ABBREVIATION', 'GP', 'MIN'])
-
-    team_ids = player_base_df['TEAM_ID'].unique()
-    player_opp_df = []
-    for id in team_ids:
-        retry_count = 0
-        while retry_count < max_retries:
-            try:
-                player_opp = leagueplayerondetails.LeaguePlayerOnDetails(team_id=id, measure_type_detailed_defense='Opponent', per_mode_detailed='PerGame', timeout=60)
-                p_opp_df = player_opp.get_data_frames()[0]
-                player_opp_df.append(p_opp_df)
-                time.sleep(1)
-                break
-            except (requests.exceptions.RequestException, Timeout) as e:
-                retry_count += 1
-                wait_time = (2 ** retry_count) + random.uniform(0, 1)
-                logging.error(f"Retry {retry_count}/{max_retries} for team {id} opp stats after {wait_time:.2f}s: {e}")
-                time.sleep(wait_time)
-                if retry_count == max_retries:
-                    logging.error(f"Max retries reached for team {id} opp stats: {e}")
-                    raise
-
-    player_opp_df = pd.concat(player_opp_df, ignore_index=True)
-    player_opp_df = player_opp_df.groupby('VS_PLAYER_ID').agg({
-        'OPP_FG_PCT': 'mean',
-        'OPP_FG3_PCT': 'mean',
-    }).reset_index()
-    player_opp_df.rename(columns={'VS_PLAYER_ID': 'PLAYER_ID'}, inplace=True)
-    columns_to_drop = ["GROUP_SET", "COURT_STATUS", "W", "L", "W_PCT", "OPP_FGM", "OPP_FGA", 
-                      "OPP_FG3M", "OPP_FG3A", "OPP_FTM", "OPP_FTA", "OPP_FT_PCT", 
-                      "OPP_OREB", "OPP_DREB", "OPP_REB", "OPP_AST", "OPP_TOV", 
-                      "OPP_STL", "OPP_BLK", "OPP_BLKA", "OPP_PF", "OPP_PFD", 
-                      "OPP_PTS", "PLUS_MINUS", "GP_RANK", "W_RANK", "L_RANK", 
-                      "W_PCT_RANK", "MIN_RANK", "OPP_FGM_RANK", "OPP_FGA_RANK", 
-                      "OPP_FG_PCT_RANK", "OPP_FG3M_RANK", "OPP_FG3A_RANK", 
-                      "OPP_FG3_PCT_RANK", "OPP_FTM_RANK", "OPP_FTA_RANK", 
-                      "OPP_FT_PCT_RANK", "OPP_OREB_RANK", "OPP_DREB_RANK", 
-                      "OPP_REB_RANK", "OPP_AST_RANK", "OPP_TOV_RANK", 
-                      "OPP_STL_RANK", "OPP_BLK_RANK", "OPP_BLKA_RANK", 
-                      "OPP_PF_RANK", "OPP_PFD_RANK", "OPP_PTS_RANK", 
-                      "PLUS_MINUS_RANK", 'TEAM_NAME', 'VS_PLAYER_NAME', 
-                      'TEAM_ID', 'TEAM_ABBREVIATION', 'GP', 'MIN']
-    columns_to_drop = [col for col in columns_to_drop if col in player_opp_df.columns]
-    player_opp_df = player_opp_df.drop(columns=columns_to_drop)
-
-    retry_count = 0
-    while retry_count < max_retries:
-        try:
-            player_def = leaguedashplayerstats.LeagueDashPlayerStats(measure_type_detailed_defense='Defense', per_mode_detailed='PerGame', timeout=60)
-            player_def_df = player_def.get_data_frames()[0]
-            break
-        except (requests.exceptions.RequestException, Timeout) as e:
-            retry_count += 1
-            wait_time = (2 ** retry_count) + random.uniform(0, 1)
-            logging.error(f"Retry {retry_count}/{max_retries} for player_def after {wait_time:.2f}s: {e}")
-            time.sleep(wait_time)
-            if retry_count == max_retries:
-                logging.error(f"Max retries reached for player_def: {e}")
-                raise
-
-    player_def_df = player_def_df.drop(columns=["AGE", "W", "L", "W_PCT", "DEF_RATING", "DREB", "DREB_PCT", "PCT_DREB", "STL", "PCT_STL", "BLK", "PCT_BLK", "OPP_PTS_OFF_TOV", "OPP_PTS_2ND_CHANCE", "OPP_PTS_FB", "OPP_PTS_PAINT", "GP_RANK", "W_RANK", "L_RANK", "W_PCT_RANK", "MIN_RANK", "DEF_RATING_RANK", "DREB_RANK", "DREB_PCT_RANK", "PCT_DREB_RANK", "STL_RANK", "PCT_STL_RANK", "BLK_RANK", "PCT_BLK_RANK", "OPP_PTS_OFF_TOV_RANK", "OPP_PTS_2ND_CHANCE_RANK", "OPP_PTS_FB_RANK", "OPP_PTS_PAINT_RANK", "DEF_WS_RANK", 'PLAYER_NAME', 'NICKNAME', 'TEAM_ID', 'TEAM_ABBREVIATION', 'GP', 'MIN'])
-
-    retry_count = 0
-    while retry_count < max_retries:
-        try:
-            player_past = leaguedashptstats.LeagueDashPtStats(player_or_team='Player', per_mode_simple='PerGame', pt_measure_type='Passing', timeout=60)
-            player_past_df = player_past.get_data_frames()[0]
-            break
-        except (requests.exceptions.RequestException, Timeout) as e:
-            retry_count += 1
-            wait_time = (2 ** retry_count) + random.uniform(0, 1)
-            logging.error(f"Retry {retry_count}/{max_retries} for player_past after {wait_time:.2f}s: {e}")
-            time.sleep(wait_time)
-            if retry_count == max_retries:
-                logging.error(f"Max retries reached for player_past: {e}")
-                raise
-
-    player_past_df = player_past_df.drop(columns=["W", "L", "PASSES_MADE", "PASSES_RECEIVED", "AST", "FT_AST", "AST_POINTS_CREATED", "AST_ADJ", "AST_TO_PASS_PCT", "AST_TO_PASS_PCT_ADJ", 'PLAYER_NAME', 'TEAM_ID', 'TEAM_ABBREVIATION', 'GP', 'MIN'])
-
-    retry_count = 0
-    while retry_count < max_retries:
-        try:
-            player_sd = leaguedashptstats.LeagueDashPtStats(player_or_team='Player', per_mode_simple='PerGame', pt_measure_type='SpeedDistance', timeout=60)
-            player_sd_df = player_sd.get_data_frames()[0]
-            break
-        except (requests.exceptions.RequestException, Timeout) as e:
-            retry_count += 1
-            wait_time = (2 ** retry_count) + random.uniform(0, 1)
-            logging.error(f"Retry {retry_count}/{max_retries} for player_sd after {wait_time:.2f}s: {e}")
-            time.sleep(wait_time)
-            if retry_count == max_retries:
-                logging.error(f"Max retries reached for player_sd: {e}")
-                raise
-
-    player_sd_df = player_sd_df.drop(columns=["W", "L", "MIN1", "DIST_MILES", "DIST_MILES_OFF", "DIST_MILES_DEF", "AVG_SPEED_OFF", "AVG_SPEED_DEF", 'PLAYER_NAME', 'TEAM_ID', 'TEAM_ABBREVIATION', 'GP', 'MIN'])
-
-    retry_count = 0
-    while retry_count < max_retries:
-        try:
-            player_hustle = leaguehustlestatsplayer.LeagueHustleStatsPlayer(per_mode_time='PerGame', timeout=60)
-            player_hustle_df = player_hustle.get_data_frames()[0]
-            break
-        except (requests.exceptions.RequestException, Timeout) as e:
-            retry_count += 1
-            wait_time = (2 ** retry_count) + random.uniform(0, 1)
-            logging.error(f"Retry {retry_count}/{max_retries} for player_hustle after {wait_time:.2f}s: {e}")
-            time.sleep(wait_time)
-            if retry_count == max_retries:
-                logging.error(f"Max retries reached for player_hustle: {e}")
-                raise
-
-    player_hustle_df = player_hustle_df.drop(columns=["AGE", "CONTESTED_SHOTS", "CONTESTED_SHOTS_2PT", "CONTESTED_SHOTS_3PT", "CHARGES_DRAWN", "SCREEN_ASSISTS", "SCREEN_AST_PTS", "OFF_LOOSE_BALLS_RECOVERED", "DEF_LOOSE_BALLS_RECOVERED", "PCT_LOOSE_BALLS_RECOVERED_OFF", "PCT_LOOSE_BALLS_RECOVERED_DEF", "OFF_BOXOUTS", "DEF_BOXOUTS", "BOX_OUT_PLAYER_TEAM_REBS", "BOX_OUT_PLAYER_REBS", "PCT_BOX_OUTS_OFF", "PCT_BOX_OUTS_DEF", "PCT_BOX_OUTS_TEAM_REB", 'PLAYER_NAME', 'TEAM_ID', 'TEAM_ABBREVIATION', 'G', 'MIN'])
-
-    player_ids = player_base_df['PLAYER_ID'].unique()
-    player_dunk_df = []
-    for id in player_ids:
-        retry_count = 0
-        while retry_count < 8:
-            try:
-                player_dunk = playerdashboardbyshootingsplits.PlayerDashboardByShootingSplits(player_id=id, per_mode_detailed="PerGame", timeout=60)
-                player_df = player_dunk.get_data_frames()[5]
-                dunk_df = player_df[player_df['GROUP_VALUE'] == 'Dunk']
-                if not dunk_df.empty:
-                    dunk_fga = dunk_df['FGA'].values[0]
-                    player_dunk_df.append({'PLAYER_ID': id, 'DUNK_FGA': dunk_fga})
-                    logging.info(f"{id} dunk data added")
-                else:
-                    logging.info(f"{id} has no dunk data")
-                break
-            except (requests.exceptions.RequestException, Timeout) as e:
-                wait_time = (2 ** retry_count) + random.uniform(0, 1)
-                logging.error(f"Retry {retry_count + 1} for {id} dunk data after {wait_time:.2f}s: {e}")
-                time.sleep(wait_time)
-                retry_count += 1
-            if retry_count == 8:
-                logging.error(f"Max retries reached for player {id} dunk data.")
-        time.sleep(10)
-
-    player_dunk_df = pd.DataFrame(player_dunk_df)
-
-    retry_count = 0
-    while retry_count < max_retries:
-        try:
-            player_score = leaguedashplayerstats.LeagueDashPlayerStats(measure_type_detailed_defense='Scoring', per_mode_detailed='PerGame', timeout=60)
-            player_score_df = player_score.get_data_frames()[0]
-            break
-        except (requests.exceptions.RequestException, Timeout) as e:
-            retry_count += 1
-            wait_time = (2 ** retry_count) + random.uniform(0, 1)
-            logging.error(f"Retry {retry_count}/{max_retries} for player_score after {wait_time:.2f}s: {e}")
-            time.sleep(wait_time)
-            if retry_count == max_retries:
-                logging.error(f"Max retries reached for player_score: {e}")
-                raise
-
-    player_score_df = player_score_df.drop(columns=["PLAYER_NAME", "NICKNAME", "TEAM_ID", "TEAM_ABBREVIATION", "AGE", "GP", "W", "L", "W_PCT", "MIN", "PCT_FGA_2PT", "PCT_FGA_3PT", "PCT_PTS_2PT", "PCT_PTS_2PT_MR", "PCT_PTS_FB", "PCT_PTS_FT", "PCT_PTS_OFF_TOV", "PCT_AST_2PM", "PCT_UAST_2PM", "PCT_AST_3PM", "PCT_UAST_3PM", "PCT_AST_FGM", "FGM", "FGA", "FG_PCT", "GP_RANK", "W_RANK", "L_RANK", "W_PCT_RANK", "MIN_RANK", "PCT_FGA_2PT_RANK", "PCT_FGA_3PT_RANK", "PCT_PTS_2PT_RANK", "PCT_PTS_2PT_MR_RANK", "PCT_PTS_3PT_RANK", "PCT_PTS_FB_RANK", "PCT_PTS_FT_RANK", "PCT_PTS_OFF_TOV_RANK", "PCT_PTS_PAINT_RANK", "PCT_AST_2PM_RANK", "PCT_UAST_2PM_RANK", "PCT_AST_3PM_RANK", "PCT_UAST_3PM_RANK", "PCT_AST_FGM_RANK", "PCT_UAST_FGM_RANK", "FGM_RANK", "FGA_RANK", "FG_PCT_RANK"])
-
-    dataframes = [player_base_df, player_adv_df, player_def_df, player_hustle_df, player_misc_df, player_opp_df, player_past_df, player_sd_df, player_dunk_df, player_score_df]
+    def playerBase():
+        player_base_df = fetcher.fetchFrame(leaguedashplayerstats.LeagueDashPlayerStats, "player_base", measure_type_detailed_defense='Base', per_mode_detailed='PerGame')
+        return player_base_df.drop(columns=['AGE', 'W', 'L', 'W_PCT', 'FGM', 'FG_PCT', 'FG3A', 'FG3M', 'FTM', 'FT_PCT', 'BLKA', 'PFD', "PLUS_MINUS", "NBA_FANTASY_PTS", "DD2", "TD3", "WNBA_FANTASY_PTS", "GP_RANK", "W_RANK", "L_RANK", "W_PCT_RANK", "MIN_RANK", "FGM_RANK", "FGA_RANK", "FG_PCT_RANK", "FG3M_RANK", "FG3A_RANK", "FG3_PCT_RANK", "FTM_RANK", "FTA_RANK", "FT_PCT_RANK", "OREB_RANK", "DREB_RANK", "REB_RANK", "AST_RANK", "TOV_RANK", "STL_RANK", "BLK_RANK", "BLKA_RANK", "PF_RANK", "PFD_RANK", "PTS_RANK", "PLUS_MINUS_RANK", "NBA_FANTASY_PTS_RANK", "DD2_RANK", "TD3_RANK", "WNBA_FANTASY_PTS_RANK"])
+
+    def playerAdv():
+        player_adv_df = fetcher.fetchFrame(leaguedashplayerstats.LeagueDashPlayerStats, "player_adv", measure_type_detailed_defense='Advanced', per_mode_detailed='PerGame')
+        return player_adv_df.drop(columns=["AGE", "W", "L", "W_PCT", "E_OFF_RATING", "OFF_RATING", "sp_work_OFF_RATING", "E_DEF_RATING", "DEF_RATING", "sp_work_DEF_RATING", "E_NET_RATING", "NET_RATING", "sp_work_NET_RATING", "AST_PCT", "AST_TO", "AST_RATIO", "OREB_PCT", "DREB_PCT", "REB_PCT", "TM_TOV_PCT", "E_TOV_PCT", "E_USG_PCT", "E_PACE", "PACE", "PACE_PER40", "sp_work_PACE", "PIE", "POSS", "FGM", "FGA", "FGM_PG", "FGA_PG", "FG_PCT", "GP_RANK", "W_RANK", "L_RANK", "W_PCT_RANK", "MIN_RANK", "E_OFF_RATING_RANK", "OFF_RATING_RANK", "sp_work_OFF_RATING_RANK", "E_DEF_RATING_RANK", "DEF_RATING_RANK", "sp_work_DEF_RATING_RANK", "E_NET_RATING_RANK", "NET_RATING_RANK", "sp_work_NET_RATING_RANK", "AST_PCT_RANK", "AST_TO_RANK", "AST_RATIO_RANK", "OREB_PCT_RANK", "DREB_PCT_RANK", "REB_PCT_RANK", "TM_TOV_PCT_RANK", "E_TOV_PCT_RANK", "EFG_PCT_RANK", "TS_PCT_RANK", "USG_PCT_RANK", "E_USG_PCT_RANK", "E_PACE_RANK", "PACE_RANK", "sp_work_PACE_RANK", "PIE_RANK", "FGM_RANK", "FGA_RANK", "FGM_PG_RANK", "FGA_PG_RANK", "FG_PCT_RANK", 'PLAYER_NAME', 'NICKNAME', 'TEAM_ID', 'TEAM_ABBREVIATION', 'GP', 'MIN'])
+
+    def playerMisc():
+        player_misc_df = fetcher.fetchFrame(leaguedashplayerstats.LeagueDashPlayerStats, "player_misc", measure_type_detailed_defense='Misc', per_mode_detailed='PerGame')
+        return player_misc_df.drop(columns=["AGE", "W", "L", "W_PCT", "PTS_OFF_TOV", "PTS_2ND_CHANCE", "PTS_PAINT", "OPP_PTS_OFF_TOV", "OPP_PTS_2ND_CHANCE", "OPP_PTS_FB", "OPP_PTS_PAINT", "BLK", "BLKA", "PF", "PFD", "NBA_FANTASY_PTS", "GP_RANK", "W_RANK", "L_RANK", "W_PCT_RANK", "MIN_RANK", "PTS_OFF_TOV_RANK", "PTS_2ND_CHANCE_RANK", "PTS_FB_RANK", "PTS_PAINT_RANK", "OPP_PTS_OFF_TOV_RANK", "OPP_PTS_2ND_CHANCE_RANK", "OPP_PTS_FB_RANK", "OPP_PTS_PAINT_RANK", "BLK_RANK", "BLKA_RANK", "PF_RANK", "PFD_RANK", "NBA_FANTASY_PTS_RANK", 'PLAYER_NAME', 'NICKNAME', 'TEAM_ID', 'TEAM_ABBREVIATION', 'GP', 'MIN'])
+
+    def playerOpp(player_base_df):
+        team_ids = player_base_df['TEAM_ID'].unique()
+        team_frames = {}
+
+        def fetchOpponentStats(id):
+            p_opp_df = leagueplayerondetails.LeaguePlayerOnDetails(team_id=id, measure_type_detailed_defense='Opponent', per_mode_detailed='PerGame', timeout=fetcher.NBA_API_TIMEOUT)
+            return p_opp_df.get_data_frames()[0]
+
+        for id, p_opp_df, error in fetcher.fetchConcurrently(team_ids, fetchOpponentStats, label=lambda id: f"team {id} opp stats"):
+            if error is not None:
+                raise error
+            team_frames[id] = p_opp_df
+
+        player_opp_df = pd.concat([team_frames[id] for id in team_ids], ignore_index=True)
+        player_opp_df = player_opp_df.groupby('VS_PLAYER_ID').agg({
+            'OPP_FG_PCT': 'mean',
+            'OPP_FG3_PCT': 'mean',
+        }).reset_index()
+        player_opp_df.rename(columns={'VS_PLAYER_ID': 'PLAYER_ID'}, inplace=True)
+        columns_to_drop = ["GROUP_SET", "COURT_STATUS", "W", "L", "W_PCT", "OPP_FGM", "OPP_FGA", 
+                          "OPP_FG3M", "OPP_FG3A", "OPP_FTM", "OPP_FTA", "OPP_FT_PCT", 
+                          "OPP_OREB", "OPP_DREB", "OPP_REB", "OPP_AST", "OPP_TOV", 
+                          "OPP_STL", "OPP_BLK", "OPP_BLKA", "OPP_PF", "OPP_PFD", 
+                          "OPP_PTS", "PLUS_MINUS", "GP_RANK", "W_RANK", "L_RANK", 
+                          "W_PCT_RANK", "MIN_RANK", "OPP_FGM_RANK", "OPP_FGA_RANK", 
+                          "OPP_FG_PCT_RANK", "OPP_FG3M_RANK", "OPP_FG3A_RANK", 
+                          "OPP_FG3_PCT_RANK", "OPP_FTM_RANK", "OPP_FTA_RANK", 
+                          "OPP_FT_PCT_RANK", "OPP_OREB_RANK", "OPP_DREB_RANK", 
+                          "OPP_REB_RANK", "OPP_AST_RANK", "OPP_TOV_RANK", 
+                          "OPP_STL_RANK", "OPP_BLK_RANK", "OPP_BLKA_RANK", 
+                          "OPP_PF_RANK", "OPP_PFD_RANK", "OPP_PTS_RANK", 
+                          "PLUS_MINUS_RANK", 'TEAM_NAME', 'VS_PLAYER_NAME', 
+                          'TEAM_ID', 'TEAM_ABBREVIATION', 'GP', 'MIN']
+        columns_to_drop = [col for col in columns_to_drop if col in player_opp_df.columns]
+        return player_opp_df.drop(columns=columns_to_drop)
+
+    def playerDef():
+        player_def_df = fetcher.fetchFrame(leaguedashplayerstats.LeagueDashPlayerStats, "player_def", measure_type_detailed_defense='Defense', per_mode_detailed='PerGame')
+        return player_def_df.drop(columns=["AGE", "W", "L", "W_PCT", "DEF_RATING", "DREB", "DREB_PCT", "PCT_DREB", "STL", "PCT_STL", "BLK", "PCT_BLK", "OPP_PTS_OFF_TOV", "OPP_PTS_2ND_CHANCE", "OPP_PTS_FB", "OPP_PTS_PAINT", "GP_RANK", "W_RANK", "L_RANK", "W_PCT_RANK", "MIN_RANK", "DEF_RATING_RANK", "DREB_RANK", "DREB_PCT_RANK", "PCT_DREB_RANK", "STL_RANK", "PCT_STL_RANK", "BLK_RANK", "PCT_BLK_RANK", "OPP_PTS_OFF_TOV_RANK", "OPP_PTS_2ND_CHANCE_RANK", "OPP_PTS_FB_RANK", "OPP_PTS_PAINT_RANK", "DEF_WS_RANK", 'PLAYER_NAME', 'NICKNAME', 'TEAM_ID', 'TEAM_ABBREVIATION', 'GP', 'MIN'])
+
+    def playerPast():
+        player_past_df = fetcher.fetchFrame(leaguedashptstats.LeagueDashPtStats, "player_past", player_or_team='Player', per_mode_simple='PerGame', pt_measure_type='Passing')
+        return player_past_df.drop(columns=["W", "L", "PASSES_MADE", "PASSES_RECEIVED", "AST", "FT_AST", "AST_POINTS_CREATED", "AST_ADJ", "AST_TO_PASS_PCT", "AST_TO_PASS_PCT_ADJ", 'PLAYER_NAME', 'TEAM_ID', 'TEAM_ABBREVIATION', 'GP', 'MIN'])
+
+    def playerSd():
+        player_sd_df = fetcher.fetchFrame(leaguedashptstats.LeagueDashPtStats, "player_sd", player_or_team='Player', per_mode_simple='PerGame', pt_measure_type='SpeedDistance')
+        return player_sd_df.drop(columns=["W", "L", "MIN1", "DIST_MILES", "DIST_MILES_OFF", "DIST_MILES_DEF", "AVG_SPEED_OFF", "AVG_SPEED_DEF", 'PLAYER_NAME', 'TEAM_ID', 'TEAM_ABBREVIATION', 'GP', 'MIN'])
+
+    def playerHustle():
+        player_hustle_df = fetcher.fetchFrame(leaguehustlestatsplayer.LeagueHustleStatsPlayer, "player_hustle", per_mode_time='PerGame')
+        return player_hustle_df.drop(columns=["AGE", "CONTESTED_SHOTS", "CONTESTED_SHOTS_2PT", "CONTESTED_SHOTS_3PT", "CHARGES_DRAWN", "SCREEN_ASSISTS", "SCREEN_AST_PTS", "OFF_LOOSE_BALLS_RECOVERED", "DEF_LOOSE_BALLS_RECOVERED", "PCT_LOOSE_BALLS_RECOVERED_OFF", "PCT_LOOSE_BALLS_RECOVERED_DEF", "OFF_BOXOUTS", "DEF_BOXOUTS", "BOX_OUT_PLAYER_TEAM_REBS", "BOX_OUT_PLAYER_REBS", "PCT_BOX_OUTS_OFF", "PCT_BOX_OUTS_DEF", "PCT_BOX_OUTS_TEAM_REB", 'PLAYER_NAME', 'TEAM_ID', 'TEAM_ABBREVIATION', 'G', 'MIN'])
+
+    def playerDunk(player_base_df):
+        return fetchDunkRates(player_base_df['PLAYER_ID'].unique())
+
+    def playerScore():
+        player_score_df = fetcher.fetchFrame(leaguedashplayerstats.LeagueDashPlayerStats, "player_score", measure_type_detailed_defense='Scoring', per_mode_detailed='PerGame')
+        return player_score_df.drop(columns=["PLAYER_NAME", "NICKNAME", "TEAM_ID", "TEAM_ABBREVIATION", "AGE", "GP", "W", "L", "W_PCT", "MIN", "PCT_FGA_2PT", "PCT_FGA_3PT", "PCT_PTS_2PT", "PCT_PTS_2PT_MR", "PCT_PTS_FB", "PCT_PTS_FT", "PCT_PTS_OFF_TOV", "PCT_AST_2PM", "PCT_UAST_2PM", "PCT_AST_3PM", "PCT_UAST_3PM", "PCT_AST_FGM", "FGM", "FGA", "FG_PCT", "GP_RANK", "W_RANK", "L_RANK", "W_PCT_RANK", "MIN_RANK", "PCT_FGA_2PT_RANK", "PCT_FGA_3PT_RANK", "PCT_PTS_2PT_RANK", "PCT_PTS_2PT_MR_RANK", "PCT_PTS_3PT_RANK", "PCT_PTS_FB_RANK", "PCT_PTS_FT_RANK", "PCT_PTS_OFF_TOV_RANK", "PCT_PTS_PAINT_RANK", "PCT_AST_2PM_RANK", "PCT_UAST_2PM_RANK", "PCT_AST_3PM_RANK", "PCT_UAST_3PM_RANK", "PCT_AST_FGM_RANK", "PCT_UAST_FGM_RANK", "FGM_RANK", "FGA_RANK", "FG_PCT_RANK"])
+
+    # Every league-wide frame is independent; only the opponent and dunk fan-outs need the base frame's teams/players
+    frames = fetcher.fetchGraph({
+        'player_base': ((), playerBase),
+        'player_adv': ((), playerAdv),
+        'player_misc': ((), playerMisc),
+        'player_def': ((), playerDef),
+        'player_past': ((), playerPast),
+        'player_sd': ((), playerSd),
+        'player_hustle': ((), playerHustle),
+        'player_score': ((), playerScore),
+        'player_opp': (('player_base',), playerOpp),
+        'player_dunk': (('player_base',), playerDunk),
+    })
+
+    dataframes = [frames[name] for name in ['player_base', 'player_adv', 'player_def', 'player_hustle', 'player_misc', 'player_opp', 'player_past', 'player_sd', 'player_dunk', 'player_score']]
     combined_df = dataframes[0]
     for df in dataframes[1:]:
         combined_df = pd.merge(combined_df, df, on='PLAYER_ID', how='inner')
 
     combined_df = combined_df.drop_duplicates(subset=["PLAYER_ID"], keep="first")
 
-    def normalize(series):
-        scaler = MinMaxScaler()
-        return scaler.fit_transform(series.values.reshape(-1, 1)).flatten()
-
-    def rescale(series, factor=10):
-        return ((series - series.mean()) / series.std() * factor + 50).clip(0, 100)
-
-    combined_df["Scoring"] = (0.30 * normalize(combined_df["PTS"]) +
-                              0.10 * normalize(combined_df["FGA"]) +
-                              0.10 * normalize(combined_df["FTA"]) +
-                              0.20 * normalize(combined_df["TS_PCT"]) +
-                              0.10 * normalize(combined_df["EFG_PCT"]) +
-                              0.20 * normalize(combined_df["PCT_UAST_FGM"])) * 100
-    combined_df["Scoring"] = rescale(combined_df["Scoring"], factor=12)
-
-    combined_df["Playmaking"] = (0.30 * normalize(combined_df["AST"]) +
-                                 0.20 * normalize(combined_df["POTENTIAL_AST"]) +
-                                 0.20 * normalize(combined_df["SECONDARY_AST"]) +
-                                 0.15 * normalize(combined_df["USG_PCT"]) -
-                                 0.15 * normalize(combined_df["TOV"])) * 100
-    combined_df["Playmaking"] = rescale(combined_df["Playmaking"], factor=10)
-
-    combined_df["Rebounding"] = (0.40 * normalize(combined_df["REB"]) +
-                                 0.30 * normalize(combined_df["OREB"]) +
-                                 0.30 * normalize(combined_df["DREB"])) * 100
-    combined_df["Rebounding"] = rescale(combined_df["Rebounding"], factor=10)
-
-    combined_df["Defense"] = (0.30 * normalize(combined_df["BLK"]) +
-                              0.15 * normalize(combined_df["DEFLECTIONS"]) +
-                              0.15 * normalize(combined_df["STL"]) +
-                              0.10 * normalize(combined_df["DEF_WS"]) -
-                              0.15 * normalize(combined_df["PF"]) +
-                              0.15 * normalize(1 - combined_df["OPP_FG_PCT"])) * 100
-    combined_df["Defense"] = rescale(combined_df["Defense"], factor=8)
-
-    combined_df["Athleticism"] = (0.25 * normalize(combined_df["PTS_FB"]) +
-                                  0.20 * normalize(combined_df["DIST_FEET"]) +
-                                  0.20 * normalize(combined_df["AVG_SPEED"]) +
-                                  0.20 * normalize(combined_df["LOOSE_BALLS_RECOVERED"]) +
-                                  0.15 * normalize(combined_df["DUNK_FGA"])) * 100
-    combined_df["Athleticism"] = rescale(combined_df["Athleticism"], factor=12)
-
-    categories = ["Scoring", "Playmaking", "Rebounding", "Defense", "Athleticism"]
-    for category in categories:
+    combined_df = gradePlayers(combined_df)
+    swapTable(combined_df, table)
+    logging.info("Grades and archetypes updated")
+    return len(combined_df)
+
+grade_engine = grading.GradeEngine()
+
+def gradePlayers(combined_df):
+    combined_df[grade_engine.categories] = grade_engine.grade(combined_df)
+
+    for category in grading.CATEGORIES:
         combined_df[f"{category}_Rank"] = combined_df[category].rank(pct=True) * 100
 
-    combined_df["Avg_Grade"] = combined_df[categories].mean(axis=1)
-
-    def assign_archetype(row):
-        scores = {
-            "Scoring": row["Scoring"],
-            "Playmaking": row["Playmaking"],
-            "Rebounding": row["Rebounding"],
-            "Defense": row["Defense"],
-            "Athleticism": row["Athleticism"]
-        }
-        league_medians = combined_df[["STL", "BLK", "SECONDARY_AST", "OPP_FG3_PCT"]].median()
-        is_shooter = row["PCT_PTS_3PT"] > 0.40 and row["FG3_PCT"] > 0.37
-        is_rim_finisher = row["DUNK_FGA"] > 4.0 or row["PCT_PTS_PAINT"] > 0.5
-        is_perimeter_defender = row["STL"] > league_medians["STL"] * 1.5 and row["OPP_FG3_PCT"] < league_medians["OPP_FG3_PCT"] * 0.9
-        is_rim_protector = row["BLK"] > league_medians["BLK"] * 1.5
-        
-        sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-        top_cat, top_score = sorted_scores[0]
-        second_cat, second_score = sorted_scores[1]
-        third_cat, third_score = sorted_scores[2]
-        score_diff = top_score - second_score
-        
-        if row['Avg_Grade'] < 40 and row['MIN'] < 15:
-            return "Benchwarmer"
-        if all(45 <= score <= 55 for score in scores.values()):
-            return "Role Player"
-        
-        if top_cat == "Scoring":
-            if second_cat == "Playmaking":
-                if is_shooter:
-                    return "Sharpshooting Maestro"
-                elif score_diff <= 10 and top_score >= 75:
-                    return "Dual-Threat Maestro"
-                elif score_diff > 15:
-                    return "Shot Creator"
-                return "Scoring Playmaker"
-            elif second_cat == "Athleticism":
-                if is_rim_finisher:
-                    return "Explosive Finisher"
-                elif score_diff <= 10 and top_score >= 75:
-                    return "Athletic Scorer"
-                elif score_diff > 15:
-                    return "Dynamic Finisher"
-                return "Scoring Athlete"
-            elif second_cat == "Defense":
-                if is_perimeter_defender:
-                    return "Perimeter Two-Way Threat"
-                elif score_diff <= 10 and top_score >= 75:
-                    return "Two-Way Star"
-                elif score_diff > 15:
-                    return "Defensive Scorer"
-                return "Scoring Defender"
-            elif second_cat == "Rebounding":
-                if is_rim_finisher:
-                    return "Scoring Interior Force"
-                elif score_diff <= 10 and top_score >= 75:
-                    return "Interior Dual-Threat"
-                elif score_diff > 15:
-                    return "Paint Powerhouse"
-                return "Scoring Rebounder"
-        
-        elif top_cat == "Playmaking":
-            if second_cat == "Scoring":
-                if row["SECONDARY_AST"] > league_medians["SECONDARY_AST"] * 1.5:
-                    return "Orchestrating Star"
-                elif score_diff <= 10 and top_score >= 75:
-                    return "Playmaking Scorer"
-                elif score_diff > 15:
-                    return "Dual-Threat Guard"
-                return "Facilitating Scorer"
-            elif second_cat == "Defense":
-                if is_perimeter_defender:
-                    return "Defensive Floor General"
-                elif score_diff <= 10 and top_score >= 75:
-                    return "Disruptive Playmaker"
-                elif score_diff > 15:
-                    return "Pesky Facilitator"
-                return "Defensive Distributor"
-            elif second_cat == "Athleticism":
-                if score_diff <= 10 and top_score >= 75:
-                    return "Dynamic Facilitator"
-                elif score_diff > 15:
-                    return "Pace Pusher"
-                return "Athletic Playmaker"
-            elif second_cat == "Rebounding":
-                if score_diff <= 10 and top_score >= 75:
-                    return "Rebounding Playmaker"
-                elif score_diff > 15:
-                    return "Rebound Distributor"
-                return "Board Passer" if third_score < 60 else "Rebounding Maestro"
-        
-        elif top_cat == "Rebounding":
-            if second_cat == "Defense":
-                if is_rim_protector:
-                    return "Rim Guardian"
-                elif score_diff <= 10 and top_score >= 75:
-                    return "Defensive Rebounder"
-                elif score_diff > 15:
-                    return "Paint Protector"
-                return "Rebounding Defender"
-            elif second_cat == "Scoring":
-                if score_diff <= 10 and top_score >= 75:
-                    return "Scoring Boardmaster"
-                elif score_diff > 15:
-                    return "Post Operator"
-                return "Rebounding Scorer"
-            elif second_cat == "Athleticism":
-                if score_diff <= 10 and top_score >= 75:
-                    return "Athletic Board-Crasher"
-                elif score_diff > 15:
-                    return "Energy Big"
-                return "Rebounding Athlete"
-            elif second_cat == "Playmaking":
-                if score_diff <= 10 and top_score >= 75:
-                    return "Facilitating Rebounder"
-                elif score_diff > 15:
-                    return "Outlet Specialist"
-                return "Board Facilitator"
-        
-        elif top_cat == "Defense":
-            if second_cat == "Rebounding":
-                if is_rim_protector:
-                    return "Defensive Anchor"
-                elif score_diff <= 10 and top_score >= 75:
-                    return "Rebounding Stopper"
-                elif score_diff > 15:
-                    return "Interior Wall"
-                return "Defensive Rebounder"
-            elif second_cat == "Athleticism":
-                if is_perimeter_defender:
-                    return "Perimeter Hawk"
-                elif score_diff <= 10 and top_score >= 75:
-                    return "Athletic Defender"
-                elif score_diff > 15:
-                    return "Active Defender"
-                return "Hustle Defender"
-            elif second_cat == "Scoring":
-                if score_diff <= 10 and top_score >= 75:
-                    return "Two-Way Threat"
-                elif score_diff > 15:
-                    return "Defensive Scorer"
-                return "Scoring Stopper"
-            elif second_cat == "Playmaking":
-                if score_diff <= 10 and top_score >= 75:
-                    return "Playmaking Defender"
-                elif score_diff > 15:
-                    return "Pesky Facilitator"
-                return "Disruptive Distributor"
-        
-        elif top_cat == "Athleticism":
-            if second_cat == "Scoring":
-                if is_rim_finisher:
-                    return "Athletic Phenom"
-                elif score_diff <= 10 and top_score >= 75:
-                    return "Scoring Dynamo"
-                elif score_diff > 15:
-                    return "Highlight Maker"
-                return "Athletic Scorer"
-            elif second_cat == "Defense":
-                if is_perimeter_defender:
-                    return "Energy Stopper"
-                elif score_diff <= 10 and top_score >= 75:
-                    return "Defensive Athlete"
-                elif score_diff > 15:
-                    return "Hustle Spark"
-                return "Active Athlete"
-            elif second_cat == "Rebounding":
-                if score_diff <= 10 and top_score >= 75:
-                    return "Rebounding Dynamo"
-                elif score_diff > 15:
-                    return "Rebound Athlete"
-                return "Athletic Board-Grabber"
-            elif second_cat == "Playmaking":
-                if score_diff <= 10 and top_score >= 75:
-                    return "Playmaking Athlete"
-                elif score_diff > 15:
-                    return "Fast-Break Igniter"
-                return "Dynamic Distributor"
-        
-        return "Versatile Contributor"
-
-    combined_df["Archetype"] = combined_df.apply(assign_archetype, axis=1)
-    combined_df.to_sql(name=table, con=db, if_exists='replace', index=False)
-    logging.info("Grades and archetypes updated")
+    combined_df["Avg_Grade"] = combined_df[grading.CATEGORIES].mean(axis=1)
+
+    combined_df["Archetype"] = grading.assignArchetypes(combined_df)
+    return combined_df
+
+def publishSnapshots():
+    players_db = pd.read_sql(snapshots.PLAYERS_QUERY, con=db)
+    teams_db = pd.read_sql(snapshots.TEAMS_QUERY, con=db)
+    team_standings_db = pd.read_sql(snapshots.TEAM_STANDINGS_QUERY, con=db)
+    payloads = {
+        'players': snapshots.serializePlayers(players_db),
+        'teams': snapshots.serializeTeams(teams_db, team_standings_db)
+    }
+
+    team_profiles = snapshots.serializeTeamProfiles(
+        pd.read_sql("SELECT * FROM teams", con=db),
+        pd.read_sql("SELECT * FROM players", con=db),
+        pd.read_sql("SELECT * FROM standings", con=db)
+    )
+    for team_id, profile in team_profiles.items():
+        payloads[f"team/{team_id}"] = profile
+
+    version = snapshots.publish(payloads)
+    logging.info(f"Published snapshot {version} with {len(payloads)} payloads")
+
+def publishGamelogIndex():
+    gamelog_df = pd.read_sql("SELECT * FROM gamelogs", con=db)
+    version = logindex.publish(gamelog_df)
+    logging.info(f"Published gamelog index {version} with {len(gamelog_df)} rows")
+    return len(gamelog_df)
+
+STAGE_ATTEMPTS = int(os.getenv('STAGE_ATTEMPTS', 2))
+STAGE_RETRY_DELAY = float(os.getenv('STAGE_RETRY_DELAY', 60))
+STAGE_WORKERS = int(os.getenv('STAGE_WORKERS', 4))
+
+# Nightly stages and the stages each one reads the output of. Grades wait for gamelogs because the dunk cache keys
+# on each player's newest ingested game, which must not be read from a partially ingested gamelogs table.
+NIGHTLY_STAGES = {
+    'fetchPlayers': ((), fetchPlayers),
+    'fetchTeams': (('fetchPlayers',), fetchTeams),
+    'fetchStandings': ((), fetchStandings),
+    'fetchGamelogs': ((), fetchGamelogs),
+    'fetchGrades': (('fetchGamelogs',), fetchGrades),
+    'publishSnapshots': (('fetchPlayers', 'fetchTeams', 'fetchStandings', 'fetchGrades'), publishSnapshots),
+    'publishGamelogIndex': (('fetchGamelogs',), publishGamelogIndex),
+}
+
+def rssMb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class MemoryMonitor:
+    # Samples process RSS while stages run and keeps the high-water mark seen during each one. Stages share
+    # the process, so a stage's peak also covers whatever ran alongside it.
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.peaks = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            rss = rssMb()
+            with self.lock:
+                for key in self.peaks:
+                    self.peaks[key] = max(self.peaks[key], rss)
+
+    def start(self, key):
+        with self.lock:
+            self.peaks[key] = rssMb()
+
+    def stop(self, key):
+        with self.lock:
+            return max(self.peaks.pop(key), rssMb())
+
+def ensureRunHistory():
+    with db.begin() as conn:
+        conn.execute(sqlalchemy.text(
+            "CREATE TABLE IF NOT EXISTS run_history (run_id VARCHAR(32) NOT NULL, stage VARCHAR(64) NOT NULL, attempt INT NOT NULL, "
+            "status VARCHAR(16) NOT NULL, started_at DATETIME(6) NULL, finished_at DATETIME(6) NULL, duration_s DOUBLE NULL, "
+            "rows_written BIGINT NULL, upstream_calls INT NULL, cached_calls INT NULL, peak_rss_mb DOUBLE NULL, error TEXT NULL, "
+            "PRIMARY KEY (run_id, stage, attempt))"
+        ))
+
+def recordStage(row):
+    try:
+        with db.begin() as conn:
+            conn.execute(sqlalchemy.text(
+                "INSERT INTO run_history (run_id, stage, attempt, status, started_at, finished_at, duration_s, rows_written, upstream_calls, cached_calls, peak_rss_mb, error) "
+                "VALUES (:run_id, :stage, :attempt, :status, :started_at, :finished_at, :duration_s, :rows_written, :upstream_calls, :cached_calls, :peak_rss_mb, :error)"
+            ), row)
+    except sqlalchemy.exc.SQLAlchemyError as e:
+        logging.error(f"Could not record {row['stage']} in run_history: {e}")
+
+def runStages(stages, run_id=None, attempts=STAGE_ATTEMPTS, workers=STAGE_WORKERS):
+    # Runs each stage once its dependencies succeed, independent stages in parallel, retrying a failed stage on
+    # its own; stages downstream of one that keeps failing are skipped. Every attempt lands in run_history.
+    run_id = run_id or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    ensureRunHistory()
+    tries = {}
+
+    def runStage(name, stage):
+        tries[name] = attempt = tries.get(name, 0) + 1
+        if attempt > 1:
+            time.sleep(STAGE_RETRY_DELAY)
+        counts = {}
+        fetcher.request_counts.set(counts)
+        monitor.start(name)
+        started_at, started = datetime.now(timezone.utc).replace(tzinfo=None), time.monotonic()
+        status, rows, error = 'succeeded', None, None
+        try:
+            rows = stage()
+            return rows
+        except Exception as e:
+            status, error = 'failed', f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            duration = time.monotonic() - started
+            recordStage({
+                'run_id': run_id, 'stage': name, 'attempt': attempt, 'status': status, 'started_at': started_at,
+                'finished_at': datetime.now(timezone.utc).replace(tzinfo=None), 'duration_s': duration,
+                'rows_written': rows if isinstance(rows, int) else None, 'upstream_calls': counts.get('upstream', 0) + counts.get('replayed', 0),
+                'cached_calls': counts.get('cached', 0), 'peak_rss_mb': monitor.stop(name), 'error': error
+            })
+            logging.info(f"Stage {name} {status} in {duration:.1f}s (attempt {attempt}, {counts.get('upstream', 0)} upstream calls)")
+
+    tasks = {name: (dependencies, lambda *_, name=name, stage=stage: runStage(name, stage)) for name, (dependencies, stage) in stages.items()}
+    with MemoryMonitor() as monitor:
+        try:
+            fetcher.fetchGraph(tasks, workers=workers, attempts=attempts)
+        finally:
+            for name in stages:
+                if name not in tries:
+                    recordStage({
+                        'run_id': run_id, 'stage': name, 'attempt': 0, 'status': 'skipped', 'started_at': None, 'finished_at': None,
+                        'duration_s': None, 'rows_written': None, 'upstream_calls': None, 'cached_calls': None, 'peak_rss_mb': None,
+                        'error': "an upstream stage failed"
+                    })
+    return run_id
+
+def migrateSchema():
+    # gamelogs' own migration deduplicates rows, which has to happen before its primary key can be added
+    ensureGamelogSchema()
+    version = schema.migrate(db)
+    logging.info(f"Schema at version {version}")
 
 def runPrograms():
     logging.info("Running scheduled tasks...")
     try:
-        fetchPlayers()
-        fetchStandings()
-        fetchGamelogs()
-        fetchGrades()
-        logging.info("Scheduled tasks completed successfully.")
+        migrateSchema()
+        run_id = runStages(NIGHTLY_STAGES)
+        fetcher.pruneCache()
+        logging.info(f"Scheduled tasks completed successfully (run {run_id}).")
     except Exception as e:
         logging.error(f"Error in runPrograms: {e}")
         raise
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backfill', nargs=2, metavar=('FIRST_SEASON', 'LAST_SEASON'), help="load past seasons' gamelogs, e.g. --backfill 2014-15 2023-24")
+    parser.add_argument('--processes', type=int, default=BACKFILL_PROCESSES)
+    parser.add_argument('--once', action='store_true', help="run the nightly programs once and exit")
+    parser.add_argument('--grades', action='store_true', help="refresh grades and snapshots only, reusing cached inputs")
+    parser.add_argument('--mode', choices=fetcher.NBA_API_MODES, default=fetcher.NBA_API_MODE, help="record nba_api responses as fixtures, or replay them offline")
+    parser.add_argument('--fixtures', default=fetcher.NBA_API_FIXTURE_DIR, help="fixture archive for --mode record/replay")
+    parser.add_argument('--latency', type=float, default=fetcher.NBA_API_REPLAY_LATENCY, help="simulated seconds per replayed response")
+    args = parser.parse_args()
+    fetcher.setMode(args.mode, args.fixtures, args.latency)
+    if args.backfill:
+        backfillGamelogs(*args.backfill, processes=args.processes)
+        raise SystemExit(0)
+    if args.grades:
+        migrateSchema()
+        fetchGrades()
+        publishSnapshots()
+        raise SystemExit(0)
+    if args.once:
+        started = time.monotonic()
+        runPrograms()
+        logging.info(f"Run finished in {time.monotonic() - started:.1f}s ({fetcher.NBA_API_MODE} mode)")
+        raise SystemExit(0)
+
     scheduler = BackgroundScheduler(timezone="US/Central")
     scheduler.add_job(
         runPrograms,
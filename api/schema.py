@@ -0,0 +1,170 @@
+import argparse
+import itertools
+import logging
+import os
+import sys
+import sqlalchemy
+from dotenv import load_dotenv
+
+# Keys and indexes for the tables the API reads. pandas still decides the remaining columns; the entries below pin
+# the columns routes filter or join on to real types, give every table its natural primary key, and add the
+# secondary indexes the route queries in app.py need:
+#   players:  WHERE Player_ID = ?, WHERE Team_ID = ?, WHERE Team_Id IN (?, ?), LEFT JOIN grades ON PLAYER_ID
+#   grades:   WHERE Player_ID = ?, join target for /players
+#   teams:    WHERE TEAM_ID = ?
+#   standings: WHERE TeamID = ?
+#   gamelogs: WHERE Player_ID = ? [AND game_day range/cursor] ORDER BY game_day, Game_ID
+TABLES = {
+    'players': {
+        'columns': {'PLAYER_ID': 'BIGINT NOT NULL', 'TEAM_ID': 'BIGINT NOT NULL'},
+        'primary_key': ['PLAYER_ID'],
+        'indexes': {'idx_players_team': ['TEAM_ID']},
+    },
+    'grades': {
+        'columns': {'PLAYER_ID': 'BIGINT NOT NULL'},
+        'primary_key': ['PLAYER_ID'],
+    },
+    'teams': {
+        'columns': {'TEAM_ID': 'BIGINT NOT NULL'},
+        'primary_key': ['TEAM_ID'],
+    },
+    'standings': {
+        'columns': {'TeamID': 'BIGINT NOT NULL'},
+        'primary_key': ['TeamID'],
+    },
+    'gamelogs': {
+        'columns': {'Player_ID': 'BIGINT NOT NULL', 'Game_ID': 'BIGINT NOT NULL', 'game_day': 'DATE', 'season': 'VARCHAR(10) NOT NULL'},
+        'primary_key': ['Player_ID', 'Game_ID'],
+        'indexes': {'idx_gamelogs_player_day': ['Player_ID', 'game_day']},
+        'replaces': ['uq_gamelogs_player_game'],
+    },
+}
+
+def specFor(table):
+    # Past seasons' gamelogs_YYYY_YY tables share the gamelogs layout
+    if table.startswith('gamelogs_'):
+        return TABLES['gamelogs']
+    return TABLES.get(table)
+
+def columnMatches(column, definition):
+    declared_type, *constraints = definition.split(' ', 1)
+    nullable = 'NOT NULL' not in ''.join(constraints).upper()
+    return str(column['type']).upper() == declared_type.upper() and column['nullable'] == nullable
+
+def conform(engine, table, spec=None):
+    # Idempotently brings an existing table's key columns, primary key and indexes in line with its spec
+    spec = spec or specFor(table)
+    inspector = sqlalchemy.inspect(engine)
+    if spec is None or not inspector.has_table(table):
+        return False
+    columns = {column['name']: column for column in inspector.get_columns(table)}
+    primary_key = inspector.get_pk_constraint(table)['constrained_columns']
+    indexes = {index['name'] for index in inspector.get_indexes(table)}
+
+    changes = [
+        f"MODIFY `{name}` {definition}" for name, definition in spec['columns'].items()
+        if name in columns and not columnMatches(columns[name], definition)
+    ]
+    if primary_key != spec['primary_key']:
+        if primary_key:
+            changes.append("DROP PRIMARY KEY")
+        changes.append(f"ADD PRIMARY KEY ({', '.join(spec['primary_key'])})")
+        changes += [f"DROP INDEX {name}" for name in spec.get('replaces', []) if name in indexes]
+    changes += [
+        f"ADD INDEX {name} ({', '.join(index_columns)})" for name, index_columns in spec.get('indexes', {}).items()
+        if name not in indexes
+    ]
+    if not changes:
+        return False
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text(f"ALTER TABLE {table} {', '.join(changes)}"))
+    logging.info(f"Conformed {table}: {', '.join(changes)}")
+    return True
+
+def conformAll(engine):
+    for table in sqlalchemy.inspect(engine).get_table_names():
+        if specFor(table) is not None and not table.endswith(('_staging', '_retired', '_dedup')):
+            conform(engine, table)
+
+# Applied in order, once each, and recorded in schema_migrations. Tables created later (a fresh database, or a
+# swap that had to rebuild a table) are conformed when they are created, so a step here only needs to run once.
+MIGRATIONS = [
+    (1, "Typed keys, primary keys and route indexes", conformAll),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def migrate(engine):
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text("CREATE TABLE IF NOT EXISTS schema_migrations (version INT NOT NULL PRIMARY KEY, description VARCHAR(255) NOT NULL, applied_at DATETIME NOT NULL)"))
+        applied = {row[0] for row in conn.execute(sqlalchemy.text("SELECT version FROM schema_migrations"))}
+    for version, description, step in MIGRATIONS:
+        if version in applied:
+            continue
+        step(engine)
+        with engine.begin() as conn:
+            conn.execute(sqlalchemy.text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:version, :description, UTC_TIMESTAMP())"), {'version': version, 'description': description})
+        logging.info(f"Applied schema migration {version}: {description}")
+    return SCHEMA_VERSION
+
+# Route queries that read a whole table on purpose, as (query name, table alias)
+FULL_SCANS_ALLOWED = {('players', 'p'), ('teams', 'teams'), ('team_standings_all', 'standings')}
+
+def routeQueries(conn):
+    # Every statement the routes send, with parameters shaped like the ones Flask passes (path ids are strings)
+    import app
+    import snapshots
+    player_id = conn.execute(sqlalchemy.text("SELECT PLAYER_ID FROM players LIMIT 1")).scalar()
+    team_id = conn.execute(sqlalchemy.text("SELECT TEAM_ID FROM teams LIMIT 1")).scalar()
+    day = conn.execute(sqlalchemy.text("SELECT MAX(game_day) FROM gamelogs")).scalar()
+    params = {
+        'player_id': str(player_id), 'team_id': str(team_id), 'away': team_id, 'home': team_id,
+        'since': day, 'until': day, 'cursor_date': day, 'cursor_game': 0, 'limit': 21, 'season': app.CURRENT_SEASON,
+        'player_ids': [player_id, player_id]
+    }
+
+    queries = [(name, statement) for name, statement in app.QUERIES.items()]
+    queries += [
+        ('players', sqlalchemy.text(snapshots.PLAYERS_QUERY)),
+        ('teams', sqlalchemy.text(snapshots.TEAMS_QUERY)),
+        ('team_standings_all', sqlalchemy.text(snapshots.TEAM_STANDINGS_QUERY)),
+    ]
+    for size in range(len(app.GAMELOG_FILTERS) + 1):
+        for filters in itertools.combinations(app.GAMELOG_FILTERS, size):
+            for limited in (False, True):
+                queries.append((f"player_log[{','.join(filters)}{',limit' if limited else ''}]", app.playerLogQuery(filters, limited)))
+    for size in range(len(app.BATCH_GAMELOG_FILTERS) + 1):
+        for filters in itertools.combinations(app.BATCH_GAMELOG_FILTERS, size):
+            queries.append((f"batch_log[{','.join(filters)}]", app.batchLogQuery(filters)))
+    return [(name, statement, params) for name, statement in queries]
+
+def checkRoutePlans(engine):
+    # EXPLAINs every route query and reports any table it would read in full (type ALL) or by walking a whole
+    # index (type index), other than the ones in FULL_SCANS_ALLOWED
+    problems = []
+    with engine.connect() as conn:
+        for name, statement, params in routeQueries(conn):
+            bound = {key: value for key, value in params.items() if f":{key}" in statement.text}
+            expanding = [sqlalchemy.bindparam(key, expanding=True) for key, value in bound.items() if isinstance(value, list)]
+            explained = sqlalchemy.text(f"EXPLAIN {statement.text}").bindparams(*expanding)
+            for row in conn.execute(explained, bound).mappings():
+                if row['type'] in ('ALL', 'index') and (name, row['table']) not in FULL_SCANS_ALLOWED:
+                    problems.append(f"{name}: {row['type']} scan of {row['table']} (possible keys: {row['possible_keys']}, rows: {row['rows']})")
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['migrate', 'check'], help="apply pending migrations, or EXPLAIN the route queries")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    load_dotenv()
+    engine = sqlalchemy.create_engine(os.getenv('DATABASE_URL') or f"mysql+mysqlconnector://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}/{os.getenv('DB_NAME')}")
+    if args.command == 'migrate':
+        print(f"Schema at version {migrate(engine)}")
+    else:
+        problems = checkRoutePlans(engine)
+        for problem in problems:
+            print(problem)
+        if problems:
+            raise SystemExit(1)
+        print("All route queries use an index")
@@ -0,0 +1,176 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+import brotli
+
+# Published snapshots live in SNAPSHOT_DIR/<version>/, with SNAPSHOT_DIR/CURRENT naming the live version
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', '/var/lib/nba_scheduler/snapshots')
+SNAPSHOT_KEEP = int(os.getenv('SNAPSHOT_KEEP', 3))
+
+# Preferred order when a client accepts several encodings
+ENCODINGS = {'br': '.br', 'gzip': '.gz', 'identity': ''}
+
+PLAYERS_QUERY = """SELECT
+        p.TEAM_ID,
+        p.TEAM_FULL_NAME,
+        p.PLAYER_ID,
+        p.PLAYER_FULL_NAME,
+        p.POSITION,
+        p.TEAM_NAME,
+        p.JERSEY_NUMBER,
+        g.PTS,
+        g.REB,
+        g.AST,
+        g.STL,
+        g.BLK,
+        g.TOV,
+        g.Scoring,
+        g.Playmaking,
+        g.Rebounding,
+        g.Defense,
+        g.Athleticism,
+        g.Archetype
+    FROM players p
+    LEFT JOIN grades g ON p.PLAYER_ID = g.PLAYER_ID
+"""
+
+PLAYER_FIELDS = {
+    'PLAYER_ID': 'player_id', 'PLAYER_FULL_NAME': 'player_name', 'POSITION': 'position', 'TEAM_NAME': 'team',
+    'JERSEY_NUMBER': 'jersey_number', 'PTS': 'points', 'REB': 'rebounds', 'AST': 'assists', 'STL': 'steals',
+    'BLK': 'blocks', 'TOV': 'turnovers', 'Scoring': 'scoring_grade', 'Playmaking': 'playmaking_grade',
+    'Rebounding': 'rebounding_grade', 'Defense': 'defense_grade', 'Athleticism': 'athleticism_grade',
+    'Archetype': 'archetype'
+}
+
+TEAMS_QUERY = "SELECT TEAM_ID, TEAM_FULL_NAME, CITY, ARENA, OWNER, GENERALMANAGER, HEADCOACH FROM teams"
+TEAM_STANDINGS_QUERY = "SELECT TeamID, Conference, Record, PlayoffRank FROM standings"
+
+TEAM_FIELDS = {
+    'TEAM_ID': 'team_id', 'TEAM_FULL_NAME': 'team_name', 'CITY': 'city', 'ARENA': 'arena', 'OWNER': 'owner',
+    'GENERALMANAGER': 'general_manager', 'HEADCOACH': 'head_coach', 'Conference': 'conference',
+    'Record': 'record', 'PlayoffRank': 'playoff_rank'
+}
+
+def dumps(payload):
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+
+def nullable(frame):
+    return frame.astype(object).where(frame.notna(), None)
+
+def serializePlayers(players_db):
+    # NaN -> None for every column at once instead of per value, then split rows by team
+    records = nullable(players_db[list(PLAYER_FIELDS)]).rename(columns=PLAYER_FIELDS).to_dict(orient='records')
+
+    players_dict = {}
+    for team_id, positions in players_db.groupby('TEAM_ID', sort=False).indices.items():
+        players_dict[int(team_id)] = {
+            'team_name': players_db['TEAM_FULL_NAME'].iat[positions[0]],
+            'players': [records[i] for i in positions]
+        }
+    return players_dict
+
+def serializeTeams(teams_db, standings_db):
+    standings_db = standings_db.rename(columns={'TeamID': 'TEAM_ID'})
+    merged_db = teams_db.merge(standings_db, on='TEAM_ID', how='left')
+    records = nullable(merged_db[list(TEAM_FIELDS)]).rename(columns=TEAM_FIELDS).to_dict(orient='records')
+    return {record['team_id']: record for record in records}
+
+def serializeTeamProfiles(teams_db, players_db, standings_db):
+    team_info = teams_db.groupby('TEAM_ID').indices
+    team_players = players_db.groupby('TEAM_ID').indices
+    team_standings = standings_db.groupby('TeamID').indices
+    teams_records = teams_db.to_dict(orient='records')
+    players_records = players_db.to_dict(orient='records')
+    standings_records = standings_db.to_dict(orient='records')
+
+    return {
+        int(team_id): {
+            'team_info': [teams_records[i] for i in team_info.get(team_id, [])],
+            'team_players': [players_records[i] for i in team_players.get(team_id, [])],
+            'team_standings': [standings_records[i] for i in team_standings.get(team_id, [])]
+        }
+        for team_id in team_info
+    }
+
+def writeBody(path, body):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(body)
+    with open(path + ENCODINGS['gzip'], 'wb') as f:
+        f.write(gzip.compress(body, compresslevel=9, mtime=0))
+    with open(path + ENCODINGS['br'], 'wb') as f:
+        f.write(brotli.compress(body, quality=11))
+
+def publish(payloads, root=SNAPSHOT_DIR, keep=SNAPSHOT_KEEP):
+    version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    staging = os.path.join(root, f".{version}.tmp")
+    manifest = {}
+
+    for name, payload in payloads.items():
+        body = dumps(payload)
+        writeBody(os.path.join(staging, name + '.json'), body)
+        manifest[name] = hashlib.sha256(body).hexdigest()[:32]
+
+    with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+    os.rename(staging, os.path.join(root, version))
+
+    pointer = os.path.join(root, '.CURRENT.tmp')
+    with open(pointer, 'w') as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(root, 'CURRENT'))
+
+    versions = sorted(entry for entry in os.listdir(root) if not entry.startswith('.') and entry != 'CURRENT')
+    for stale in versions[:-keep]:
+        shutil.rmtree(os.path.join(root, stale), ignore_errors=True)
+    return version
+
+class SnapshotStore:
+    def __init__(self, root=SNAPSHOT_DIR, check_interval=30):
+        self.root = root
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.version = None
+        self.manifest = {}
+        self.bodies = {}
+        self.checked_at = 0.0
+
+    def current(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval:
+            return self.version, self.manifest
+
+        with self.lock:
+            try:
+                with open(os.path.join(self.root, 'CURRENT')) as f:
+                    version = f.read().strip()
+                if version != self.version:
+                    with open(os.path.join(self.root, version, 'manifest.json')) as f:
+                        self.manifest = json.load(f)
+                    self.version = version
+                    self.bodies = {}
+            except OSError:
+                self.version, self.manifest, self.bodies = None, {}, {}
+            self.checked_at = now
+            return self.version, self.manifest
+
+    def get(self, name, encoding):
+        version, manifest = self.current()
+        if name not in manifest:
+            return None, None
+
+        key = (version, name, encoding)
+        body = self.bodies.get(key)
+        if body is None:
+            try:
+                with open(os.path.join(self.root, version, name + '.json' + ENCODINGS[encoding]), 'rb') as f:
+                    body = f.read()
+            except OSError:
+                return None, None
+            self.bodies[key] = body
+        return body, manifest[name]
@@ -0,0 +1,191 @@
+import os
+import re
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+import sqlalchemy
+from nba_api.stats.endpoints import leaguestandingsv3, playerindex
+from sqlalchemy.dialects.mysql.dml import OnDuplicateClause
+from sqlalchemy.ext.compiler import compiles
+
+# Tests import the api modules the way the scheduler and app do, by name from the api directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# app binds its engine at import; point it at a throwaway SQLite file instead of the MySQL settings in .env. The
+# scheduler's on-disk state (snapshots, gamelog index, grade state, response cache) goes under the same directory.
+SCRATCH_DIR = tempfile.mkdtemp(prefix='nba_tests_')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(SCRATCH_DIR, 'api.db')}")
+os.environ.setdefault('SNAPSHOT_DIR', os.path.join(SCRATCH_DIR, 'snapshots'))
+os.environ.setdefault('GAMELOG_INDEX_DIR', os.path.join(SCRATCH_DIR, 'gamelog_index'))
+os.environ.setdefault('GRADE_STATE_PATH', os.path.join(SCRATCH_DIR, 'grade_state.npz'))
+os.environ.setdefault('NBA_API_CACHE_DIR', os.path.join(SCRATCH_DIR, 'http_cache'))
+for directory in ('SNAPSHOT_DIR', 'GAMELOG_INDEX_DIR'):
+    os.makedirs(os.environ[directory], exist_ok=True)
+
+# The scheduler writes through MySQL-only statements; the stub engine below runs them on SQLite
+@compiles(OnDuplicateClause, 'sqlite')
+def onConflictUpdate(clause, compiler, **kw):
+    assignments = ', '.join(
+        f"{compiler.preparer.quote(getattr(column, 'name', column))} = {compiler.process(value, **kw)}"
+        for column, value in clause.update.items()
+    )
+    return f"ON CONFLICT DO UPDATE SET {assignments}".replace('inserted.', 'excluded.')
+
+TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN|INTO|UPDATE|TABLE|EXISTS)\s+[`"]?(\w+)', re.IGNORECASE)
+
+def mysqlStatement(cursor, statement):
+    # Rewrites the MySQL statements the scheduler sends into SQLite ones, and rejects table names whose case does
+    # not match the table's, as MySQL does on Linux
+    tables = {row[0] for row in cursor.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    folded = {table.lower() for table in tables}
+    for name in TABLE_REFERENCE.findall(statement):
+        if name not in tables and name.lower() in folded:
+            raise sqlalchemy.exc.ProgrammingError(statement, None, Exception(f"Table '{name}' doesn't exist"))
+
+    statement = statement.replace('INSERT IGNORE', 'INSERT OR IGNORE').replace('UTC_TIMESTAMP()', 'CURRENT_TIMESTAMP')
+    # MySQL index names are per table, SQLite's per database
+    statement = re.sub(r'^CREATE (UNIQUE )?INDEX ', r'CREATE \1INDEX IF NOT EXISTS ', statement)
+    statement, _, updates = statement.partition(' ON DUPLICATE KEY UPDATE ')
+    if updates:
+        statement += ' ON CONFLICT DO UPDATE SET ' + re.sub(r'VALUES\((\w+)\)', r'excluded.\1', updates)
+
+    like = re.fullmatch(r'CREATE TABLE (\w+) LIKE (\w+)', statement)
+    if like:
+        source = cursor.connection.execute("SELECT sql FROM sqlite_master WHERE name = ?", (like[2],)).fetchone()[0]
+        return re.sub(r'^CREATE TABLE "?\w+"?', f'CREATE TABLE "{like[1]}"', source)
+    unique = re.fullmatch(r'ALTER TABLE (\w+) ADD UNIQUE INDEX (\w+) (\(.*\))', statement)
+    if unique:
+        return f"CREATE UNIQUE INDEX IF NOT EXISTS {unique[2]} ON {unique[1]} {unique[3]}"
+    if statement.startswith('RENAME TABLE '):
+        renames = [rename.split(' TO ') for rename in statement[len('RENAME TABLE '):].split(', ')]
+        for old, new in renames[:-1]:
+            cursor.execute(f"ALTER TABLE {old} RENAME TO {new}")
+        return f"ALTER TABLE {renames[-1][0]} RENAME TO {renames[-1][1]}"
+    return statement
+
+def stubEngine(path):
+    # A SQLite database that accepts the scheduler's MySQL statements; schema.conform's ALTERs are skipped by the
+    # db fixture, since SQLite cannot change a column's type or a table's primary key
+    engine = sqlalchemy.create_engine(f"sqlite:///{path}")
+
+    @sqlalchemy.event.listens_for(engine, 'before_cursor_execute', retval=True)
+    def rewrite(conn, cursor, statement, parameters, context, executemany):
+        return mysqlStatement(cursor, statement), parameters
+
+    return engine
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    import schema
+    import scheduler
+    engine = stubEngine(tmp_path / 'stub.db')
+    monkeypatch.setattr(scheduler, 'db', engine)
+    monkeypatch.setattr(schema, 'conform', lambda engine, table, spec=None: False)
+    yield engine
+    engine.dispose()
+
+class UpstreamFrame(pd.DataFrame):
+    # The league-wide stat endpoints return dozens of columns that fetchGrades drops by name; this frame stands in
+    # for a full payload by ignoring drops of columns it was never given
+    @property
+    def _constructor(self):
+        return UpstreamFrame
+
+    def drop(self, *args, **kwargs):
+        return super().drop(*args, **{**kwargs, 'errors': 'ignore'})
+
+def endpointFrame(endpoint, dataset, rows, **columns):
+    # A frame with every header the endpoint declares, zero-filled except for the given columns
+    frame = pd.DataFrame(0, index=range(rows), columns=endpoint.expected_data[dataset])
+    return frame.assign(**columns)
+
+class StubStats:
+    # Canned responses for every endpoint the nightly stages call, in place of fetcher.fetchFrame and
+    # fetcher.fetchConcurrently; failing names endpoints or per-item fetches that raise instead
+    def __init__(self, teams=2, players=6, games=4, seed=0):
+        import benchmark
+        rng = np.random.default_rng(seed)
+        self.teams_df, self.standings_df = benchmark.syntheticTeams(rng, teams)
+        self.players_df = benchmark.syntheticPlayers(rng, players, self.teams_df)
+        self.gamelogs_df = benchmark.syntheticRawGamelogs(rng, self.players_df, benchmark.gamelogCounts(players, players * games))
+        self.grades_df = benchmark.syntheticGradeInputs(rng, self.players_df)
+        self.failing = set()
+
+    def playerIndex(self):
+        players, teams = self.players_df, self.teams_df.set_index('TEAM_ID').loc[self.players_df['TEAM_ID']]
+        return endpointFrame(
+            playerindex.PlayerIndex, 'PlayerIndex', len(players),
+            PERSON_ID=players['PLAYER_ID'], PLAYER_FIRST_NAME=players['PLAYER_FIRST_NAME'], PLAYER_LAST_NAME=players['PLAYER_LAST_NAME'],
+            TEAM_ID=players['TEAM_ID'], TEAM_CITY=teams['CITY'].to_numpy(), TEAM_NAME=teams['NICKNAME'].to_numpy(),
+            JERSEY_NUMBER=players['JERSEY_NUMBER'], POSITION=players['POSITION'], HEIGHT=players['HEIGHT'],
+            WEIGHT=players['WEIGHT'], COLLEGE=players['COLLEGE'], DRAFT_YEAR=players['DRAFT_YEAR'],
+            DRAFT_ROUND=players['DRAFT_ROUND'], DRAFT_NUMBER=players['DRAFT_NUMBER']
+        )
+
+    def fetchFrame(self, endpoint, label, frame=0, max_retries=5, **params):
+        if endpoint.__name__ in self.failing:
+            raise requests.exceptions.ConnectionError(f"{label} unavailable")
+        if endpoint is playerindex.PlayerIndex:
+            return self.playerIndex()
+        if endpoint is leaguestandingsv3.LeagueStandingsV3:
+            return self.standings_df.copy()
+        if label == 'player_base':
+            return UpstreamFrame(self.grades_df.drop(columns=['DUNK_FGA', 'OPP_FG_PCT', 'OPP_FG3_PCT']))
+        return UpstreamFrame({'PLAYER_ID': self.grades_df['PLAYER_ID']})
+
+    def fetchConcurrently(self, items, call, label, limiter=None, workers=None, max_retries=5):
+        for item in items:
+            if call.__name__ in self.failing:
+                yield item, None, requests.exceptions.ConnectionError(f"{label(item)} unavailable")
+            else:
+                yield item, getattr(self, call.__name__)(item), None
+
+    def fetchTeamDetails(self, team_id):
+        background = self.teams_df.drop(columns=['TEAM_FULL_NAME'])
+        return background[background['TEAM_ID'] == team_id].reset_index(drop=True)
+
+    def fetchGamelog(self, task):
+        # The synthetic games are 2024-25's; other seasons get the same games moved to their own ids and dates
+        player_id, season = task
+        gamelog_df = self.gamelogs_df[self.gamelogs_df['Player_ID'] == player_id].drop(columns=['Player_Name'])
+        years = int(season[:4]) - 2024
+        days = pd.to_datetime(gamelog_df['GAME_DATE'], format='%b %d, %Y') + pd.DateOffset(years=years)
+        return gamelog_df.assign(
+            SEASON_ID=f"2{season[:4]}", Game_ID=(gamelog_df['Game_ID'].astype(int) + years * 100000).astype(str),
+            GAME_DATE=days.dt.strftime('%b %d, %Y').str.upper()
+        ).reset_index(drop=True)
+
+    def fetchOpponentStats(self, team_id):
+        players = self.grades_df[self.grades_df['TEAM_ID'] == team_id]
+        return pd.DataFrame({'VS_PLAYER_ID': players['PLAYER_ID'], 'OPP_FG_PCT': players['OPP_FG_PCT'], 'OPP_FG3_PCT': players['OPP_FG3_PCT']})
+
+    def fetchDunkRate(self, player_id):
+        return float(self.grades_df.loc[self.grades_df['PLAYER_ID'] == player_id, 'DUNK_FGA'].iloc[0])
+
+@pytest.fixture
+def stats(monkeypatch):
+    import fetcher
+    stub = StubStats()
+    monkeypatch.setattr(fetcher, 'fetchFrame', stub.fetchFrame)
+    monkeypatch.setattr(fetcher, 'fetchConcurrently', stub.fetchConcurrently)
+    return stub
+
+@pytest.fixture
+def api(db, stats, tmp_path, monkeypatch):
+    # The Flask test client over players, grades and gamelogs loaded by the real stages. Snapshots and the gamelog
+    # index are read from tmp_path and re-checked on every request; tests publish into them as needed.
+    import app
+    import logindex
+    import scheduler
+    import snapshots
+    scheduler.fetchPlayers()
+    scheduler.fetchGamelogs('api')
+    scheduler.fetchGrades()
+    monkeypatch.setattr(app, 'db', db)
+    monkeypatch.setattr(app, 'published', snapshots.SnapshotStore(root=str(tmp_path / 'snapshots'), check_interval=0))
+    monkeypatch.setattr(app, 'gamelog_index', logindex.IndexStore(root=str(tmp_path / 'gamelog_index'), check_interval=0))
+    monkeypatch.setattr(app, 'players_snapshot', {'version': None, 'body': None, 'checked_at': 0.0})
+    return app.app.test_client()
@@ -0,0 +1,53 @@
+import pandas as pd
+import sqlalchemy
+import aggregates
+import scheduler
+
+def seasonTotals(db):
+    # Games per (season, split) summed over players, for the season and last5 splits
+    with db.connect() as conn:
+        rows = conn.execute(sqlalchemy.text(
+            f"SELECT season, split, SUM(games) FROM {aggregates.TABLE} WHERE split IN ('season', 'last5') GROUP BY season, split"
+        )).all()
+    return {(season, split): games for season, split, games in rows}
+
+def tableSeasons(db, table):
+    with db.connect() as conn:
+        return dict(conn.execute(sqlalchemy.text(f"SELECT season, COUNT(*) FROM {table} GROUP BY season")).all())
+
+def test_rollover_keeps_each_seasons_games_apart(db, stats, monkeypatch):
+    games = len(stats.gamelogs_df)
+    players = stats.gamelogs_df['Player_ID'].nunique()
+    monkeypatch.setattr(scheduler, 'CURRENT_SEASON', '2023-24')
+    assert scheduler.fetchGamelogs('2024-04-14') == games
+
+    monkeypatch.setattr(scheduler, 'CURRENT_SEASON', '2024-25')
+    assert scheduler.fetchGamelogs('2024-10-22') == games
+
+    # The finished season moved out of gamelogs into its own table, and each season's splits count only its games
+    assert tableSeasons(db, 'gamelogs') == {'2024-25': games}
+    assert tableSeasons(db, 'gamelogs_2023_24') == {'2023-24': games}
+    expected = {
+        ('2023-24', 'season'): games, ('2023-24', 'last5'): players * min(5, games // players),
+        ('2024-25', 'season'): games, ('2024-25', 'last5'): players * min(5, games // players),
+    }
+    assert seasonTotals(db) == expected
+
+def test_rebuild_reads_only_its_season(db, stats):
+    both = pd.concat([
+        scheduler.transformGamelog(stats.fetchGamelog((player_id, season)).assign(Player_Name='Player'))
+        for season in ('2023-24', '2024-25') for player_id in stats.players_df['PLAYER_ID']
+    ], ignore_index=True)
+    both.to_sql('gamelogs', con=db, index=False, dtype={'game_day': sqlalchemy.types.Date()})
+
+    with db.begin() as conn:
+        aggregates.ensureTable(conn)
+        assert aggregates.rebuild(conn, 'gamelogs', '2024-25') == len(stats.gamelogs_df)
+        assert not aggregates.seeded(conn, '2023-24')
+    assert seasonTotals(db)[('2024-25', 'season')] == len(stats.gamelogs_df)
+
+    # and the incremental path agrees with the rebuild once a batch of the other season is folded in
+    with db.begin() as conn:
+        aggregates.accumulate(conn, 'gamelogs', '2023-24', both[both['season'] == '2023-24'])
+    assert seasonTotals(db)[('2023-24', 'season')] == len(stats.gamelogs_df)
+    assert seasonTotals(db)[('2024-25', 'season')] == len(stats.gamelogs_df)
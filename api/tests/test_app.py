@@ -0,0 +1,151 @@
+import gzip
+import json
+import brotli
+import pandas as pd
+import sqlalchemy
+import app
+import logindex
+import scheduler
+import snapshots
+
+def test_batch_profiles_match_single_profiles(api, stats):
+    player_ids = stats.players_df['PLAYER_ID'].tolist()[:3]
+    response = api.get(f"/nba/players/profiles?ids={','.join(map(str, player_ids))}")
+    assert response.status_code == 200
+    assert response.get_data() == app.app.json.response(response.get_json()).get_data()
+
+    profiles = response.get_json()
+    assert list(profiles) == [str(player_id) for player_id in sorted(player_ids)]
+    for player_id in player_ids:
+        single = api.get(f"/nba/player/{player_id}").get_json()
+        assert single['gamelogs']
+        assert profiles[str(player_id)] == {key: single[key] for key in ('player_info', 'gamelogs', 'player_grades')}
+
+def test_batch_profiles_failure_is_a_500(api, stats, monkeypatch):
+    def unavailable(player_log, limit):
+        raise RuntimeError("gamelogs unavailable")
+    monkeypatch.setattr(app, 'queriedGamelogs', unavailable)
+    response = api.get(f"/nba/players/profiles?ids={stats.players_df['PLAYER_ID'].iloc[0]}")
+    assert response.status_code == 500
+
+def publishIndex(db, tmp_path):
+    logindex.publish(pd.read_sql("SELECT * FROM gamelogs", con=db), root=str(tmp_path / 'gamelog_index'))
+
+def test_index_and_query_gamelogs_match(api, db, stats, tmp_path):
+    player_id = stats.gamelogs_df['Player_ID'].value_counts().index[0]
+    urls = [f"/nba/player/{player_id}", f"/nba/player/{player_id}?limit=2", f"/nba/player/{player_id}?since=2024-10-24"]
+    queried = [api.get(url).get_json() for url in urls]
+    queried_next = api.get(f"/nba/player/{player_id}?limit=2&cursor={queried[1]['next_cursor']}").get_json()
+    publishIndex(db, tmp_path)
+    assert app.gamelog_index.current() is not None
+    indexed = [api.get(url).get_json() for url in urls]
+    indexed_next = api.get(f"/nba/player/{player_id}?limit=2&cursor={indexed[1]['next_cursor']}").get_json()
+
+    assert indexed == queried
+    assert indexed_next == queried_next
+    assert all(isinstance(game['game_id'], int) for game in indexed[0]['gamelogs'])
+
+def test_gamelog_pages_follow_the_cursor(api, stats):
+    player_id = stats.players_df['PLAYER_ID'].iloc[0]
+    everything = api.get(f"/nba/player/{player_id}").get_json()
+    assert everything['next_cursor'] is None
+
+    games, cursor = [], None
+    while True:
+        page = api.get(f"/nba/player/{player_id}?limit=3" + (f"&cursor={cursor}" if cursor else "")).get_json()
+        assert len(page['gamelogs']) <= 3
+        games += page['gamelogs']
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert games == everything['gamelogs']
+
+    ranged = api.get(f"/nba/player/{player_id}?since=2024-10-23&until=2024-10-24").get_json()
+    assert [game['game_id'] for game in ranged['gamelogs']] == [22400002, 22400003]
+
+def test_gamelog_filters_are_validated(api, stats):
+    player_id = stats.players_df['PLAYER_ID'].iloc[0]
+    for query in ('limit=0', 'limit=ten', 'since=yesterday', 'cursor=2024-10-23', 'cursor=2024-10-23_game'):
+        assert api.get(f"/nba/player/{player_id}?{query}").status_code == 400
+
+def test_snapshots_are_served_precompressed_with_etags(api, tmp_path):
+    root = str(tmp_path / 'snapshots')
+    players = {'1610612737': {'players': [{'id': 1}]}}
+    snapshots.publish({'players': players}, root=root)
+
+    plain = api.get('/players')
+    assert 'Content-Encoding' not in plain.headers
+    assert json.loads(plain.get_data()) == players
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+    for encoding, decompress in (('br', brotli.decompress), ('gzip', gzip.decompress)):
+        encoded = api.get('/players', headers={'Accept-Encoding': encoding})
+        assert encoded.headers['Content-Encoding'] == encoding
+        assert decompress(encoded.get_data()) == plain.get_data()
+        assert encoded.headers['ETag'] == plain.headers['ETag'][:-1] + f"-{encoding}\""
+
+    etag = plain.headers['ETag']
+    cached = api.get('/players', headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and not cached.get_data()
+
+    # A new version changes the ETag, so the client's copy is replaced
+    snapshots.publish({'players': {**players, '1610612738': {'players': []}}}, root=root)
+    refreshed = api.get('/players', headers={'If-None-Match': etag})
+    assert refreshed.status_code == 200 and refreshed.headers['ETag'] != etag
+
+def playerNames(api):
+    return {player['player_id']: player['player_name'] for team in api.get('/players').get_json().values() for player in team['players']}
+
+def test_players_payload_follows_table_versions(api, db, stats, monkeypatch):
+    monkeypatch.setattr(app, 'SNAPSHOT_CHECK_INTERVAL', 0)
+    player_id = int(stats.players_df['PLAYER_ID'].iloc[0])
+    assert len(playerNames(api)) == len(stats.players_df)
+
+    # A write that records no new version is not picked up; a swap, which does, is
+    with db.begin() as conn:
+        conn.execute(sqlalchemy.text("UPDATE players SET PLAYER_FULL_NAME = 'Renamed' WHERE PLAYER_ID = :id"), {'id': player_id})
+    assert playerNames(api)[player_id] != 'Renamed'
+    scheduler.swapTable(pd.read_sql("SELECT * FROM players", con=db), 'players')
+    assert playerNames(api)[player_id] == 'Renamed'
+
+def expectedHitRate(db, player_id, column, line, window):
+    games = pd.read_sql(sqlalchemy.text("SELECT * FROM gamelogs WHERE Player_ID = :id ORDER BY game_day, Game_ID"), con=db, params={'id': player_id})
+    values = games[column].iloc[-window:] if window else games[column]
+    if values.empty:
+        return {'games': 0, 'average': None, 'hits': 0, 'hit_rate': None}
+    return {
+        'games': len(values), 'average': round(float(values.sum()) / len(values), 2),
+        'hits': int((values > line).sum()), 'hit_rate': round(int((values > line).sum()) / len(values), 3)
+    }
+
+def test_hit_rates_match_each_players_log(api, db, stats, tmp_path):
+    assert api.post('/nba/hit-rates', json={'stat': 'pts', 'lines': [10]}).status_code == 503
+    publishIndex(db, tmp_path)
+
+    player_ids = stats.players_df['PLAYER_ID'].tolist()
+    queries = [
+        {'player_id': player_id, 'stat': stat, 'line': line, **({'window': window} if window else {})}
+        for player_id in player_ids[:3] + [42] for stat, line in (('pts', 12.5), ('pra', 20)) for window in (None, 2)
+    ]
+    results = api.post('/nba/hit-rates', json={'queries': queries}).get_json()['results']
+    for query, result in zip(queries, results):
+        expected = expectedHitRate(db, query['player_id'], app.HIT_RATE_STATS[query['stat']], query['line'], query.get('window'))
+        assert result == {'player_id': query['player_id'], 'stat': query['stat'], 'line': query['line'], 'window': query.get('window'), **expected}
+
+    grid = api.post('/nba/hit-rates', json={'stat': 'reb', 'lines': [2, 5.5], 'window': 3}).get_json()
+    assert set(grid['players']) == {str(player_id) for player_id in player_ids}
+    for player_id, result in grid['players'].items():
+        expected = [expectedHitRate(db, int(player_id), 'Rebounds', line, 3) for line in grid['lines']]
+        assert result['hit_rates'] == [e['hit_rate'] for e in expected] and result['games'] == expected[0]['games']
+
+def test_invalid_hit_rate_requests_are_rejected(api, db, stats, tmp_path):
+    publishIndex(db, tmp_path)
+    player_id = int(stats.players_df['PLAYER_ID'].iloc[0])
+    for body in (
+        {'queries': [{'player_id': 2 ** 70, 'stat': 'pts', 'line': 10}]},
+        {'stat': 'pts', 'lines': [10], 'player_ids': [2 ** 70]},
+        {'queries': [{'player_id': player_id, 'stat': 'game_id', 'line': 10}]},
+        {'queries': [{'player_id': player_id, 'stat': 'pts', 'line': 10, 'window': 0}]},
+        {'stat': 'pts', 'lines': []},
+        [player_id],
+    ):
+        assert api.post('/nba/hit-rates', json=body).status_code == 400
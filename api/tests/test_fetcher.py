@@ -0,0 +1,70 @@
+import time
+import pytest
+import requests
+from nba_api.stats.library.http import NBAStatsHTTP
+import fetcher
+from fakestats import FakeStats
+
+@pytest.fixture
+def fake_stats(monkeypatch, tmp_path):
+    fake = FakeStats(seed=0)
+    monkeypatch.setattr(NBAStatsHTTP, 'base_url', fake.serve())
+    monkeypatch.setattr(fetcher, 'NBA_API_MODE', 'live')
+    monkeypatch.setattr(fetcher, 'NBA_API_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(fetcher, 'NBA_API_CACHE_TTL', 0)
+    yield fake
+    fake.shutdown()
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = fetcher.RateLimiter(rate=20, min_rate=1, max_rate=20, increase=2)
+    monkeypatch.setattr(fetcher, 'stats_limiter', limiter)
+    return limiter
+
+def request(parameters=None):
+    return NBAStatsHTTP().send_api_request('playerindex', parameters or {'Season': '2024-25'}, timeout=5)
+
+def attempt(parameters=None):
+    try:
+        request(parameters)
+    except requests.exceptions.HTTPError as e:
+        return e.response.status_code
+    return 200
+
+def test_limiter_backs_off_on_throttling_and_recovers(fake_stats, limiter):
+    fake_stats.throttle_rate = 1.0
+    assert [attempt() for _ in range(3)] == [429, 429, 429]
+    assert limiter.rate == pytest.approx(20 * 0.5 ** 3)
+
+    # Once the server recovers, the first requests are still spaced out at the lowered rate
+    fake_stats.throttle_rate = 0.0
+    started = time.monotonic()
+    assert [attempt() for _ in range(2)] == [200, 200]
+    assert time.monotonic() - started >= 1 / 2.5 * 0.9
+
+    # and each success raises the rate again, back up to its maximum
+    assert [attempt() for _ in range(10)] == [200] * 10
+    assert limiter.rate == pytest.approx(20)
+    assert fake_stats.statuses == {429: 3, 200: 12}
+
+def test_server_errors_do_not_change_the_rate(fake_stats, limiter):
+    fake_stats.error_rate = 1.0
+    assert attempt() == 500
+    assert limiter.rate == 20
+
+def test_latency_is_injected(fake_stats, limiter):
+    fake_stats.latency = 0.2
+    started = time.monotonic()
+    assert attempt() == 200
+    assert time.monotonic() - started >= 0.2
+
+def test_cached_responses_skip_the_limiter(fake_stats, limiter, monkeypatch):
+    monkeypatch.setattr(fetcher, 'NBA_API_CACHE_TTL', 3600)
+    limiter.state[0] = 1.0
+    assert attempt({'Season': '2023-24'}) == 200
+    started = time.monotonic()
+    for _ in range(20):
+        assert attempt({'Season': '2023-24'}) == 200
+    assert time.monotonic() - started < 1
+    assert limiter.rate == pytest.approx(3.0)
+    assert fake_stats.statuses == {200: 1}
@@ -0,0 +1,68 @@
+import functools
+import pandas as pd
+import pytest
+import sqlalchemy
+import aggregates
+import scheduler
+
+def gamelogRows(db, table='gamelogs'):
+    return pd.read_sql(f"SELECT * FROM {table} ORDER BY Player_ID, Game_ID", con=db)
+
+def test_reingest_skips_known_games_and_adds_new_ones(db, stats):
+    games = len(stats.gamelogs_df)
+    assert scheduler.fetchGamelogs('first') == games
+    assert scheduler.fetchGamelogs('second') == 0
+    assert len(gamelogRows(db)) == games
+
+    # One more game for the first player is the only row the next run writes
+    latest = stats.gamelogs_df[stats.gamelogs_df['Player_ID'] == stats.players_df['PLAYER_ID'].iloc[0]].iloc[[-1]]
+    stats.gamelogs_df = pd.concat([stats.gamelogs_df, latest.assign(Game_ID='22400099', GAME_DATE='NOV 01, 2024')], ignore_index=True)
+    assert scheduler.fetchGamelogs('third') == 1
+
+    rows = gamelogRows(db)
+    assert len(rows) == games + 1
+    assert len(scheduler.loadGamelogKeys()) == games + 1
+    assert (scheduler.loadGamelogKeys() == scheduler.gamelogKeys(rows['Player_ID'], rows['Game_ID'])).all()
+
+def test_rewritten_game_is_updated_in_place(db, stats):
+    scheduler.fetchGamelogs('first')
+    player_id = stats.players_df['PLAYER_ID'].iloc[0]
+    corrected = scheduler.transformGamelog(stats.fetchGamelog((player_id, '2024-25')).assign(Player_Name='Player').iloc[[0]])
+    corrected['Points'] += 10
+
+    writer = scheduler.GamelogWriter('correction')
+    writer.add((player_id, '2024-25'), corrected)
+    writer.finish()
+
+    rows = gamelogRows(db)
+    assert len(rows) == len(stats.gamelogs_df)
+    row = rows[(rows['Player_ID'] == player_id) & (rows['Game_ID'] == corrected['Game_ID'].iloc[0])]
+    assert row['Points'].tolist() == corrected['Points'].tolist()
+
+def test_interrupted_run_resumes_from_its_checkpoints(db, stats, monkeypatch):
+    # One flush per player, and the fourth player's gamelog fails to transform the first time through
+    monkeypatch.setattr(scheduler, 'GamelogWriter', functools.partial(scheduler.GamelogWriter, batch_rows=4))
+    player_ids = stats.players_df['PLAYER_ID'].tolist()
+    transform, broken = scheduler.transformGamelog, {player_ids[3]}
+    def flakyTransform(gamelog_df):
+        if set(gamelog_df['Player_ID']) & broken:
+            raise RuntimeError("worker killed")
+        return transform(gamelog_df)
+    monkeypatch.setattr(scheduler, 'transformGamelog', flakyTransform)
+
+    with pytest.raises(RuntimeError):
+        scheduler.fetchGamelogs('nightly')
+    assert set(gamelogRows(db)['Player_ID']) == set(player_ids[:3])
+
+    fetched = []
+    fetchGamelog = stats.fetchGamelog
+    monkeypatch.setattr(stats, 'fetchGamelog', lambda task: fetched.append(task[0]) or fetchGamelog(task))
+    broken.clear()
+    assert scheduler.fetchGamelogs('nightly') == len(stats.gamelogs_df) // 2
+    assert fetched == player_ids[3:]
+
+    assert len(gamelogRows(db)) == len(stats.gamelogs_df)
+    with db.connect() as conn:
+        assert conn.execute(sqlalchemy.text("SELECT COUNT(*) FROM gamelog_checkpoints")).scalar() == 0
+        season_games = conn.execute(sqlalchemy.text(f"SELECT SUM(games) FROM {aggregates.TABLE} WHERE split = 'season'")).scalar()
+    assert season_games == len(stats.gamelogs_df)
@@ -0,0 +1,340 @@
+import logging
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import MinMaxScaler
+import benchmark
+import grading
+
+# fetchGrades' grading and archetype code as it was before the GradeEngine and decision table replaced it, kept
+# verbatim as the reference both must reproduce
+def baselineGrades(combined_df):
+    combined_df = combined_df.copy()
+
+    def normalize(series):
+        scaler = MinMaxScaler()
+        return scaler.fit_transform(series.values.reshape(-1, 1)).flatten()
+
+    def rescale(series, factor=10):
+        return ((series - series.mean()) / series.std() * factor + 50).clip(0, 100)
+
+    combined_df["Scoring"] = (0.30 * normalize(combined_df["PTS"]) +
+                              0.10 * normalize(combined_df["FGA"]) +
+                              0.10 * normalize(combined_df["FTA"]) +
+                              0.20 * normalize(combined_df["TS_PCT"]) +
+                              0.10 * normalize(combined_df["EFG_PCT"]) +
+                              0.20 * normalize(combined_df["PCT_UAST_FGM"])) * 100
+    combined_df["Scoring"] = rescale(combined_df["Scoring"], factor=12)
+
+    combined_df["Playmaking"] = (0.30 * normalize(combined_df["AST"]) +
+                                 0.20 * normalize(combined_df["POTENTIAL_AST"]) +
+                                 0.20 * normalize(combined_df["SECONDARY_AST"]) +
+                                 0.15 * normalize(combined_df["USG_PCT"]) -
+                                 0.15 * normalize(combined_df["TOV"])) * 100
+    combined_df["Playmaking"] = rescale(combined_df["Playmaking"], factor=10)
+
+    combined_df["Rebounding"] = (0.40 * normalize(combined_df["REB"]) +
+                                 0.30 * normalize(combined_df["OREB"]) +
+                                 0.30 * normalize(combined_df["DREB"])) * 100
+    combined_df["Rebounding"] = rescale(combined_df["Rebounding"], factor=10)
+
+    combined_df["Defense"] = (0.30 * normalize(combined_df["BLK"]) +
+                              0.15 * normalize(combined_df["DEFLECTIONS"]) +
+                              0.15 * normalize(combined_df["STL"]) +
+                              0.10 * normalize(combined_df["DEF_WS"]) -
+                              0.15 * normalize(combined_df["PF"]) +
+                              0.15 * normalize(1 - combined_df["OPP_FG_PCT"])) * 100
+    combined_df["Defense"] = rescale(combined_df["Defense"], factor=8)
+
+    combined_df["Athleticism"] = (0.25 * normalize(combined_df["PTS_FB"]) +
+                                  0.20 * normalize(combined_df["DIST_FEET"]) +
+                                  0.20 * normalize(combined_df["AVG_SPEED"]) +
+                                  0.20 * normalize(combined_df["LOOSE_BALLS_RECOVERED"]) +
+                                  0.15 * normalize(combined_df["DUNK_FGA"])) * 100
+    combined_df["Athleticism"] = rescale(combined_df["Athleticism"], factor=12)
+    return combined_df[grading.CATEGORIES]
+
+def baselineArchetype(row, combined_df):
+    scores = {
+        "Scoring": row["Scoring"],
+        "Playmaking": row["Playmaking"],
+        "Rebounding": row["Rebounding"],
+        "Defense": row["Defense"],
+        "Athleticism": row["Athleticism"]
+    }
+    league_medians = combined_df[["STL", "BLK", "SECONDARY_AST", "OPP_FG3_PCT"]].median()
+    is_shooter = row["PCT_PTS_3PT"] > 0.40 and row["FG3_PCT"] > 0.37
+    is_rim_finisher = row["DUNK_FGA"] > 4.0 or row["PCT_PTS_PAINT"] > 0.5
+    is_perimeter_defender = row["STL"] > league_medians["STL"] * 1.5 and row["OPP_FG3_PCT"] < league_medians["OPP_FG3_PCT"] * 0.9
+    is_rim_protector = row["BLK"] > league_medians["BLK"] * 1.5
+
+    sorted_scores = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    top_cat, top_score = sorted_scores[0]
+    second_cat, second_score = sorted_scores[1]
+    third_cat, third_score = sorted_scores[2]
+    score_diff = top_score - second_score
+
+    if row['Avg_Grade'] < 40 and row['MIN'] < 15:
+        return "Benchwarmer"
+    if all(45 <= score <= 55 for score in scores.values()):
+        return "Role Player"
+
+    if top_cat == "Scoring":
+        if second_cat == "Playmaking":
+            if is_shooter:
+                return "Sharpshooting Maestro"
+            elif score_diff <= 10 and top_score >= 75:
+                return "Dual-Threat Maestro"
+            elif score_diff > 15:
+                return "Shot Creator"
+            return "Scoring Playmaker"
+        elif second_cat == "Athleticism":
+            if is_rim_finisher:
+                return "Explosive Finisher"
+            elif score_diff <= 10 and top_score >= 75:
+                return "Athletic Scorer"
+            elif score_diff > 15:
+                return "Dynamic Finisher"
+            return "Scoring Athlete"
+        elif second_cat == "Defense":
+            if is_perimeter_defender:
+                return "Perimeter Two-Way Threat"
+            elif score_diff <= 10 and top_score >= 75:
+                return "Two-Way Star"
+            elif score_diff > 15:
+                return "Defensive Scorer"
+            return "Scoring Defender"
+        elif second_cat == "Rebounding":
+            if is_rim_finisher:
+                return "Scoring Interior Force"
+            elif score_diff <= 10 and top_score >= 75:
+                return "Interior Dual-Threat"
+            elif score_diff > 15:
+                return "Paint Powerhouse"
+            return "Scoring Rebounder"
+
+    elif top_cat == "Playmaking":
+        if second_cat == "Scoring":
+            if row["SECONDARY_AST"] > league_medians["SECONDARY_AST"] * 1.5:
+                return "Orchestrating Star"
+            elif score_diff <= 10 and top_score >= 75:
+                return "Playmaking Scorer"
+            elif score_diff > 15:
+                return "Dual-Threat Guard"
+            return "Facilitating Scorer"
+        elif second_cat == "Defense":
+            if is_perimeter_defender:
+                return "Defensive Floor General"
+            elif score_diff <= 10 and top_score >= 75:
+                return "Disruptive Playmaker"
+            elif score_diff > 15:
+                return "Pesky Facilitator"
+            return "Defensive Distributor"
+        elif second_cat == "Athleticism":
+            if score_diff <= 10 and top_score >= 75:
+                return "Dynamic Facilitator"
+            elif score_diff > 15:
+                return "Pace Pusher"
+            return "Athletic Playmaker"
+        elif second_cat == "Rebounding":
+            if score_diff <= 10 and top_score >= 75:
+                return "Rebounding Playmaker"
+            elif score_diff > 15:
+                return "Rebound Distributor"
+            return "Board Passer" if third_score < 60 else "Rebounding Maestro"
+
+    elif top_cat == "Rebounding":
+        if second_cat == "Defense":
+            if is_rim_protector:
+                return "Rim Guardian"
+            elif score_diff <= 10 and top_score >= 75:
+                return "Defensive Rebounder"
+            elif score_diff > 15:
+                return "Paint Protector"
+            return "Rebounding Defender"
+        elif second_cat == "Scoring":
+            if score_diff <= 10 and top_score >= 75:
+                return "Scoring Boardmaster"
+            elif score_diff > 15:
+                return "Post Operator"
+            return "Rebounding Scorer"
+        elif second_cat == "Athleticism":
+            if score_diff <= 10 and top_score >= 75:
+                return "Athletic Board-Crasher"
+            elif score_diff > 15:
+                return "Energy Big"
+            return "Rebounding Athlete"
+        elif second_cat == "Playmaking":
+            if score_diff <= 10 and top_score >= 75:
+                return "Facilitating Rebounder"
+            elif score_diff > 15:
+                return "Outlet Specialist"
+            return "Board Facilitator"
+
+    elif top_cat == "Defense":
+        if second_cat == "Rebounding":
+            if is_rim_protector:
+                return "Defensive Anchor"
+            elif score_diff <= 10 and top_score >= 75:
+                return "Rebounding Stopper"
+            elif score_diff > 15:
+                return "Interior Wall"
+            return "Defensive Rebounder"
+        elif second_cat == "Athleticism":
+            if is_perimeter_defender:
+                return "Perimeter Hawk"
+            elif score_diff <= 10 and top_score >= 75:
+                return "Athletic Defender"
+            elif score_diff > 15:
+                return "Active Defender"
+            return "Hustle Defender"
+        elif second_cat == "Scoring":
+            if score_diff <= 10 and top_score >= 75:
+                return "Two-Way Threat"
+            elif score_diff > 15:
+                return "Defensive Scorer"
+            return "Scoring Stopper"
+        elif second_cat == "Playmaking":
+            if score_diff <= 10 and top_score >= 75:
+                return "Playmaking Defender"
+            elif score_diff > 15:
+                return "Pesky Facilitator"
+            return "Disruptive Distributor"
+
+    elif top_cat == "Athleticism":
+        if second_cat == "Scoring":
+            if is_rim_finisher:
+                return "Athletic Phenom"
+            elif score_diff <= 10 and top_score >= 75:
+                return "Scoring Dynamo"
+            elif score_diff > 15:
+                return "Highlight Maker"
+            return "Athletic Scorer"
+        elif second_cat == "Defense":
+            if is_perimeter_defender:
+                return "Energy Stopper"
+            elif score_diff <= 10 and top_score >= 75:
+                return "Defensive Athlete"
+            elif score_diff > 15:
+                return "Hustle Spark"
+            return "Active Athlete"
+        elif second_cat == "Rebounding":
+            if score_diff <= 10 and top_score >= 75:
+                return "Rebounding Dynamo"
+            elif score_diff > 15:
+                return "Rebound Athlete"
+            return "Athletic Board-Grabber"
+        elif second_cat == "Playmaking":
+            if score_diff <= 10 and top_score >= 75:
+                return "Playmaking Athlete"
+            elif score_diff > 15:
+                return "Fast-Break Igniter"
+            return "Dynamic Distributor"
+
+    return "Versatile Contributor"
+
+def gradeInputs(players=400, seed=0):
+    # Synthetic merged stats with the gaps real data has: players missing a tracking stat, and one missing all
+    rng = np.random.default_rng(seed)
+    teams_df, _ = benchmark.syntheticTeams(rng, 30)
+    frame = benchmark.syntheticGradeInputs(rng, benchmark.syntheticPlayers(rng, players, teams_df))
+    frame.loc[rng.choice(players, 12, replace=False), 'DUNK_FGA'] = np.nan
+    frame.loc[rng.choice(players, 8, replace=False), 'OPP_FG_PCT'] = np.nan
+    frame.loc[rng.choice(players, 5, replace=False), 'DEFLECTIONS'] = np.nan
+    frame.loc[players // 2, [feature for feature in frame.columns if feature not in ('PLAYER_ID', 'PLAYER_NAME', 'TEAM_ID')]] = np.nan
+    # Benchwarmers and role players are only reachable through these
+    frame.loc[:9, 'MIN'] = 5.0
+    return frame
+
+def withArchetypeInputs(frame, grades):
+    frame = frame.assign(**{category: grades[category] for category in grading.CATEGORIES})
+    return frame.assign(Avg_Grade=frame[grading.CATEGORIES].mean(axis=1))
+
+def assertGradesMatch(grades, expected):
+    assert grades.columns.tolist() == expected.columns.tolist()
+    np.testing.assert_allclose(grades.to_numpy(), expected.to_numpy(), rtol=0, atol=1e-9, equal_nan=True)
+
+def test_engine_matches_minmax_grades(tmp_path):
+    frame = gradeInputs()
+    grades = grading.GradeEngine(state_path=str(tmp_path / 'state.npz')).grade(frame)
+    expected = baselineGrades(frame)
+    assert expected.isna().any(axis=1).sum() > 1
+    assertGradesMatch(grades, expected)
+
+def test_archetype_table_matches_row_rules():
+    frame = gradeInputs()
+    frame = withArchetypeInputs(frame, baselineGrades(frame))
+    # Ties between categories go to the category listed first, as sorted() does
+    frame.loc[frame.index[-3:], 'Playmaking'] = frame.loc[frame.index[-3:], 'Scoring']
+    frame.loc[frame.index[-6:-3], grading.CATEGORIES] = 50.0
+
+    expected = frame.apply(baselineArchetype, axis=1, combined_df=frame).tolist()
+    assert grading.assignArchetypes(frame).tolist() == expected
+    assert {'Benchwarmer', 'Role Player'} < set(expected)
+    assert len(set(expected)) > 15
+
+def test_incremental_regrade_matches_full_refit(tmp_path, caplog):
+    # With a zero threshold the engine refits whenever the scaling would move, so a run that reuses the previous
+    # state must still land exactly on the baseline
+    engine = grading.GradeEngine(state_path=str(tmp_path / 'state.npz'), threshold=0)
+    frame = gradeInputs()
+    engine.grade(frame)
+
+    rng = np.random.default_rng(1)
+    changed = frame.sample(n=20, random_state=1).index.drop(len(frame) // 2, errors='ignore')
+    interior = frame.loc[changed, 'PTS'].between(frame['PTS'].min(), frame['PTS'].max(), inclusive='neither')
+    changed = changed[interior.to_numpy()]
+    frame.loc[changed, 'PTS'] = frame['PTS'].min() + rng.random(len(changed)) * (frame['PTS'].max() - frame['PTS'].min())
+    newcomer = frame.drop(columns=['PLAYER_NAME']).median(numeric_only=True).to_frame().T.assign(PLAYER_ID=9999999, PLAYER_NAME='Newcomer')
+    frame = pd.concat([frame.sample(frac=1, random_state=2), newcomer], ignore_index=True)
+
+    with caplog.at_level(logging.INFO):
+        grades = engine.grade(frame)
+    assert f"Graded {len(frame)} players, {len(changed) + 1} recomputed" in caplog.text
+    assertGradesMatch(grades, baselineGrades(frame))
+
+def test_unchanged_inputs_reuse_saved_grades(tmp_path):
+    engine = grading.GradeEngine(state_path=str(tmp_path / 'state.npz'))
+    frame = gradeInputs()
+    first = engine.grade(frame)
+    assertGradesMatch(engine.grade(frame.iloc[::-1]).loc[frame.index], first)
+
+def test_grades_follow_a_custom_spec(tmp_path):
+    frame = gradeInputs()
+    spec = {"Shooting": {"factor": 10, "weights": [("PTS", 0.5), ("1-OPP_FG_PCT", 0.5)]}}
+    grades = grading.GradeEngine(spec=spec, state_path=str(tmp_path / 'state.npz')).grade(frame)
+
+    minmax = lambda series: (series - series.min()) / (series.max() - series.min())
+    score = (0.5 * minmax(frame['PTS']) + 0.5 * minmax(1 - frame['OPP_FG_PCT'])) * 100
+    expected = ((score - score.mean()) / score.std() * 10 + 50).clip(0, 100)
+    assertGradesMatch(grades, expected.to_frame('Shooting'))
+
+def test_spec_change_discards_saved_state(tmp_path, caplog):
+    state_path = str(tmp_path / 'state.npz')
+    frame = gradeInputs()
+    grading.GradeEngine(state_path=state_path).grade(frame)
+
+    spec = {**grading.GRADE_SPEC, "Rebounding": {"factor": 10, "weights": [("REB", 1.0)]}}
+    with caplog.at_level(logging.INFO):
+        grades = grading.GradeEngine(spec=spec, state_path=state_path).grade(frame)
+    assert f"Graded {len(frame)} players, {len(frame)} recomputed" in caplog.text
+    assertGradesMatch(grades, grading.GradeEngine(spec=spec, state_path=str(tmp_path / 'fresh.npz')).grade(frame))
+
+def test_small_range_shift_keeps_scaling(tmp_path):
+    state_path = str(tmp_path / 'state.npz')
+    engine = grading.GradeEngine(state_path=state_path)
+    frame = gradeInputs()
+    engine.grade(frame)
+    with np.load(state_path) as state:
+        data_range = state['data_range']
+
+    # The leading scorer adds 1% of the league's spread, under the 2% threshold, so the scaling is kept; a zero
+    # threshold refits it
+    column = engine.columns['PTS']
+    frame.loc[frame['PTS'].idxmax(), 'PTS'] += 0.01 * data_range[column]
+    engine.grade(frame)
+    with np.load(state_path) as state:
+        np.testing.assert_array_equal(state['data_range'], data_range)
+    grading.GradeEngine(state_path=state_path, threshold=0).grade(frame)
+    with np.load(state_path) as state:
+        assert state['data_range'][column] == pytest.approx(1.01 * data_range[column])
@@ -0,0 +1,56 @@
+import os
+from datetime import date
+import numpy as np
+import pandas as pd
+import logindex
+
+def gamelogFrame(games):
+    # (Player_ID, Game_ID, game_day, Points) rows, every other stored column filled with placeholders
+    frame = pd.DataFrame(games, columns=['Player_ID', 'Game_ID', 'game_day', 'Points'])
+    filler = {column: 'x' if dtype == 'str' else 0 for column, dtype in logindex.COLUMNS.items() if column not in frame}
+    return frame.assign(game_day=pd.to_datetime(frame['game_day']), **filler)
+
+GAMES = [
+    (7, 22400003, '2024-10-25', 30), (5, 22400001, '2024-10-22', 10), (7, 22400001, '2024-10-22', 12),
+    (5, 22400002, '2024-10-24', 20), (7, 22400002, '2024-10-24', 25), (7, 22400004, '2024-10-25', 8),
+]
+
+def test_spans_follow_player_date_and_cursor(tmp_path):
+    version = logindex.publish(gamelogFrame(GAMES), root=str(tmp_path))
+    index = logindex.GamelogIndex(os.path.join(tmp_path, version))
+    assert index.players.tolist() == [5, 7]
+
+    start, end = index.span(7)
+    assert index.values('Game_ID', start, end) == [22400001, 22400002, 22400003, 22400004]
+    start, end = index.span(7, since=date(2024, 10, 24), until=date(2024, 10, 24))
+    assert index.values('Game_ID', start, end) == [22400002]
+    start, end = index.span(7, cursor_date=date(2024, 10, 25), cursor_game=22400003)
+    assert index.values('Game_ID', start, end) == [22400004]
+    assert index.day(start) == date(2024, 10, 25)
+    assert index.span(6) == (0, 0)
+    start, end = index.span(7, since=date(2024, 11, 1))
+    assert start == end
+
+def test_last_games_are_padded_per_player(tmp_path):
+    index = logindex.GamelogIndex(os.path.join(tmp_path, logindex.publish(gamelogFrame(GAMES), root=str(tmp_path))))
+    positions = index.positions([7, 6, 5])
+    assert positions.tolist() == [1, -1, 0]
+
+    values, valid = index.lastGames('Points', positions, np.array([3, 0, 0]))
+    assert valid.tolist() == [[True, True, True], [False, False, False], [False, True, True]]
+    assert values[valid].tolist() == [25, 30, 8, 10, 20]
+    games, totals, hits = logindex.summarize(values, valid, np.array([[9, 20], [9, 20], [9, 20]]))
+    assert games.tolist() == [3, 0, 2]
+    assert totals.tolist() == [63, 0, 30]
+    assert hits.tolist() == [[2, 2], [0, 0], [2, 0]]
+
+def test_store_swaps_versions_and_prunes_old_ones(tmp_path):
+    store = logindex.IndexStore(root=str(tmp_path), check_interval=0)
+    assert store.current() is None
+    logindex.publish(gamelogFrame(GAMES), root=str(tmp_path), keep=2)
+    assert store.current().players.tolist() == [5, 7]
+
+    logindex.publish(gamelogFrame(GAMES[:1]), root=str(tmp_path), keep=2)
+    last = logindex.publish(gamelogFrame(GAMES[:2]), root=str(tmp_path), keep=2)
+    assert store.current().players.tolist() == [5, 7] and store.version == last
+    assert len([entry for entry in os.listdir(tmp_path) if entry != 'CURRENT']) == 2
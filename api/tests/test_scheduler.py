@@ -0,0 +1,58 @@
+import json
+import os
+import pandas as pd
+import pytest
+import requests
+import sqlalchemy
+from nba_api.stats.endpoints import leaguestandingsv3
+import fetcher
+import scheduler
+import snapshots
+
+def stageStatuses(db, run_id):
+    with db.connect() as conn:
+        rows = conn.execute(sqlalchemy.text("SELECT stage, status FROM run_history WHERE run_id = :run_id"), {'run_id': run_id}).all()
+    return dict(rows)
+
+def test_nightly_stages_all_succeed(db, stats):
+    run_id = scheduler.runStages(scheduler.NIGHTLY_STAGES, run_id='nightly', attempts=1)
+    assert stageStatuses(db, run_id) == {name: 'succeeded' for name in scheduler.NIGHTLY_STAGES}
+
+    with open(os.path.join(snapshots.SNAPSHOT_DIR, 'CURRENT')) as f:
+        version = f.read().strip()
+    with open(os.path.join(snapshots.SNAPSHOT_DIR, version, 'manifest.json')) as f:
+        manifest = json.load(f)
+    assert {'players', 'teams', *(f"team/{team_id}" for team_id in stats.teams_df['TEAM_ID'])} == set(manifest)
+    with open(os.path.join(snapshots.SNAPSHOT_DIR, version, 'players.json')) as f:
+        players = json.load(f)
+    assert sum(len(team['players']) for team in players.values()) == len(stats.players_df)
+
+def test_failed_stage_skips_only_its_dependents(db, stats):
+    stats.failing.add(leaguestandingsv3.LeagueStandingsV3.__name__)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        scheduler.runStages(scheduler.NIGHTLY_STAGES, run_id='standings_down', attempts=1)
+    statuses = stageStatuses(db, 'standings_down')
+    assert statuses['fetchStandings'] == 'failed'
+    assert statuses['publishSnapshots'] == 'skipped'
+    assert {name for name, status in statuses.items() if status == 'succeeded'} == {
+        'fetchPlayers', 'fetchTeams', 'fetchGamelogs', 'fetchGrades', 'publishGamelogIndex'
+    }
+
+def tableVersions(db):
+    with db.connect() as conn:
+        return dict(conn.execute(sqlalchemy.text("SELECT table_name, version FROM table_versions")).all())
+
+def test_swap_table_replaces_rows_and_bumps_version(db):
+    first = pd.DataFrame({'TEAM_ID': [1, 2], 'CITY': ['Atlanta', 'Boston']})
+    assert scheduler.swapTable(first, 'teams') == 2
+    version = tableVersions(db)['teams']
+
+    second = pd.DataFrame({'TEAM_ID': [3], 'CITY': ['Chicago']})
+    scheduler.swapTable(second, 'teams')
+    assert pd.read_sql("SELECT * FROM teams", con=db).to_dict(orient='records') == [{'TEAM_ID': 3, 'CITY': 'Chicago'}]
+    assert tableVersions(db)['teams'] > version
+
+    # A frame with new columns rebuilds the table instead of loading into a copy of the old one
+    scheduler.swapTable(second.assign(ARENA='United Center'), 'teams')
+    assert pd.read_sql("SELECT * FROM teams", con=db).columns.tolist() == ['TEAM_ID', 'CITY', 'ARENA']
+    assert not {'teams_staging', 'teams_retired'} & set(sqlalchemy.inspect(db).get_table_names())
@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+import sqlalchemy
+import schema
+
+@pytest.fixture
+def engine(tmp_path):
+    # SQLite cannot MODIFY columns or add primary keys, so the ALTERs conform sends are recorded instead of run
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'schema.db'}")
+    engine.altered = []
+
+    @sqlalchemy.event.listens_for(engine, 'before_cursor_execute', retval=True)
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('ALTER TABLE'):
+            engine.altered.append(statement)
+            return 'SELECT 1', ()
+        return statement.replace('UTC_TIMESTAMP()', 'CURRENT_TIMESTAMP'), parameters
+
+    yield engine
+    engine.dispose()
+
+def test_conform_adds_keys_and_route_indexes(engine):
+    pd.DataFrame({'PLAYER_ID': [1, 2], 'TEAM_ID': [10, 10], 'POSITION': ['G', 'F']}).to_sql('players', con=engine, index=False)
+    assert schema.conform(engine, 'players')
+    assert engine.altered == [
+        "ALTER TABLE players MODIFY `PLAYER_ID` BIGINT NOT NULL, MODIFY `TEAM_ID` BIGINT NOT NULL, "
+        "ADD PRIMARY KEY (PLAYER_ID), ADD INDEX idx_players_team (TEAM_ID)"
+    ]
+
+def test_conform_replaces_the_gamelogs_unique_key(engine):
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text("CREATE TABLE gamelogs_2023_24 (Player_ID BIGINT NOT NULL, Game_ID BIGINT NOT NULL, game_day DATE, season VARCHAR(10) NOT NULL)"))
+        conn.execute(sqlalchemy.text("CREATE UNIQUE INDEX uq_gamelogs_player_game ON gamelogs_2023_24 (Player_ID, Game_ID)"))
+        conn.execute(sqlalchemy.text("CREATE INDEX idx_gamelogs_player_day ON gamelogs_2023_24 (Player_ID, game_day)"))
+    assert schema.conform(engine, 'gamelogs_2023_24')
+    assert engine.altered == ["ALTER TABLE gamelogs_2023_24 ADD PRIMARY KEY (Player_ID, Game_ID), DROP INDEX uq_gamelogs_player_game"]
+
+def test_conformed_table_is_left_alone(engine):
+    with engine.begin() as conn:
+        conn.execute(sqlalchemy.text("CREATE TABLE players (PLAYER_ID BIGINT NOT NULL PRIMARY KEY, TEAM_ID BIGINT NOT NULL, POSITION TEXT)"))
+        conn.execute(sqlalchemy.text("CREATE INDEX idx_players_team ON players (TEAM_ID)"))
+    assert not schema.conform(engine, 'players')
+    assert not schema.conform(engine, 'unmanaged')
+    assert engine.altered == []
+
+def test_migrations_apply_once(engine):
+    for table in ('teams', 'teams_staging'):
+        pd.DataFrame({'TEAM_ID': [1]}).to_sql(table, con=engine, index=False)
+    assert schema.migrate(engine) == schema.SCHEMA_VERSION
+    assert engine.altered == ["ALTER TABLE teams MODIFY `TEAM_ID` BIGINT NOT NULL, ADD PRIMARY KEY (TEAM_ID)"]
+
+    schema.migrate(engine)
+    assert len(engine.altered) == 1
+    with engine.connect() as conn:
+        assert conn.execute(sqlalchemy.text("SELECT version FROM schema_migrations")).scalars().all() == [schema.SCHEMA_VERSION]
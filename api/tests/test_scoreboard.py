@@ -0,0 +1,76 @@
+import threading
+import time
+from app import ScoreboardCache
+
+class StubScoreboard:
+    # Stand-in for the live scoreboard endpoint: each fetch takes `delay` seconds and returns the next version
+    def __init__(self, delay=0.2, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+            version = self.calls
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("scoreboard unavailable")
+        return [[f"00224{version:05d}", 2, "Q1", "Away", 1, 0, "Home", 2, 0, "2025-01-01T00:00:00Z"]]
+
+def callConcurrently(fn, callers):
+    results, errors = [None] * callers, []
+    def run(position):
+        try:
+            results[position] = fn()
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(position,)) for position in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+def test_cold_callers_share_one_fetch():
+    stub = StubScoreboard()
+    cache = ScoreboardCache(stub, ttl=15, stale_ttl=300)
+    results, errors = callConcurrently(cache.allGames, 16)
+    assert errors == []
+    assert stub.calls == 1
+    assert all(result == results[0] for result in results)
+    assert cache.game(results[0][0][0]) == results[0][0]
+
+def test_stale_games_are_served_while_one_refresh_runs():
+    stub = StubScoreboard(delay=0.3)
+    cache = ScoreboardCache(stub, ttl=0.05, stale_ttl=60)
+    first = cache.allGames()
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    results, errors = callConcurrently(cache.allGames, 16)
+    assert errors == []
+    assert time.monotonic() - started < stub.delay
+    assert all(result == first for result in results)
+
+    # Only one background refresh was started, and its games replace the stale ones once it lands
+    time.sleep(stub.delay + 0.1)
+    assert stub.calls == 2
+    assert cache.allGames() != first
+
+def test_expired_games_are_fetched_again_before_returning():
+    stub = StubScoreboard(delay=0.05)
+    cache = ScoreboardCache(stub, ttl=0.01, stale_ttl=0.1)
+    first = cache.allGames()
+    time.sleep(0.15)
+    assert cache.allGames() != first
+    assert stub.calls == 2
+
+def test_failed_cold_fetch_reaches_every_waiting_caller():
+    stub = StubScoreboard(fail=True)
+    cache = ScoreboardCache(stub, ttl=15, stale_ttl=300)
+    results, errors = callConcurrently(cache.allGames, 8)
+    assert len(errors) == 8
+    assert stub.calls == 1
+    assert all(str(error) == "scoreboard unavailable" for error in errors)